@@ -0,0 +1,103 @@
+#Benchmark: FILO allocation computed every run vs the fingerprinted allocation cache, and the old key's date collision
+# Run from the repo root:  python -m benchmarks.bench_allocation_cache
+import argparse
+import tempfile
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import LAT_RANGE, LON_RANGE, TRUCKS, WAREHOUSE
+from utils import allocation_cache, allocation_store
+from utils.distance_matrix import clear_distance_matrices
+
+DATES = [date(2025, 7, 7), date(2025, 7, 8)]
+CONFIG = {"min_load_percent": 60, "max_load_percent": 95, "route_improvement_ms": 0, "allocation_workers": 1}
+
+
+def tables(n_customers, seed=0):
+    """One order per customer and day, 380-470 kg each (the weights synthetic.make_state uses)."""
+    rng = np.random.default_rng(seed)
+    customers = pd.DataFrame({
+        "customer_id": np.arange(1, n_customers + 1),
+        "customer_name": [f"Customer {i}" for i in range(1, n_customers + 1)],
+        "state": "Maharashtra",
+        "latitude": rng.uniform(*LAT_RANGE, n_customers).round(4),
+        "longitude": rng.uniform(*LON_RANGE, n_customers).round(4),
+    })
+    products = pd.DataFrame({"product_id": [101], "product_name": ["Carton"],
+                             "weight_per_box": [10.0], "size_per_box": [0.05]})
+    trucks = pd.DataFrame(TRUCKS * 20, columns=["truck_type", "capacity_tons"]).assign(state="Maharashtra")
+    trucks.insert(0, "truck_id", np.arange(1, len(trucks) + 1))
+    warehouses = pd.DataFrame({"warehouse_id": ["W1"], "warehouse_name": ["Mumbai"], "state": ["Maharashtra"],
+                               "latitude": [WAREHOUSE[0]], "longitude": [WAREHOUSE[1]]})
+    n = n_customers * len(DATES)
+    orders = pd.DataFrame({
+        "order_id": np.arange(1, n + 1),
+        "customer_id": np.tile(customers["customer_id"], len(DATES)),
+        "product_id": 101,
+        "num_boxes": rng.integers(38, 48, n),
+        "delivery_date": np.repeat(DATES, n_customers),
+    })
+    return orders, customers, products, trucks, warehouses
+
+
+def run(orders, customers, products, trucks, warehouses, day, config=CONFIG):
+    """Page 6's FILO call for one day; returns seconds and the allocation."""
+    filtered = orders[orders['delivery_date'] == day]
+    start = time.perf_counter()
+    result = allocation_cache.filo_grouped_truck_allocation(filtered, customers, products, trucks, config,
+                                                            warehouses_df=warehouses)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--customers", type=int, nargs="+", default=[500, 2000, 10000])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Keep the benchmark's allocations out of data/allocations
+        allocation_store.ALLOCATION_DIR = tmp
+        allocation_store.MANIFEST_FILE = f"{tmp}/manifest.json"
+        allocation_store.LEGACY_FILE = f"{tmp}/allocation.csv"
+
+        print(f"{'customers':>9} {'compute s':>9} {'cached s':>8} {'fingerprint ms':>14} {'faster':>7}")
+        for n in args.customers:
+            frames = tables(n, seed=n)
+            orders = frames[0]
+            cache = allocation_cache.get_allocation_cache(CONFIG)
+            cache.clear()
+            clear_distance_matrices()
+            computed = [run(*frames, day) for day in DATES]
+            cached = [run(*frames, day) for day in DATES]
+            start = time.perf_counter()
+            allocation_cache.input_fingerprint(orders[orders['delivery_date'] == DATES[0]], *frames[1:], CONFIG)
+            fingerprint_s = time.perf_counter() - start
+
+            # Each date gets its own allocation back, identical to the computed one
+            for day, (_, first), (_, again) in zip(DATES, computed, cached):
+                assert set(again['delivery_date']) == {day} and again.equals(first)
+            compute_s = np.mean([s for s, _ in computed])
+            cached_s = np.mean([s for s, _ in cached])
+            print(f"{n:>9} {compute_s:>9.3f} {cached_s:>8.3f} {fingerprint_s * 1000:>14.1f} "
+                  f"{compute_s / cached_s:>6.0f}x")
+
+        # The old st.cache_data key hashed every frame to None: both dates shared one key (config's)
+        day_keys = {allocation_cache.input_fingerprint(None, None, None, None, CONFIG, None) for _ in DATES}
+        new_keys = {allocation_cache.input_fingerprint(orders[orders['delivery_date'] == day], *frames[1:], CONFIG)
+                    for day in DATES}
+        print(f"\nkeys for {len(DATES)} dates: old {len(day_keys)}, fingerprint {len(new_keys)}")
+
+        # A different run of the date replaces the store; a hit on the first one puts it back
+        _, first = run(*frames, DATES[0])
+        run(*frames, DATES[0], config={**CONFIG, "max_load_percent": 90})
+        _, again = run(*frames, DATES[0])
+        stored = allocation_store.load_allocation(DATES[0])
+        print(f"store holds the returned allocation after a hit: {set(stored['truck_id']) == set(again['truck_id'])}")
+        print(cache.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+#Benchmark: create_colored_route_map build time and HTML size, one Marker per stop vs the high-volume GeoJSON mode
+# Run from the repo root:  python -m benchmarks.bench_map_build
+import argparse
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from utils.distance_matrix import clear_distance_matrices
+from utils.map_utils import HIGH_VOLUME_STOPS, create_colored_route_map
+
+DEPOT = (18.52, 73.86)
+
+
+def allocated_stops(n_stops, stops_per_truck=12, seed=0):
+    rng = np.random.default_rng(seed)
+    n_trucks = -(-n_stops // stops_per_truck)
+    truck = np.repeat(np.arange(n_trucks), stops_per_truck)[:n_stops]
+    centres = rng.uniform([16.5, 73.5], [20.5, 79.5], (n_trucks, 2))
+    coords = centres[truck] + rng.normal(0, 0.2, (n_stops, 2))
+    return pd.DataFrame({
+        "truck_id": [f"T{t:04d}" for t in truck],
+        "customer_name": [f"Customer {i}" for i in range(n_stops)],
+        "latitude": coords[:, 0], "longitude": coords[:, 1],
+        "route_order": np.arange(n_stops) % stops_per_truck + 1,
+        "state": "Maharashtra", "truck_type": "Tata 407", "fuel_cost": 1500.0, "emissions_estimate": 60.0,
+        "truck_capacity_kg": 2500, "utilization_percent": 80.0, "delivery_date": pd.Timestamp("2026-01-05"),
+    })
+
+
+def build(allocated, warehouses, high_volume):
+    clear_distance_matrices()
+    start = time.perf_counter()
+    m = create_colored_route_map(allocated, None, warehouses, high_volume=high_volume)
+    html = m.get_root().render()
+    return time.perf_counter() - start, len(html.encode()) / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stops", type=int, nargs="+", default=[500, 2000, 5000])
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore", message="CartoDB tiles")  # folium's tile notice, not ours
+
+    warehouses = pd.DataFrame({"warehouse_name": ["Pune"], "state": ["Maharashtra"],
+                               "latitude": [DEPOT[0]], "longitude": [DEPOT[1]]})
+    print(f"high-volume mode switches on above {HIGH_VOLUME_STOPS} stops\n")
+    print(f"{'stops':>6} {'markers s':>9} {'markers MB':>10} {'geojson s':>9} {'geojson MB':>10} {'faster':>7} {'smaller':>8}")
+    for n in args.stops:
+        allocated = allocated_stops(n, seed=n)
+        marker_s, marker_mb = build(allocated, warehouses, high_volume=False)
+        geojson_s, geojson_mb = build(allocated, warehouses, high_volume=True)
+        print(f"{n:>6} {marker_s:>9.2f} {marker_mb:>10.2f} {geojson_s:>9.2f} {geojson_mb:>10.2f} "
+              f"{marker_s / geojson_s:>6.1f}x {marker_mb / geojson_mb:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
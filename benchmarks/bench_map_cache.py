@@ -0,0 +1,73 @@
+#Benchmark: page 6 reruns rebuilding and rendering the route map every time vs the content-addressed map cache
+# Run from the repo root:  python -m benchmarks.bench_map_cache
+import argparse
+import time
+import warnings
+
+import pandas as pd
+
+from benchmarks.bench_map_build import DEPOT, allocated_stops
+from utils.distance_matrix import clear_distance_matrices
+from utils.map_cache import MapCache, map_key
+from utils.map_utils import create_colored_route_map
+
+
+def show(m, render=True):
+    """What st_folium(m, render=...) does with the map on every rerun before handing it to the browser."""
+    from streamlit_folium import generate_leaflet_string
+    if render:
+        m.get_root().render()
+    m.render()
+    generate_leaflet_string(m)
+
+
+def old_rerun(allocated, warehouses):
+    m = create_colored_route_map(allocated, None, warehouses)
+    show(m)
+    return m.get_root().render().encode("utf-8")  # the download button's data, rendered every rerun
+
+
+def cached_rerun(cache, allocated, warehouses, download=False):
+    key = map_key(allocated, warehouses)
+    build = lambda: create_colored_route_map(allocated, None, warehouses)
+    with cache.lock(key):
+        show(cache.get_map(key, build), render=False)
+    return cache.get_html(key, build) if download else None
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stops", type=int, nargs="+", default=[300, 1200])
+    parser.add_argument("--reruns", type=int, default=5, help="widget interactions after the first run")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore", message="CartoDB tiles")  # folium's tile notice, not ours
+
+    warehouses = pd.DataFrame({"warehouse_name": ["Pune"], "state": ["Maharashtra"],
+                               "latitude": [DEPOT[0]], "longitude": [DEPOT[1]]})
+    print(f"{'stops':>6} {'old rerun s':>11} {'first s':>8} {'rerun s':>8} {'download s':>10} "
+          f"{'again s':>8} {'key ms':>7} {'rerun faster':>12}")
+    for n in args.stops:
+        allocated = allocated_stops(n, seed=n)
+        clear_distance_matrices()
+        old_s = min(timed(old_rerun, allocated, warehouses)[0] for _ in range(2))
+
+        cache = MapCache()
+        first_s, _ = timed(cached_rerun, cache, allocated, warehouses)
+        rerun_s = min(timed(cached_rerun, cache, allocated.copy(), warehouses)[0] for _ in range(args.reruns))
+        download_s, html = timed(cached_rerun, cache, allocated, warehouses, download=True)
+        again_s, again = timed(cached_rerun, cache, allocated, warehouses, download=True)
+        key_s, _ = timed(map_key, allocated, warehouses)
+        assert again is html and html.count(b"L.map(") == 1, "download must hold one copy of the map"
+        print(f"{n:>6} {old_s:>11.2f} {first_s:>8.2f} {rerun_s:>8.2f} {download_s:>10.2f} {again_s:>8.2f} "
+              f"{key_s * 1000:>7.1f} {old_s / rerun_s:>11.1f}x")
+        print(f"       {cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#Benchmark: FILO truck packing, legacy iterrows loop vs utils.packing.filo_pack
+# Run from the repo root:  python -m benchmarks.bench_packing [--legacy-max N]
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_state
+from utils.packing import filo_pack
+
+
+# The loop filo_grouped_truck_allocation used before the array engine
+def legacy_pack(customer_summary, state_trucks):
+    loads = []
+    remaining_customers = customer_summary.copy()
+    while not remaining_customers.empty:
+        assigned = False
+        for _, truck in state_trucks.iterrows():
+            truck_capacity = truck['capacity_tons'] * 1000
+            load_sum = 0
+            selected_rows = []
+            for idx, row in remaining_customers.iterrows():
+                if load_sum + row['total_weight_kg'] <= truck_capacity:
+                    load_sum += row['total_weight_kg']
+                    selected_rows.append(idx)
+            if selected_rows and truck['min_capacity_kg'] <= load_sum <= truck['max_capacity_kg']:
+                remaining_customers.drop(index=selected_rows, inplace=True)
+                loads.append((truck['truck_type'], selected_rows, load_sum))
+                assigned = True
+                break
+        if not assigned:
+            break
+    return loads
+
+
+def array_pack(customer_summary, state_trucks):
+    packed = filo_pack(
+        customer_summary['total_weight_kg'].to_numpy(dtype=float),
+        state_trucks['capacity_tons'].to_numpy(dtype=float) * 1000,
+        state_trucks['min_capacity_kg'].to_numpy(dtype=float),
+        state_trucks['max_capacity_kg'].to_numpy(dtype=float)
+    )
+    index = customer_summary.index.to_numpy()
+    types = state_trucks['truck_type'].to_numpy()
+    return [(types[t], index[rows].tolist(), load) for t, rows, load in packed]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 50_000])
+    parser.add_argument("--legacy-max", type=int, default=1_000,
+                        help="largest state size to also run the (slow) legacy loop on")
+    args = parser.parse_args()
+
+    print(f"{'customers':>10} {'trucks':>7} {'legacy s':>10} {'array s':>9} {'speedup':>8}  same")
+    for n in args.sizes:
+        customer_summary, trucks = make_state(n)
+
+        start = time.perf_counter()
+        new = array_pack(customer_summary, trucks)
+        array_s = time.perf_counter() - start
+
+        if n <= args.legacy_max:
+            start = time.perf_counter()
+            old = legacy_pack(customer_summary, trucks)
+            legacy_s = time.perf_counter() - start
+            same = old == new
+            print(f"{n:>10} {len(new):>7} {legacy_s:>10.3f} {array_s:>9.3f} {legacy_s / array_s:>7.0f}x  {same}")
+        else:
+            print(f"{n:>10} {len(new):>7} {'skipped':>10} {array_s:>9.3f} {'-':>8}  -")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#Benchmark: FILO allocation of several states in-process vs in a process pool
+# Run from the repo root:  python -m benchmarks.bench_parallel_allocation
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_state, WAREHOUSE
+from utils.distance_matrix import clear_distance_matrices
+from utils.logic import filo_state_plan, map_states
+
+
+def state_tasks(n_states, n_customers, improve_ms):
+    tasks = []
+    for s in range(n_states):
+        customer_summary, trucks = make_state(n_customers, seed=s, state=f"State {s}")
+        tasks.append((
+            f"State {s}", "2025-07-07", WAREHOUSE,
+            customer_summary['latitude'].to_numpy(dtype=float),
+            customer_summary['longitude'].to_numpy(dtype=float),
+            customer_summary['total_weight_kg'].to_numpy(dtype=float),
+            trucks['capacity_tons'].to_numpy(dtype=float) * 1000,
+            trucks['min_capacity_kg'].to_numpy(dtype=float),
+            trucks['max_capacity_kg'].to_numpy(dtype=float),
+            improve_ms,
+        ))
+    return tasks
+
+
+def same_plans(a, b):
+    return all(
+        (x is None and y is None) or
+        (x is not None and y is not None and all(np.array_equal(x[k], y[k]) for k in x))
+        for x, y in zip(a, b)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--states", type=int, default=8)
+    parser.add_argument("--customers", type=int, nargs="+", default=[500, 2_000, 10_000])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--improve-ms", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'states':>6} {'customers':>10} {'workers':>8} {'seconds':>8} {'same':>5}")
+    for n in args.customers:
+        tasks = state_tasks(args.states, n, args.improve_ms)
+        serial = None
+        for workers in args.workers:
+            clear_distance_matrices()
+            start = time.perf_counter()
+            plans = map_states(filo_state_plan, tasks, workers)
+            seconds = time.perf_counter() - start
+            serial = plans if serial is None else serial
+            # The improvement stage is bounded by moves tried, so plans match with it on too
+            same = str(same_plans(serial, plans))
+            print(f"{args.states:>6} {n:>10} {workers:>8} {seconds:>8.2f} {same:>5}")
+
+
+if __name__ == "__main__":
+    main()
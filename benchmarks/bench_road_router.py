@@ -0,0 +1,60 @@
+#Benchmark: point-to-point queries/sec of the offline road router, ALT A* vs plain Dijkstra
+# Run from the repo root:  python -m benchmarks.bench_road_router
+import argparse
+import time
+
+import numpy as np
+from scipy.sparse.csgraph import dijkstra
+
+from benchmarks.synthetic import build_sample_graph
+from utils.road_router import SAMPLE_GRAPH, RoadRouter
+
+
+def time_queries(router, pairs):
+    start = time.perf_counter()
+    metres = [router._astar(s, t)[0] for s, t in pairs]
+    return len(pairs) / (time.perf_counter() - start), np.array(metres)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--spacing", type=float, nargs="+", default=[0.15, 0.05],
+                        help="grid spacing in degrees of the synthetic graphs (0.15 = the bundled sample)")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--landmarks", type=int, default=8)
+    parser.add_argument("--matrix", type=int, default=50, help="origins = destinations of the many-to-many query")
+    args = parser.parse_args()
+
+    print(f"{'nodes':>7} {'edges':>7} {'prep s':>7} {'dijkstra q/s':>12} {'ALT q/s':>8} {'speed-up':>8} "
+          f"{'exact':>5} {'matrix s':>8}")
+    for spacing in args.spacing:
+        if spacing == 0.15:
+            with np.load(SAMPLE_GRAPH) as graph:
+                arrays = [graph[name] for name in ("lat", "lon", "u", "v", "length_m")]
+        else:
+            arrays = build_sample_graph(spacing=spacing)
+        start = time.perf_counter()
+        alt = RoadRouter(*arrays, n_landmarks=args.landmarks)
+        prep = time.perf_counter() - start
+        plain = RoadRouter(*arrays, n_landmarks=0)
+
+        rng = np.random.default_rng(0)
+        pairs = rng.integers(0, len(alt), (args.queries, 2)).tolist()
+        plain_qps, plain_m = time_queries(plain, pairs)
+        alt_qps, alt_m = time_queries(alt, pairs)
+        # Exact: same lengths as scipy's Dijkstra
+        reference = dijkstra(alt.graph, indices=[s for s, _ in pairs[:50]])[np.arange(min(50, len(pairs))),
+                                                                         [t for _, t in pairs[:50]]]
+        exact = np.allclose(alt_m[:50], reference) and np.allclose(plain_m, alt_m)
+
+        coords = np.column_stack((alt.lat, alt.lon))[rng.integers(0, len(alt), args.matrix)]
+        start = time.perf_counter()
+        alt.matrix_km(coords, coords)
+        matrix_s = time.perf_counter() - start
+
+        print(f"{len(alt):>7} {alt.graph.nnz:>7} {prep:>7.2f} {plain_qps:>12.0f} {alt_qps:>8.0f} "
+              f"{alt_qps / plain_qps:>7.1f}x {str(exact):>5} {matrix_s:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
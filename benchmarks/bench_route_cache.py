@@ -0,0 +1,88 @@
+#Benchmark: route_cache.json (load all at import, rewrite per miss) vs the SQLite route cache
+# Run from the repo root:  python -m benchmarks.bench_route_cache
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from utils.route_cache import RouteCache
+
+
+def make_legs(n_legs, n_points, seed=0):
+    rng = np.random.default_rng(seed)
+    starts = rng.uniform([8, 68], [35, 97], size=(n_legs, 2))
+    return {
+        f"{a[0]:.4f}_{a[1]:.4f}_{a[0] + 1:.4f}_{a[1] + 1:.4f}": np.round(
+            a + np.cumsum(rng.normal(0, 0.002, (n_points, 2)), axis=0), 5).tolist()
+        for a in starts
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--legs", type=int, nargs="+", default=[100, 1_000, 5_000])
+    parser.add_argument("--points", type=int, default=800)
+    parser.add_argument("--lookups", type=int, default=2_000)
+    args = parser.parse_args()
+
+    print(f"{'legs':>6} {'json MB':>8} {'json load s':>11} {'json save s':>11} "
+          f"{'open s':>8} {'cold get ms':>11} {'warm get us':>11} {'put+flush ms':>12}")
+    for n in args.legs:
+        legs = make_legs(n, args.points, seed=n)
+        keys = list(legs)
+        with tempfile.TemporaryDirectory() as tmp:
+            json_path = os.path.join(tmp, "route_cache.json")
+            with open(json_path, "w") as f:
+                json.dump(legs, f, indent=2)
+            json_mb = os.path.getsize(json_path) / 2**20
+
+            # Old: every process start parses the whole file, every miss rewrites it
+            start = time.perf_counter()
+            with open(json_path) as f:
+                loaded = json.load(f)
+            json_load = time.perf_counter() - start
+            start = time.perf_counter()
+            with open(json_path, "w") as f:
+                json.dump(loaded, f, indent=2)
+            json_save = time.perf_counter() - start
+
+            db_path = os.path.join(tmp, "route_cache.db")
+            RouteCache(db_path, legacy_json=None).migrate_json(json_path)
+
+            start = time.perf_counter()
+            cache = RouteCache(db_path, legacy_json=None, memory_bytes=2**30)
+            cache.get((0, 0), (0, 0))
+            open_s = time.perf_counter() - start
+
+            rng = np.random.default_rng(n)
+            picks = [keys[i] for i in rng.integers(0, n, args.lookups)]
+            pairs = [([float(v) for v in k.split("_")[:2]], [float(v) for v in k.split("_")[2:]]) for k in picks]
+            start = time.perf_counter()
+            for a, b in pairs[:200]:
+                cache.get(a, b)
+            cold = (time.perf_counter() - start) / 200
+            for a, b in pairs:
+                cache.get(a, b)
+            start = time.perf_counter()
+            for a, b in pairs:
+                cache.get(a, b)
+            warm = (time.perf_counter() - start) / len(pairs)
+
+            new = np.asarray(legs[keys[0]])
+            start = time.perf_counter()
+            for i in range(64):
+                cache.put((50 + i, 0), (50 + i, 1), new)
+            cache.flush()
+            put = (time.perf_counter() - start) / 64
+            cache.close()
+
+        print(f"{n:>6} {json_mb:>8.1f} "
+              f"{json_load:>11.3f} {json_save:>11.3f} {open_s:>8.4f} {cold * 1e3:>11.3f} "
+              f"{warm * 1e6:>11.1f} {put * 1e3:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
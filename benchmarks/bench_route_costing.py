@@ -0,0 +1,62 @@
+#Benchmark: route costing, per-leg geopy geodesic vs batched route_lengths_km
+# Run from the repo root:  python -m benchmarks.bench_route_costing [--legacy-max N]
+import argparse
+import time
+
+import numpy as np
+from geopy.distance import geodesic
+
+from benchmarks.synthetic import make_state, WAREHOUSE
+from utils.route_utils import pack_routes, route_lengths_km
+
+
+# What calculate_total_route_distance did for every truck
+def legacy_lengths(routes):
+    return np.array([
+        sum(geodesic(route[i], route[i + 1]).km for i in range(len(route) - 1))
+        for route in routes
+    ])
+
+
+def make_routes(n_trucks, seed=0):
+    rng = np.random.default_rng(seed)
+    counts = rng.integers(2, 9, n_trucks)
+    customer_summary, _ = make_state(int(counts.sum()), seed=seed)
+    coords = list(zip(customer_summary['latitude'], customer_summary['longitude']))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    return [[WAREHOUSE] + coords[s:s + c] + [WAREHOUSE] for s, c in zip(starts, counts)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trucks", type=int, nargs="+", default=[100, 1_000, 10_000])
+    parser.add_argument("--legacy-max", type=int, default=1_000)
+    args = parser.parse_args()
+
+    print(f"{'trucks':>7} {'geodesic s':>11} {'haversine s':>12} {'ellipsoid s':>12} "
+          f"{'max rel err hav':>16} {'max rel err ell':>16}")
+    for n in args.trucks:
+        routes = make_routes(n)
+
+        start = time.perf_counter()
+        coords, offsets = pack_routes(routes)
+        hav = route_lengths_km(coords, offsets)
+        hav_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        coords, offsets = pack_routes(routes)
+        ell = route_lengths_km(coords, offsets, mode="ellipsoidal")
+        ell_s = time.perf_counter() - start
+
+        if n <= args.legacy_max:
+            start = time.perf_counter()
+            old = legacy_lengths(routes)
+            old_s = time.perf_counter() - start
+            print(f"{n:>7} {old_s:>11.3f} {hav_s:>12.4f} {ell_s:>12.4f} "
+                  f"{np.max(np.abs(hav - old) / old):>16.2e} {np.max(np.abs(ell - old) / old):>16.2e}")
+        else:
+            print(f"{n:>7} {'skipped':>11} {hav_s:>12.4f} {ell_s:>12.4f} {'-':>16} {'-':>16}")
+
+
+if __name__ == "__main__":
+    main()
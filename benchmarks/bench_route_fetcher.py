@@ -0,0 +1,91 @@
+#Benchmark: one requests.get per leg (the old GraphHopper client) vs the pooled asyncio fetcher, against the mock server
+# Run from the repo root:  python -m benchmarks.bench_route_fetcher
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import polyline
+import requests
+
+from benchmarks.mock_graphhopper import MockGraphHopper, start_in_thread
+from utils.route_cache import RouteCache
+from utils.route_fetcher import RouteFetcher
+
+
+def day_of_legs(trucks, stops, seed=0):
+    """Depot -> stops -> depot legs of every truck; trucks from one depot repeat its first/last legs."""
+    rng = np.random.default_rng(seed)
+    depot = (18.52, 73.86)
+    legs = []
+    for _ in range(trucks):
+        points = [depot] + [tuple(p) for p in rng.uniform([16.5, 73.5], [20.5, 79.5], (stops, 2)).round(4)] + [depot]
+        legs += list(zip(points[:-1], points[1:]))
+    # A few customers get two trucks: some legs appear twice
+    return legs + legs[:len(legs) // 10]
+
+
+def old_client(url, legs):
+    for start, end in legs:
+        response = requests.get(url, params={"point": [f"{start[0]},{start[1]}", f"{end[0]},{end[1]}"]})
+        polyline.decode(response.json()["paths"][0]["points"])
+
+
+def run(fetcher, legs):
+    start = time.perf_counter()
+    routes = fetcher.fetch_all(legs)
+    return time.perf_counter() - start, routes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trucks", type=int, default=20)
+    parser.add_argument("--stops", type=int, default=12)
+    parser.add_argument("--latency-ms", type=float, default=40)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--rate", type=float, default=100, help="requests/s of the rate-limited run")
+    args = parser.parse_args()
+
+    legs = day_of_legs(args.trucks, args.stops)
+    print(f"{len(legs)} legs, {len(set(legs))} distinct, server latency {args.latency_ms:.0f} ms\n")
+    print(f"{'client':<28} {'wall s':>7} {'legs/s':>7} {'requests':>8} {'429s':>5} {'peak conc':>9}")
+
+    server = MockGraphHopper(args.latency_ms)
+    url = start_in_thread(server)
+
+    start = time.perf_counter()
+    old_client(url, legs)
+    wall = time.perf_counter() - start
+    print(f"{'requests.get per leg':<28} {wall:>7.2f} {len(legs) / wall:>7.0f} {server.requests:>8} {0:>5} "
+          f"{server.max_in_flight:>9}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for concurrency in args.concurrency:
+            server.requests = server.max_in_flight = 0
+            fetcher = RouteFetcher(url, concurrency=concurrency)
+            wall, _ = run(fetcher, legs)
+            print(f"{f'async, {concurrency} in flight':<28} {wall:>7.2f} {len(legs) / wall:>7.0f} "
+                  f"{server.requests:>8} {0:>5} {server.max_in_flight:>9}")
+
+        # Rate limited: 429s must be absorbed, not turned into straight lines
+        limited = MockGraphHopper(args.latency_ms, rate=args.rate)
+        fetcher = RouteFetcher(start_in_thread(limited), concurrency=max(args.concurrency), backoff_s=0.05)
+        wall, _ = run(fetcher, legs)
+        print(f"{f'async, {args.rate:.0f} req/s limit':<28} {wall:>7.2f} {len(legs) / wall:>7.0f} "
+              f"{limited.requests:>8} {limited.throttled:>5} {limited.max_in_flight:>9}   failed={fetcher.stats()['failed']}")
+
+        # Write-through: the second day's map reads every leg from the cache
+        cache = RouteCache(os.path.join(tmp, "route_cache.db"), legacy_json=None)
+        server.requests = 0
+        wall, _ = run(RouteFetcher(url, cache=cache, concurrency=max(args.concurrency)), legs)
+        cold = server.requests
+        wall_warm, _ = run(RouteFetcher(url, cache=cache, concurrency=max(args.concurrency)), legs)
+        print(f"{'async + route cache, cold':<28} {wall:>7.2f} {len(legs) / wall:>7.0f} {cold:>8}")
+        print(f"{'async + route cache, warm':<28} {wall_warm:>7.3f} {len(legs) / wall_warm:>7.0f} "
+              f"{server.requests - cold:>8}")
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
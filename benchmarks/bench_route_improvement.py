@@ -0,0 +1,41 @@
+#Benchmark: 2-opt / Or-opt improvement over nearest neighbor vs the search budget (candidate moves tried)
+# Run from the repo root:  python -m benchmarks.bench_route_improvement
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_state, WAREHOUSE
+from utils.distance_matrix import DistanceMatrix
+from utils.route_improvement import improve_route, path_length
+from utils.route_utils import nearest_neighbor_order
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stops", type=int, nargs="+", default=[10, 30, 100, 500, 2_000])
+    parser.add_argument("--budgets", type=int, nargs="+", default=[1_000, 10_000, 50_000, 200_000, 1_000_000])
+    parser.add_argument("--open", action="store_true", help="open path (run_allocation) instead of a round trip")
+    args = parser.parse_args()
+
+    print(f"{'stops':>6} {'checks':>10} {'cpu ms':>8} {'NN km':>10} {'improved km':>12} {'saved':>7} {'same':>5}")
+    for n in args.stops:
+        customer_summary, _ = make_state(n, seed=n)
+        coords = customer_summary[['latitude', 'longitude']].to_numpy()
+        matrix = DistanceMatrix(WAREHOUSE, coords)
+        D = matrix.km
+        route = [0] + (nearest_neighbor_order(matrix.coords[1:], WAREHOUSE) + 1).tolist()
+        nn_km = path_length(D, route, closed=not args.open)
+
+        for budget in args.budgets:
+            start = time.process_time()
+            improved, saved = improve_route(D, route, closed=not args.open, time_budget_ms=60_000, max_checks=budget)
+            cpu_ms = (time.process_time() - start) * 1000
+            # The budget counts moves, not time: a second run gives the same route
+            same = improve_route(D, route, closed=not args.open, time_budget_ms=60_000, max_checks=budget)[0] == improved
+            print(f"{n:>6} {budget:>10} {cpu_ms:>8.1f} {nn_km:>10.1f} {nn_km - saved:>12.1f} {saved / nn_km:>6.1%} "
+                  f"{str(same):>5}")
+
+
+if __name__ == "__main__":
+    main()
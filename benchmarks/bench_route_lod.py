@@ -0,0 +1,82 @@
+#Benchmark: route map HTML size and build time with every cached vertex vs the per-truck level of detail
+# Run from the repo root:  python -m benchmarks.bench_route_lod
+import argparse
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from utils.map_utils import DETAIL_ZOOM_IN, create_colored_route_map
+from utils.road_router import get_road_router
+from utils.route_geometry import HIDDEN, at_zoom, fit_zoom, vertex_zooms
+
+DEPOT = (18.52, 73.86)
+
+
+def dense_leg(router, start, end, rng, spacing_m=15):
+    """A road leg with GraphHopper-like vertex density: the router's path resampled every spacing_m, with GPS noise."""
+    km, points = router.route(start, end)
+    points = np.asarray(points if points else [start, end], dtype=float)
+    steps = np.hypot(*np.diff(points, axis=0).T) * 111_000
+    along = np.concatenate(([0], np.cumsum(steps)))
+    t = np.linspace(0, along[-1], max(2, int(along[-1] / spacing_m)))
+    dense = np.column_stack([np.interp(t, along, points[:, k]) for k in (0, 1)])
+    dense[1:-1] += rng.normal(0, 1e-5, (len(dense) - 2, 2))
+    return dense
+
+
+def busy_day(trucks, stops, seed=0):
+    rng = np.random.default_rng(seed)
+    router = get_road_router()
+    rows, roads = [], {}
+    for t in range(trucks):
+        # Each truck serves a cluster around a random town
+        centre = rng.uniform([17.0, 74.0], [20.0, 78.5])
+        customers = centre + rng.normal(0, 0.25, (stops, 2))
+        truck_id = f"T{t:03d}"
+        for order, (lat, lon) in enumerate(customers, start=1):
+            rows.append({"truck_id": truck_id, "customer_name": f"Customer {t}-{order}", "latitude": lat,
+                         "longitude": lon, "route_order": order, "state": "Maharashtra", "truck_type": "Tata 407"})
+        stop_points = [DEPOT, *map(tuple, customers), DEPOT]
+        legs = [dense_leg(router, a, b, rng) for a, b in zip(stop_points[:-1], stop_points[1:])]
+        line = np.concatenate([legs[0]] + [leg[1:] for leg in legs[1:]])
+        roads[truck_id] = line
+    return pd.DataFrame(rows), roads
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trucks", type=int, nargs="+", default=[5, 20])
+    parser.add_argument("--stops", type=int, default=10)
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore", message="CartoDB tiles")  # folium's tile notice, not ours
+
+    warehouses = pd.DataFrame({"warehouse_name": ["Pune"], "state": ["Maharashtra"],
+                               "latitude": [DEPOT[0]], "longitude": [DEPOT[1]]})
+    print(f"{'trucks':>6} {'vertices':>9} {'lod s':>6} {'full MB':>8} {'full build s':>12} "
+          f"{'lod vertices':>12} {'lod MB':>7} {'lod build s':>11} {'smaller':>8}")
+    for trucks in args.trucks:
+        allocated, lines = busy_day(trucks, args.stops, seed=trucks)
+        start = time.perf_counter()
+        roads = {truck_id: (line, vertex_zooms(line)) for truck_id, line in lines.items()}
+        lod_s = time.perf_counter() - start  # once per leg, when it enters the route cache
+
+        results = []
+        for detail_zoom in (HIDDEN, None):
+            start = time.perf_counter()
+            html = create_colored_route_map(allocated, None, warehouses, road_routes=roads,
+                                            detail_zoom=detail_zoom).get_root().render()
+            results.append((len(html.encode()) / 2**20, time.perf_counter() - start))
+        vertices = sum(len(line) for line in lines.values())
+        kept = 0
+        for truck_id, (line, zooms) in roads.items():
+            stops = np.vstack(([DEPOT], allocated.loc[allocated.truck_id == truck_id, ["latitude", "longitude"]]))
+            kept += len(at_zoom(line, zooms, fit_zoom(stops) + DETAIL_ZOOM_IN))
+        (full_mb, full_s), (lod_mb, lod_build_s) = results
+        print(f"{trucks:>6} {vertices:>9} {lod_s:>6.2f} {full_mb:>8.2f} {full_s:>12.2f} "
+              f"{kept:>12} {lod_mb:>7.2f} {lod_build_s:>11.2f} {full_mb / lod_mb:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
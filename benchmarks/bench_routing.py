@@ -0,0 +1,53 @@
+#Benchmark: nearest neighbor routing, legacy np.delete loop vs the KD-tree builder
+# Run from the repo root:  python -m benchmarks.bench_routing [--legacy-max N]
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_state, WAREHOUSE
+from utils.route_utils import haversine_np, nearest_neighbor_route
+
+
+# The loop utils/logic.py and utils/route_utils.py both used before
+def legacy_route(customer_coords, start_coord):
+    coords = np.array(customer_coords)
+    visited = [start_coord]
+    current = np.array(start_coord)
+    remaining = coords.copy()
+    while len(remaining) > 0:
+        distances = haversine_np(current[0], current[1], remaining[:, 0], remaining[:, 1])
+        nearest_idx = np.argmin(distances)
+        nearest_coord = remaining[nearest_idx]
+        visited.append(tuple(nearest_coord))
+        remaining = np.delete(remaining, nearest_idx, axis=0)
+        current = nearest_coord
+    return visited
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 5_000, 20_000])
+    parser.add_argument("--legacy-max", type=int, default=20_000)
+    args = parser.parse_args()
+
+    print(f"{'stops':>8} {'legacy s':>10} {'kd-tree s':>10} {'speedup':>8}  same")
+    for n in args.sizes:
+        customer_summary, _ = make_state(n)
+        coords = list(zip(customer_summary['latitude'], customer_summary['longitude']))
+
+        start = time.perf_counter()
+        new = nearest_neighbor_route(coords, WAREHOUSE)
+        tree_s = time.perf_counter() - start
+
+        if n <= args.legacy_max:
+            start = time.perf_counter()
+            old = legacy_route(coords, WAREHOUSE)
+            legacy_s = time.perf_counter() - start
+            print(f"{n:>8} {legacy_s:>10.3f} {tree_s:>10.3f} {legacy_s / tree_s:>7.1f}x  {old == new}")
+        else:
+            print(f"{n:>8} {'skipped':>10} {tree_s:>10.3f} {'-':>8}  -")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#Benchmark: N^2 single-pair routing requests vs one bulk matrix() call vs the memoized matrix on the next day
+# Run from the repo root:  python -m benchmarks.bench_routing_backend
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from utils.routing_backend import HTTPBackend, MemoizedBackend, RoadBackend, make_server
+
+
+def customers(n, seed=0):
+    # Points inside the bundled sample graph (Maharashtra)
+    rng = np.random.default_rng(seed)
+    return np.column_stack((rng.uniform(16.5, 20.5, n), rng.uniform(73.5, 79.5, n)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--points", type=int, nargs="+", default=[25, 50, 100])
+    parser.add_argument("--moved", type=float, default=0.05, help="share of customers that are new the next day")
+    args = parser.parse_args()
+
+    server = make_server(port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    print(f"{'points':>6} {'pairs':>7} {'single reqs':>11} {'single s':>9} {'bulk reqs':>9} {'bulk s':>7} "
+          f"{'road s':>7} {'next day s':>10} {'next reqs':>9} {'same':>5}")
+    for n in args.points:
+        points = customers(n, seed=n)
+
+        # Old way: one HTTP request per origin-destination pair
+        single = HTTPBackend(url)
+        start = time.perf_counter()
+        one_by_one = np.array([[single.matrix([a], [b])[0, 0] for b in points] for a in points])
+        single_s = time.perf_counter() - start
+
+        with tempfile.TemporaryDirectory() as tmp:
+            bulk = MemoizedBackend(HTTPBackend(url), path=os.path.join(tmp, "memo.db"))
+            start = time.perf_counter()
+            km = bulk.matrix(points, points)
+            bulk_s = time.perf_counter() - start
+            bulk_requests = bulk.backend.requests
+
+            road = MemoizedBackend(RoadBackend(), path=os.path.join(tmp, "road.db"))
+            start = time.perf_counter()
+            road.matrix(points, points)
+            road_s = time.perf_counter() - start
+
+            # Next day: a fresh process (empty memory) and a few new customers
+            rng = np.random.default_rng(n + 1)
+            moved = rng.random(n) < args.moved
+            tomorrow = points.copy()
+            tomorrow[moved] = customers(int(moved.sum()), seed=n + 2)
+            next_day = MemoizedBackend(HTTPBackend(url), path=os.path.join(tmp, "memo.db"))
+            start = time.perf_counter()
+            next_day.matrix(tomorrow, tomorrow)
+            next_s = time.perf_counter() - start
+            bulk.close(), road.close(), next_day.close()
+
+        print(f"{n:>6} {n * n:>7} {single.requests:>11} {single_s:>9.3f} {bulk_requests:>9} {bulk_s:>7.3f} "
+              f"{road_s:>7.3f} {next_s:>10.3f} {next_day.backend.requests:>9} "
+              f"{str(bool(np.allclose(one_by_one, km, rtol=1e-6))):>5}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+#Benchmark: per-customer DataFrame filter + sort vs one searchsorted pass for truck type selection
+# Run from the repo root:  python -m benchmarks.bench_truck_selection
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_state
+from utils.packing import smallest_feasible_truck
+
+
+def legacy_select(customer_summary, truck_capacity):
+    types = []
+    for _, row in customer_summary.iterrows():
+        total_weight = row['total_weight_kg']
+        suitable_trucks = truck_capacity[
+            (truck_capacity['min_capacity_kg'] <= total_weight) &
+            (total_weight <= truck_capacity['max_capacity_kg'])
+        ].sort_values(by='capacity_tons')
+        types.append(suitable_trucks.iloc[0]['truck_type'] if not suitable_trucks.empty else None)
+    return types
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1_000, 10_000, 100_000])
+    parser.add_argument("--legacy-max", type=int, default=10_000)
+    args = parser.parse_args()
+
+    print(f"{'customers':>10} {'legacy s':>9} {'vector s':>9} {'same':>5}")
+    for n in args.sizes:
+        customer_summary, trucks = make_state(n, seed=n)
+        # Mix in weights that only the big trucks (or none) can take
+        customer_summary['total_weight_kg'] *= np.random.default_rng(n).choice([1, 2, 20, 40], n)
+
+        start = time.perf_counter()
+        choice = smallest_feasible_truck(customer_summary['total_weight_kg'], trucks['capacity_tons'],
+                                         trucks['min_capacity_kg'], trucks['max_capacity_kg'])
+        types = trucks['truck_type'].to_numpy(dtype=object)
+        selected = np.where(choice >= 0, types[choice], None).tolist()
+        vector_s = time.perf_counter() - start
+
+        legacy_s, same = float("nan"), "-"
+        if n <= args.legacy_max:
+            start = time.perf_counter()
+            expected = legacy_select(customer_summary, trucks)
+            legacy_s = time.perf_counter() - start
+            same = str(expected == selected)
+        print(f"{n:>10} {legacy_s:>9.3f} {vector_s:>9.4f} {same:>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#Local stand-in for the GraphHopper /route endpoint: road geometry from the offline router, fixed latency, a rate limit
+# Run from the repo root:  python -m benchmarks.mock_graphhopper --port 8989 --latency-ms 40 --rate 100
+import argparse
+import asyncio
+import threading
+import time
+
+import polyline
+from aiohttp import web
+
+from utils.road_router import get_road_router
+
+
+class MockGraphHopper:
+    """
+    Answers GET /route?point=lat,lon&point=lat,lon like GraphHopper (encoded
+    points), after latency_ms. More than `rate` requests per second (token
+    bucket of `burst`) get 429 with a Retry-After. Counts requests, 429s and
+    the most requests it served at once.
+    """
+
+    def __init__(self, latency_ms=40, rate=None, burst=10):
+        self.latency_ms = latency_ms
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.refilled = time.monotonic()
+        self.requests = 0
+        self.throttled = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.router = get_road_router()
+
+    def _take_token(self):
+        """0 if the request may run, else seconds until it could."""
+        if self.rate is None:
+            return 0
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled) * self.rate)
+        self.refilled = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    async def route(self, request):
+        self.requests += 1
+        wait = self._take_token()
+        if wait:
+            self.throttled += 1
+            return web.json_response({"message": "API limit reached"}, status=429,
+                                     headers={"Retry-After": f"{wait:.3f}"})
+        try:
+            (a_lat, a_lon), (b_lat, b_lon) = [map(float, p.split(",")) for p in request.query.getall("point")]
+        except ValueError:
+            return web.json_response({"message": "two points required"}, status=400)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency_ms / 1000)
+            km, points = self.router.route((a_lat, a_lon), (b_lat, b_lon))
+            if not points:
+                km, points = None, [(a_lat, a_lon), (b_lat, b_lon)]
+            return web.json_response({"paths": [{"distance": (km or 0) * 1000, "points": polyline.encode(points)}]})
+        finally:
+            self.in_flight -= 1
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get("/route", self.route)
+        return app
+
+
+def start_in_thread(server, port=0):
+    """Runs the server on a background event loop; returns its /route URL."""
+    ready = threading.Event()
+    address = {}
+
+    def run():
+        loop = asyncio.new_event_loop()
+        runner = web.AppRunner(server.app())
+        loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, "127.0.0.1", port)
+        loop.run_until_complete(site.start())
+        address["port"] = site._server.sockets[0].getsockname()[1]
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return f"http://127.0.0.1:{address['port']}/route"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8989)
+    parser.add_argument("--latency-ms", type=float, default=40)
+    parser.add_argument("--rate", type=float, default=None, help="requests per second before 429s (default unlimited)")
+    args = parser.parse_args()
+    print(f"[INFO] Mock GraphHopper on http://127.0.0.1:{args.port}/route")
+    web.run_app(MockGraphHopper(args.latency_ms, args.rate).app(), host="127.0.0.1", port=args.port, print=None)
@@ -0,0 +1,98 @@
+#Synthetic day generator shared by the benchmarks
+import numpy as np
+import pandas as pd
+
+# Rough bounding box of Maharashtra
+LAT_RANGE = (15.8, 22.0)
+LON_RANGE = (72.6, 80.9)
+WAREHOUSE = (19.0760, 72.8777)
+
+# Same truck mix as data/trucks.csv for Maharashtra
+TRUCKS = [
+    ("Mini Truck", 1.0),
+    ("Tempo", 0.8),
+    ("Large Truck", 12.0),
+    ("Heavy Duty Truck", 16.0),
+]
+
+
+def make_state(n_customers, seed=0, state="Maharashtra"):
+    """
+    One state's customer summary (already FILO sorted like filo_grouped_truck_allocation
+    leaves it) plus its trucks with min/max capacity for a 60-95% load window.
+    """
+    rng = np.random.default_rng(seed)
+    customer_summary = pd.DataFrame({
+        "customer_id": np.arange(1, n_customers + 1).astype(str),
+        "customer_name": [f"Customer {i}" for i in range(1, n_customers + 1)],
+        "latitude": rng.uniform(*LAT_RANGE, n_customers).round(4),
+        "longitude": rng.uniform(*LON_RANGE, n_customers).round(4),
+        "delivery_date": "2025-07-07",
+        "total_weight_kg": rng.integers(38, 48, n_customers) * 10.0,
+        "total_volume_m3": rng.uniform(0.1, 3.0, n_customers).round(3),
+    })
+    customer_summary["route_order"] = rng.permutation(n_customers) + 1
+    customer_summary = customer_summary.sort_values(by="route_order", ascending=False)
+
+    trucks = pd.DataFrame(TRUCKS, columns=["truck_type", "capacity_tons"])
+    trucks["state"] = state
+    trucks["min_capacity_kg"] = trucks["capacity_tons"] * 1000 * 0.60
+    trucks["max_capacity_kg"] = trucks["capacity_tons"] * 1000 * 0.95
+    trucks = trucks.sort_values(by="capacity_tons", ascending=False)
+    return customer_summary, trucks
+
+
+def build_sample_graph(spacing=0.15, seed=0, drop=0.08, one_way=0.03, detour=1.25):
+    """
+    Jittered road grid over LAT_RANGE x LON_RANGE (with some diagonals, missing
+    roads and one-way streets), trimmed to its largest connected part.
+    Returns lat, lon, u, v, length_m for utils.road_router.RoadRouter.
+    """
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    from utils.route_utils import haversine_np
+
+    rng = np.random.default_rng(seed)
+    lats = np.arange(LAT_RANGE[0] - spacing, LAT_RANGE[1] + spacing, spacing)
+    lons = np.arange(LON_RANGE[0] - spacing, LON_RANGE[1] + spacing, spacing)
+    rows, cols = len(lats), len(lons)
+    grid_lat, grid_lon = np.meshgrid(lats, lons, indexing="ij")
+    lat = (grid_lat + rng.normal(0, spacing / 6, grid_lat.shape)).ravel()
+    lon = (grid_lon + rng.normal(0, spacing / 6, grid_lon.shape)).ravel()
+    ids = np.arange(rows * cols).reshape(rows, cols)
+
+    pairs = [
+        (ids[:, :-1].ravel(), ids[:, 1:].ravel()),  # east
+        (ids[:-1, :].ravel(), ids[1:, :].ravel()),  # north
+    ]
+    diagonal = rng.random((rows - 1, cols - 1)) < 0.3
+    pairs.append((ids[:-1, :-1][diagonal], ids[1:, 1:][diagonal]))
+    a = np.concatenate([p[0] for p in pairs])
+    b = np.concatenate([p[1] for p in pairs])
+    keep = rng.random(len(a)) >= drop
+    a, b = a[keep], b[keep]
+
+    # Both directions, except a few one-way roads
+    forward_only = rng.random(len(a)) < one_way
+    u = np.concatenate((a, b[~forward_only]))
+    v = np.concatenate((b, a[~forward_only]))
+
+    n = len(lat)
+    _, labels = connected_components(csr_matrix((np.ones(len(u)), (u, v)), shape=(n, n)), connection="strong")
+    main = labels == np.bincount(labels).argmax()
+    new_id = np.cumsum(main) - 1
+    edge_keep = main[u] & main[v]
+    u, v = new_id[u[edge_keep]], new_id[v[edge_keep]]
+    lat, lon = lat[main], lon[main]
+    length_m = haversine_np(lat[u], lon[u], lat[v], lon[v]) * 1000 * detour
+    return lat, lon, u, v, length_m
+
+
+if __name__ == "__main__":
+    # Rebuilds the bundled test graph:  python -m benchmarks.synthetic
+    from utils.road_router import SAMPLE_GRAPH, RoadRouter
+
+    router = RoadRouter(*build_sample_graph())
+    router.save(SAMPLE_GRAPH)
+    print(f"{SAMPLE_GRAPH}: {len(router)} nodes, {router.graph.nnz} edges")
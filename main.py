@@ -1,7 +1,7 @@
 import streamlit as st
 import pandas as pd
 from datetime import date
-from utils import auth
+from utils import auth, allocation_store, db_utils
 
 st.set_page_config(page_title="Truck Delivery Optimizer", layout="wide")
 auth.require_login_and_sidebar()
@@ -11,10 +11,10 @@ st.markdown(f"Welcome **{st.session_state['username'].capitalize()}** 👋")
 st.markdown("Use the sidebar to navigate between different modules.")
 st.markdown("---")
 
-# Utility to safely read CSV files
+# Utility to safely read tables (CSV or SQLite, see db_utils.get_storage)
 def safe_read_csv(path):
     try:
-        return pd.read_csv(path)
+        return db_utils.load_csv(path)
     except:
         return pd.DataFrame()
 
@@ -22,7 +22,6 @@ def safe_read_csv(path):
 orders_df = safe_read_csv("data/orders.csv")
 customers_df = safe_read_csv("data/customers.csv")
 products_df = safe_read_csv("data/products.csv")
-allocation_df = safe_read_csv("data/allocation.csv")
 trucks_df = safe_read_csv("data/trucks.csv")
 
 # Ensure orders have order_id
@@ -30,9 +29,7 @@ if not orders_df.empty and "order_id" not in orders_df.columns:
     orders_df["order_id"] = range(1, len(orders_df) + 1)
 
 # Convert date fields to datetime.date
-orders_df['delivery_date'] = pd.to_datetime(orders_df['delivery_date'], errors='coerce').dt.date
-if not allocation_df.empty:
-    allocation_df['delivery_date'] = pd.to_datetime(allocation_df['delivery_date'], errors='coerce').dt.date
+orders_df['delivery_date'] = orders_df['delivery_date'].dt.date
 
 # ========== 🔒 ADMIN DASHBOARD ==========
 if st.session_state["role"] == "admin":
@@ -52,6 +49,9 @@ if st.session_state["role"] == "admin":
         if daily_orders.empty:
             st.warning("No orders found for selected date.")
         else:
+            # Only the selected date's allocation is read
+            allocation_df = allocation_store.load_allocation(selected_date)
+
             # Merge customer and product names
             daily_orders = daily_orders.merge(customers_df[['customer_id', 'customer_name']], on='customer_id', how='left')
             daily_orders = daily_orders.merge(products_df[['product_id', 'product_name']], on='product_id', how='left')
@@ -85,6 +85,9 @@ else:
             (orders_df['placed_by'] == username) & (orders_df['customer_id'] == customer_id)
         ].copy()
 
+        # Allocations of the dates this user has orders on
+        allocation_df = allocation_store.load_allocations(user_orders['delivery_date'].unique())
+
         if not user_orders.empty and not allocation_df.empty:
             # Merge with allocation using customer_id + delivery_date
             allocated_orders = user_orders.merge(
@@ -1,5 +1,5 @@
 import streamlit as st
-from utils import auth, db_utils
+from utils import auth, db_utils, allocation_store
 from geopy.geocoders import Nominatim
 import pandas as pd
 from io import BytesIO
@@ -15,7 +15,6 @@ st.title("👤 Customer Profile")
 CUSTOMER_FILE = "customers.csv"
 ORDERS_FILE = "orders.csv"
 PRODUCT_FILE = "products.csv"
-ALLOCATION_FILE = "allocation.csv"
 geolocator = Nominatim(user_agent="truck_delivery_optimizer")
 
 # Session info
@@ -27,7 +26,6 @@ customer_id = st.session_state.get("customer_id")
 customers_df = db_utils.load_csv(CUSTOMER_FILE)
 orders_df = db_utils.load_csv(ORDERS_FILE)
 products_df = db_utils.load_csv(PRODUCT_FILE)
-allocation_df = db_utils.load_csv(ALLOCATION_FILE) if os.path.exists(os.path.join("data", ALLOCATION_FILE)) else pd.DataFrame()
 
 # Check for required column
 if "customer_id" not in customers_df.columns:
@@ -84,8 +82,7 @@ if role == "admin":
                                 "phone": phone,
                                 "email": email
                             }])
-                            customers_df = pd.concat([customers_df, new_row], ignore_index=True)
-                            db_utils.save_csv(customers_df, CUSTOMER_FILE)
+                            db_utils.insert_rows(CUSTOMER_FILE, new_row)
                             st.success(f"✅ Customer '{name}' added successfully!")
                         else:
                             st.error("❌ Failed to fetch coordinates.")
@@ -96,8 +93,7 @@ if role == "admin":
             delete_id = st.text_input("Enter Customer ID to Delete")
             if st.button("Delete"):
                 if delete_id in customers_df["customer_id"].astype(str).values:
-                    customers_df = db_utils.delete_entry_by_id(customers_df, "customer_id", delete_id)
-                    db_utils.save_csv(customers_df, CUSTOMER_FILE)
+                    db_utils.delete_rows(CUSTOMER_FILE, "customer_id", [delete_id])
                     st.success(f"✅ Customer ID '{delete_id}' deleted.")
                 else:
                     st.warning("⚠️ Customer ID not found.")
@@ -140,12 +136,13 @@ else:
                         lat, lon = None, None
 
                     if lat and lon:
-                        customers_df.loc[customers_df["customer_id"] == customer_id, "address"] = new_address
-                        customers_df.loc[customers_df["customer_id"] == customer_id, "latitude"] = lat
-                        customers_df.loc[customers_df["customer_id"] == customer_id, "longitude"] = lon
-                        customers_df.loc[customers_df["customer_id"] == customer_id, "phone"] = new_phone
-                        customers_df.loc[customers_df["customer_id"] == customer_id, "email"] = new_email
-                        db_utils.save_csv(customers_df, CUSTOMER_FILE)
+                        db_utils.update_row(CUSTOMER_FILE, "customer_id", customer_id, {
+                            "address": new_address,
+                            "latitude": lat,
+                            "longitude": lon,
+                            "phone": new_phone,
+                            "email": new_email
+                        })
                         st.success("✅ Details updated successfully!")
                         st.rerun()
                     else:
@@ -158,15 +155,16 @@ else:
     if not orders_df.empty and "placed_by" in orders_df.columns:
         user_orders = orders_df[orders_df["placed_by"] == username].copy()
         if not user_orders.empty:
-            user_orders['delivery_date'] = pd.to_datetime(user_orders['delivery_date'], errors='coerce').dt.date
+            user_orders['delivery_date'] = user_orders['delivery_date'].dt.date
             if 'order_date' in user_orders.columns:
-                user_orders['order_date'] = pd.to_datetime(user_orders['order_date'], errors='coerce').dt.date
+                user_orders['order_date'] = user_orders['order_date'].dt.date
 
             user_orders = user_orders.merge(products_df[['product_id', 'product_name']], on='product_id', how='left')
 
             # ✅ Merge using customer_id and delivery_date to get truck_id and truck_type
+            # (only the allocation dates of this user's orders are read)
+            allocation_df = allocation_store.load_allocations(user_orders['delivery_date'].unique())
             if not allocation_df.empty and "truck_id" in allocation_df.columns:
-                allocation_df['delivery_date'] = pd.to_datetime(allocation_df['delivery_date'], errors='coerce').dt.date
                 user_orders = user_orders.merge(
                     allocation_df[['customer_id', 'delivery_date', 'truck_id', 'truck_type']],
                     on=['customer_id', 'delivery_date'],
@@ -53,8 +53,7 @@ with st.expander("➕ Add New Truck Type"):
                     "cost_per_km": cost_per_km,
                     "fuel_efficiency_kmpl": fuel_efficiency_kmpl
                 }])
-                trucks_df = pd.concat([trucks_df, new_entry], ignore_index=True)
-                db_utils.save_csv(trucks_df, TRUCK_FILE)
+                db_utils.insert_rows(TRUCK_FILE, new_entry)
                 st.success(f"✅ Truck '{truck_type}' added successfully with ID `{auto_id}`!")
             else:
                 st.warning("⚠️ Please fill in all fields.")
@@ -69,8 +68,7 @@ if not trucks_df.empty:
         delete_type = st.text_input("Enter Truck Type to Delete")
         if st.button("Delete Truck"):
             if delete_type in trucks_df["truck_type"].values:
-                trucks_df = db_utils.delete_entry_by_id(trucks_df, "truck_type", delete_type)
-                db_utils.save_csv(trucks_df, TRUCK_FILE)
+                db_utils.delete_rows(TRUCK_FILE, "truck_type", [delete_type])
                 st.success(f"✅ Truck Type '{delete_type}' deleted.")
             else:
                 st.warning("⚠️ Truck Type not found.")
@@ -53,8 +53,7 @@ with st.expander("➕ Add New Product"):
                     "size_per_box": size_per_box,
                     "available_stock": int(available_stock)
                 }])
-                products_df = pd.concat([products_df, new_entry], ignore_index=True)
-                db_utils.save_csv(products_df, PRODUCT_FILE)
+                db_utils.insert_rows(PRODUCT_FILE, new_entry)
                 st.success(f"✅ Product '{product_name}' added with ID {product_id}!")
             else:
                 st.warning("⚠️ Please fill in all fields with valid values.")
@@ -74,11 +73,10 @@ if not products_df.empty:
             submit_edit = st.form_submit_button("Update Product")
 
             if submit_edit:
-                idx = products_df[products_df["product_id"] == selected_id].index[0]
-                products_df.at[idx, "product_name"] = new_name
-                products_df.at[idx, "weight_per_box"] = new_weight
-                products_df.at[idx, "available_stock"] += int(add_stock)
-                db_utils.save_csv(products_df, PRODUCT_FILE)
+                # Stock is added to the current value, not this page's copy: orders placed since keep their stock
+                db_utils.update_row(PRODUCT_FILE, "product_id", selected_id,
+                                    {"product_name": new_name, "weight_per_box": new_weight},
+                                    add={"available_stock": int(add_stock)})
                 st.success(f"✅ Product ID {selected_id} updated. Stock increased by {add_stock}.")
 
 # ------------------ PRODUCT TABLE ------------------
@@ -92,8 +90,7 @@ if not products_df.empty:
         delete_id = st.text_input("Enter Product ID to Delete")
         if st.button("Delete Product"):
             if delete_id.isdigit() and int(delete_id) in products_df["product_id"].astype(int).values:
-                products_df = db_utils.delete_entry_by_id(products_df, "product_id", int(delete_id))
-                db_utils.save_csv(products_df, PRODUCT_FILE)
+                db_utils.delete_rows(PRODUCT_FILE, "product_id", [int(delete_id)])
                 st.success(f"✅ Product with ID '{delete_id}' deleted.")
             else:
                 st.warning("⚠️ Product ID not found.")
@@ -1,5 +1,4 @@
 import streamlit as st
-import pandas as pd
 from utils import db_utils, auth
 
 st.set_page_config(page_title="Order Transactions", layout="wide")
@@ -28,7 +27,7 @@ if not orders_df.empty:
 
     # Format columns
     merged_df["order_id"] = merged_df["order_id"].astype(str)
-    merged_df["delivery_date"] = pd.to_datetime(merged_df["delivery_date"], errors='coerce').dt.date
+    merged_df["delivery_date"] = merged_df["delivery_date"].dt.date
 
     st.subheader("📋 All Order Transactions")
 
@@ -59,8 +58,7 @@ if not orders_df.empty:
         delete_id = st.text_input("Enter Order ID to Delete")
         if st.button("Delete Order"):
             if delete_id in orders_df["order_id"].astype(str).values:
-                orders_df = db_utils.delete_entry_by_id(orders_df, "order_id", delete_id)
-                db_utils.save_csv(orders_df, ORDER_FILE)
+                db_utils.delete_rows(ORDER_FILE, "order_id", [delete_id])
                 st.success(f"✅ Order '{delete_id}' deleted successfully!")
                 st.rerun()
             else:
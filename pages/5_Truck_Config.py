@@ -1,21 +1,3 @@
-<<<<<<< HEAD
-import streamlit as st
-st.set_page_config(page_title="Truck Configuration", layout="wide")
-import json
-import os
-from utils import auth
-auth.require_login_and_sidebar()
-
-# # Access role:
-# role = st.session_state.get("role", "admin") 
-
-st.title("⚙️ Truck Load Configuration")
-
-CONFIG_FILE = "config/config.json"
-
-# Load configuration or set default with error handling
-config = {"min_load_percent": 60, "max_load_percent": 95}  # Default values
-=======
 # import streamlit as st
 # st.set_page_config(page_title="Truck Configuration", layout="wide")
 # import json
@@ -64,7 +46,7 @@ import streamlit as st
 import json
 import os
 import pandas as pd
-from utils import auth
+from utils import auth, db_utils, allocation_cache, map_cache
 
 # Page config
 st.set_page_config(page_title="Truck Configuration", layout="wide")
@@ -80,7 +62,6 @@ CONFIG_FILE = "config/config.json"
 
 # Load configuration or use defaults
 config = {"min_load_percent": 60, "max_load_percent": 95}
->>>>>>> df81800 (Enhanced delivery map with GraphHopper for optimized truck routing.)
 if os.path.exists(CONFIG_FILE):
     try:
         with open(CONFIG_FILE, "r") as f:
@@ -90,35 +71,121 @@ if os.path.exists(CONFIG_FILE):
     except json.JSONDecodeError:
         st.warning("⚠️ Configuration file is invalid. Using default values.")
 
-<<<<<<< HEAD
-=======
 # Form for configuration
->>>>>>> df81800 (Enhanced delivery map with GraphHopper for optimized truck routing.)
 with st.form("config_form"):
     st.subheader("🚛 Truck Load Limits")
     min_load = st.slider("Minimum Truck Load (%)", 0, 100, config.get("min_load_percent", 60))
     max_load = st.slider("Maximum Truck Load (%)", 0, 100, config.get("max_load_percent", 95))
+
+    st.subheader("🗺️ Route Improvement")
+    # Off unless turned on here: it changes route order, distance and fuel of every allocation
+    improve_on = st.checkbox("Improve truck routes with 2-opt / Or-opt (shorter routes, changes route order and fuel)",
+                             value=int(config.get("route_improvement_ms", 0)) > 0)
+    improve_checks = st.number_input(
+        "2-opt / Or-opt moves tried per route (same result on every run)",
+        min_value=1, max_value=10_000_000, step=10_000, value=max(1, int(config.get("route_improvement_checks", 50_000)))
+    )
+    improve_ms = st.number_input(
+        "Safety time cap per route (ms)",
+        min_value=1, max_value=60_000, step=100, value=int(config.get("route_improvement_ms", 0)) or 1000
+    )
+
+    st.subheader("🛣️ Distances")
+    backends = ["haversine", "road", "http"]
+    distance_backend = st.selectbox(
+        "Distance used for routing and costing (road = offline road graph, http = routing server)",
+        backends, index=backends.index(config.get("distance_backend", "haversine"))
+    )
+    routing_url = st.text_input("Routing server URL (http only)", value=config.get("routing_url", "http://127.0.0.1:8765"))
+    distance_cache_mb = st.number_input(
+        "Memory for cached distance matrices (MB)",
+        min_value=1, max_value=16384, step=16, value=int(config.get("distance_cache_mb", 256))
+    )
+
+    st.subheader("⚙️ Parallel Allocation")
+    workers = st.number_input(
+        "Worker processes for multi-state allocation (1 = off)",
+        min_value=1, max_value=64, step=1, value=int(config.get("allocation_workers", 1))
+    )
+
+    st.subheader("🗃️ Table Cache")
+    cache_mb = st.number_input(
+        "Memory for cached tables (MB)",
+        min_value=1, max_value=16384, step=16, value=int(config.get("table_cache_mb", 256))
+    )
+
+    st.subheader("📦 Allocation Cache")
+    allocation_cache_mb = st.number_input(
+        "Memory for cached allocation results (MB)",
+        min_value=1, max_value=16384, step=16, value=int(config.get("allocation_cache_mb", 128))
+    )
+
+    st.subheader("🗺️ Map Cache")
+    map_cache_maps = st.number_input(
+        "Route maps kept in memory", min_value=1, max_value=256, step=1, value=int(config.get("map_cache_maps", 8))
+    )
+    map_cache_mb = st.number_input(
+        "Memory for rendered map downloads (MB)",
+        min_value=1, max_value=4096, step=16, value=int(config.get("map_cache_mb", 64))
+    )
     submitted = st.form_submit_button("Save Configuration")
 
     if submitted:
         if min_load >= max_load:
             st.error("❌ Minimum load should be less than Maximum load.")
         else:
-            config = {"min_load_percent": min_load, "max_load_percent": max_load}
+            # Keep any other settings stored in the file
+            config = {**config, "min_load_percent": min_load, "max_load_percent": max_load,
+                      "route_improvement_ms": int(improve_ms) if improve_on else 0,
+                      "route_improvement_checks": int(improve_checks),
+                      "allocation_workers": int(workers),
+                      "table_cache_mb": int(cache_mb), "distance_backend": distance_backend,
+                      "routing_url": routing_url.strip(), "distance_cache_mb": int(distance_cache_mb),
+                      "map_cache_maps": int(map_cache_maps),
+                      "map_cache_mb": int(map_cache_mb), "allocation_cache_mb": int(allocation_cache_mb)}
             os.makedirs(os.path.dirname(CONFIG_FILE), exist_ok=True)
             with open(CONFIG_FILE, "w") as f:
                 json.dump(config, f, indent=4)
             st.success("✅ Configuration saved successfully!")
 
-<<<<<<< HEAD
-st.subheader("🔧 Current Configuration")
-st.json(config)
-=======
 # Display current configuration as a table
 st.subheader("📋 Current Configuration")
 config_df = pd.DataFrame({
-    "Parameter": ["Minimum Truck Load (%)", "Maximum Truck Load (%)"],
-    "Value": [config["min_load_percent"], config["max_load_percent"]]
+    "Parameter": ["Minimum Truck Load (%)", "Maximum Truck Load (%)", "Route Improvement Moves Tried (per route)",
+                  "Route Improvement Time Cap (ms/route, 0 = off)",
+                  "Allocation Worker Processes", "Table Cache (MB)", "Distance Backend", "Distance Matrix Cache (MB)",
+                  "Cached Route Maps", "Map Download Cache (MB)", "Allocation Cache (MB)"],
+    "Value": [config["min_load_percent"], config["max_load_percent"], config.get("route_improvement_checks", 50_000),
+              config.get("route_improvement_ms", 0),
+              config.get("allocation_workers", 1), config.get("table_cache_mb", 256),
+              config.get("distance_backend", "haversine"), config.get("distance_cache_mb", 256), config.get("map_cache_maps", 8),
+              config.get("map_cache_mb", 64), config.get("allocation_cache_mb", 128)]
 })
 st.table(config_df)
->>>>>>> df81800 (Enhanced delivery map with GraphHopper for optimized truck routing.)
+
+# Table cache counters of this server process
+stats = db_utils.table_cache_stats()
+st.subheader("🗃️ Table Cache Usage")
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Hits", stats["hits"])
+col2.metric("Misses", stats["misses"])
+col3.metric("Hit Rate", f"{stats['hit_rate'] * 100:.1f}%")
+col4.metric("Memory", f"{stats['bytes'] / 2**20:.1f} / {stats['max_bytes'] / 2**20:.0f} MB")
+
+# Allocation cache counters of this server process (keyed by a fingerprint of the allocation's inputs)
+stats = allocation_cache.allocation_cache_stats()
+st.subheader("📦 Allocation Cache Usage")
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Hits", stats["hits"])
+col2.metric("Misses", stats["misses"])
+col3.metric("Hit Rate", f"{stats['hit_rate'] * 100:.1f}%")
+col4.metric("Memory", f"{stats['bytes'] / 2**20:.1f} / {stats['max_bytes'] / 2**20:.0f} MB")
+
+# Route map cache counters of this server process
+stats = map_cache.map_cache_stats()
+st.subheader("🗺️ Map Cache Usage")
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Map Hits", stats["hits"])
+col2.metric("Map Misses", stats["misses"])
+col3.metric("Downloads Served from Cache", f"{stats['html_hits']} / {stats['html_hits'] + stats['html_misses']}")
+col4.metric("Download Memory", f"{stats['html_bytes'] / 2**20:.1f} / {stats['max_html_bytes'] / 2**20:.0f} MB")
@@ -5,18 +5,16 @@ import pandas as pd
 import folium
 from streamlit_folium import st_folium
 
-from io import BytesIO
 import os
 from datetime import date
 
-from utils import db_utils, logic, map_utils, auth
+from utils import db_utils, logic, map_utils, map_cache, allocation_cache, auth, allocation_store, route_geometry, route_fetcher
 
 auth.require_login_and_sidebar()
 
 st.title("📦🚛 Truck Allocation & Route Optimization")
 
-# Load data once using caching
-@st.cache_data
+# Served from db_utils' table cache, which re-reads a table only after its file changed
 def load_all_data():
     return (
         db_utils.load_csv("orders.csv"),
@@ -40,9 +38,9 @@ st.subheader("📅 Select Delivery Date")
 selected_date = st.date_input("Delivery Date")
 date_key = str(selected_date)
 
-@st.cache_data(show_spinner="🔄 Running FILO allocation...", hash_funcs={pd.DataFrame: lambda _: None})
-def run_filo_allocation(filtered_orders, customers_df, products_df, trucks_df, config, warehouses_df):
-    return logic.filo_grouped_truck_allocation(
+# Cached by a fingerprint of the input frames' content (see utils.allocation_cache), shared by all sessions
+def run_filo_allocation(filtered_orders, customers_df, products_df, trucks_df, config, warehouses_df, context=None):
+    return allocation_cache.filo_grouped_truck_allocation(
         filtered_orders=filtered_orders,
         customers_df=customers_df,
         products_df=products_df,
@@ -50,13 +48,14 @@ def run_filo_allocation(filtered_orders, customers_df, products_df, trucks_df, c
         config=config,
         fuel_price_per_litre=90.0,
         mileage_kmpl=4.0,
-        warehouses_df=warehouses_df
+        warehouses_df=warehouses_df,
+        context=context
     )
 
 run_triggered = st.button("🚚 Run Allocation")
 
 if run_triggered:
-    orders_df['delivery_date'] = pd.to_datetime(orders_df['delivery_date'], errors='coerce').dt.date
+    orders_df['delivery_date'] = orders_df['delivery_date'].dt.date
     selected_date = pd.to_datetime(selected_date).date()
     filtered_orders = orders_df[orders_df['delivery_date'] == selected_date]
 
@@ -64,14 +63,16 @@ if run_triggered:
         st.warning("⚠️ No orders found for the selected date.")
     else:
         with st.spinner("🔄 Running Allocation Logic..."):
-            customer_summary = logic.prepare_customer_summary(filtered_orders, customers_df, products_df)
+            # Join orders, customers and products once for all three reports
+            context = logic.AllocationContext(filtered_orders, customers_df, products_df, trucks_df, warehouses_df)
+            customer_summary = context.customer_summary()
 
-            allocation_results, route_df = logic.run_allocation(
-                filtered_orders, customers_df, products_df, trucks_df, config, warehouses_df
+            allocation_results, route_df = allocation_cache.run_allocation(
+                filtered_orders, customers_df, products_df, trucks_df, config, warehouses_df, context=context
             )
 
             filo_allocated_df = run_filo_allocation(
-                filtered_orders, customers_df, products_df, trucks_df, config, warehouses_df
+                filtered_orders, customers_df, products_df, trucks_df, config, warehouses_df, context=context
             )
 
             db_utils.save_csv(allocation_results, "data/allocation_summary.csv")
@@ -116,18 +117,47 @@ if cached_data:
             st.dataframe(filtered_filo_df)
             st.download_button("⬇️ Download FILO Truck Allocation CSV", filtered_filo_df.to_csv(index=False), file_name=f"filo_truck_allocation_{selected_date}.csv")
 
-            st.subheader("🗺️ Route Map (FILO with Color-coded Trucks)")
-            filo_map = map_utils.create_colored_route_map(filtered_filo_df, customers_df, warehouses_df)
-            st_folium(filo_map, width=900)
+            # Distance saved by the 2-opt / Or-opt stage (one value per truck)
+            if 'distance_saved_km' in filtered_filo_df.columns:
+                per_truck = filtered_filo_df.drop_duplicates(subset=['truck_id'])
+                total_km = per_truck['total_distance_km'].sum()
+                saved_km = per_truck['distance_saved_km'].sum()
+                col1, col2 = st.columns(2)
+                col1.metric("🛣️ Total Route Distance", f"{total_km:,.2f} km")
+                col2.metric("✂️ Saved by Route Improvement", f"{saved_km:,.2f} km",
+                            f"-{saved_km / (total_km + saved_km) * 100:.1f}%" if total_km + saved_km else None,
+                            delta_color="inverse")
 
-            map_html = filo_map.get_root().render()
-            st.download_button("⬇️ Download Route Map (HTML)", BytesIO(map_html.encode("utf-8")), file_name="filo_route_map.html")
+            st.subheader("🗺️ Route Map (FILO with Color-coded Trucks)")
+            routes = route_geometry.decode_routes(allocation_store.load_routes(selected_date))
+            road_routes = None
+            # Keyless requests to the GraphHopper API are all refused: no checkbox to send them
+            roads_ok = route_fetcher.road_routes_configured()
+            if routes and st.checkbox("🛣️ Follow roads (live GraphHopper routes)", disabled=not roads_ok,
+                                      help=None if roads_ok else "Set graphhopper_api_key (or graphhopper_url for "
+                                                                 "a self-hosted server) in config.json"):
+                with st.spinner("🛰️ Fetching road routes..."):
+                    road_routes, road_warning = route_fetcher.fetch_road_routes(routes)
+                if road_warning:
+                    st.warning(f"⚠️ {road_warning}")
+            # Built once per distinct input across reruns and sessions; the HTML only when downloaded
+            maps = map_cache.get_map_cache()
+            map_key = map_cache.map_key(filtered_filo_df, warehouses_df, routes, road_routes)
+
+            def build_map():
+                return map_utils.create_colored_route_map(filtered_filo_df, customers_df, warehouses_df, routes,
+                                                          road_routes=road_routes)
+
+            # render=False: st_folium renders the map itself anyway, the extra full render only repeats it
+            with maps.lock(map_key):
+                st_folium(maps.get_map(map_key, build_map), width=900, render=False)
+
+            st.download_button("⬇️ Download Route Map (HTML)", lambda: maps.get_html(map_key, build_map),
+                               file_name="filo_route_map.html", mime="text/html")
         else:
             st.info("❌ No trucks were allocated based on FILO logic for the selected date.")
     else:
         st.info("❌ No FILO allocation data available.")
-<<<<<<< HEAD
-=======
 
 
 # # -------------------------------------LIVE ROUTE-------------------------------------------#
@@ -267,4 +297,3 @@ if cached_data:
 #             st.info("❌ No trucks were allocated based on FILO logic for the selected date.")
 #     else:
 #         st.info("❌ No FILO allocation data available.")
->>>>>>> df81800 (Enhanced delivery map with GraphHopper for optimized truck routing.)
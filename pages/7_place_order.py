@@ -1,25 +1,22 @@
 import streamlit as st
 import pandas as pd
 from datetime import date, timedelta
-from utils import auth, db_utils
+from utils import auth, db_utils, order_journal
 
 st.set_page_config(page_title="Place Order", layout="wide")
 auth.require_login_and_sidebar()
 
 # File paths
-ORDER_FILE = "orders.csv"
 PRODUCT_FILE = "products.csv"
 
 st.title("🍚 Place Multi-Product Order")
 
 # Load data
 products_df = db_utils.load_csv(PRODUCT_FILE)
-orders_df = db_utils.load_csv(ORDER_FILE)
 
-# Clean and ensure stock column
+# Ensure stock column (loaded as int32, missing values as 0)
 if "available_stock" not in products_df.columns:
     products_df["available_stock"] = 0
-products_df["available_stock"] = products_df["available_stock"].fillna(0).astype(int)
 
 # Filter in-stock products
 available_products_df = products_df[products_df["available_stock"] > 0].copy()
@@ -31,10 +28,6 @@ if available_products_df.empty:
 customer_id = st.session_state.get("customer_id", 1)
 username = st.session_state.get("username", "user1")
 
-# Get next order ID
-def get_next_order_id(df):
-    return int(df["order_id"].max()) + 1 if not df.empty else 1001
-
 # Initialize cart in session
 if "order_cart" not in st.session_state:
     st.session_state.order_cart = []
@@ -84,37 +77,15 @@ if st.session_state.order_cart:
         confirm = st.form_submit_button("✅ Place Order")
 
         if confirm:
-            order_id = get_next_order_id(orders_df)
-            new_orders = []
-            updated_products_df = products_df.copy()
-
-            for item in st.session_state.order_cart:
-                product_id = item["product_id"]
-                qty = item["num_boxes"]
-                available = int(updated_products_df.loc[updated_products_df["product_id"] == product_id, "available_stock"].values[0])
-
-                if qty > available:
-                    st.error(f"❌ Not enough stock for {product_name_map[product_id]}. Only {available} left.")
-                    st.stop()
-
-                new_orders.append({
-                    "order_id": order_id,
-                    "customer_id": customer_id,
-                    "product_id": product_id,
-                    "num_boxes": qty,
-                    "order_date": order_date,
-                    "delivery_date": delivery_date,
-                    "placed_by": username
-                })
-                # Deduct stock
-                updated_products_df.loc[updated_products_df["product_id"] == product_id, "available_stock"] -= qty
-
-            new_orders_df = pd.DataFrame(new_orders)
-            orders_df = pd.concat([orders_df, new_orders_df], ignore_index=True)
-            db_utils.save_csv(orders_df, ORDER_FILE)
-            db_utils.save_csv(updated_products_df, PRODUCT_FILE)
-
-            st.success(f"✅ Order #{order_id} placed successfully for {len(new_orders)} item(s)!")
+            # Stock is checked again, and the order id assigned, under the journal lock
+            lines = [(item["product_id"], item["num_boxes"]) for item in st.session_state.order_cart]
+            try:
+                order_id = db_utils.place_order(customer_id, username, lines, order_date, delivery_date)
+            except order_journal.OutOfStock as e:
+                st.error(f"❌ Not enough stock for {product_name_map.get(e.product_id, e.product_id)}. Only {e.available} left.")
+                st.stop()
+
+            st.success(f"✅ Order #{order_id} placed successfully for {len(lines)} item(s)!")
             st.session_state.order_cart = []  # Clear cart
             st.rerun()
 else:
@@ -0,0 +1,169 @@
+#Process-wide cache of allocation results, keyed by a content fingerprint of the allocation's inputs
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from utils import allocation_store, logic
+from utils.table_cache import frame_bytes, frame_digest
+
+
+def _fingerprint_part(value):
+    if isinstance(value, pd.DataFrame):
+        return "frame:" + frame_digest(value)
+    if isinstance(value, pd.Series):
+        return "series:" + frame_digest(value.to_frame())
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+def input_fingerprint(*args, **kwargs):
+    """
+    Digest of an allocation's inputs: frames by content and schema
+    (table_cache.frame_digest), settings such as config by their JSON. Two
+    runs get the same fingerprint only when every input is equal.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    parts = [_fingerprint_part(value) for value in args]
+    parts += [f"{name}={_fingerprint_part(value)}" for name, value in sorted(kwargs.items())]
+    for part in parts:
+        h.update(part.encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _copy(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy()
+    if isinstance(value, tuple):
+        return tuple(_copy(item) for item in value)
+    return value
+
+
+def _bytes(value):
+    if isinstance(value, pd.DataFrame):
+        return frame_bytes(value)
+    if isinstance(value, tuple):
+        return sum(_bytes(item) for item in value)
+    return 0
+
+
+class AllocationCache:
+    """
+    Allocation results (frames or tuples of frames) keyed by input_fingerprint,
+    least recently used dropped past max_bytes. Callers get their own copy,
+    so they may modify it freely.
+    """
+
+    def __init__(self, max_bytes=128 * 2**20):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (result, bytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        """Cached copy of the result of key, calling compute() on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return _copy(entry[0])
+            self.misses += 1
+        result = compute()
+        size = _bytes(result)
+        with self._lock:
+            if key not in self._entries and size <= self.max_bytes:
+                self._entries[key] = (_copy(result), size)
+                self._bytes += size
+                self._evict()
+        return result
+
+    def resize(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "results": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            _, (_, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+
+
+# Shared by every session of this server process
+_allocation_cache = AllocationCache()
+
+
+def get_allocation_cache(config=None):
+    """The process-wide cache, sized from config.json "allocation_cache_mb" (default 128)."""
+    if config is None:
+        from utils.db_utils import load_config
+        config = load_config()
+    _allocation_cache.resize(int(config.get("allocation_cache_mb", 128)) * 2**20)
+    return _allocation_cache
+
+
+def allocation_cache_stats():
+    return _allocation_cache.stats()
+
+
+def run_allocation(filtered_orders, customers_df, products_df, trucks_df, config, warehouses_df, context=None):
+    """logic.run_allocation, computed once per distinct input."""
+    key = input_fingerprint("run_allocation", filtered_orders, customers_df, products_df, trucks_df, config,
+                            warehouses_df)
+    return get_allocation_cache(config).get(key, lambda: logic.run_allocation(
+        filtered_orders, customers_df, products_df, trucks_df, config, warehouses_df, context=context
+    ))
+
+
+def filo_grouped_truck_allocation(filtered_orders, customers_df, products_df, trucks_df, config,
+                                  fuel_price_per_litre=90.0, mileage_kmpl=4.0, warehouses_df=None,
+                                  distance_mode="haversine", context=None):
+    """
+    logic.filo_grouped_truck_allocation, computed once per distinct input.
+    The allocation also saves its date to the allocation store; a hit skips
+    that, so if the store has since been given another allocation of the date
+    the cached one (with its route table) is written back.
+    """
+    key = input_fingerprint("filo_grouped_truck_allocation", filtered_orders, customers_df, products_df, trucks_df,
+                            config, warehouses_df, fuel_price_per_litre=fuel_price_per_litre,
+                            mileage_kmpl=mileage_kmpl, distance_mode=distance_mode)
+    delivery_date = filtered_orders['delivery_date'].iloc[0]
+
+    def compute():
+        final_df = logic.filo_grouped_truck_allocation(
+            filtered_orders, customers_df, products_df, trucks_df, config, fuel_price_per_litre=fuel_price_per_litre,
+            mileage_kmpl=mileage_kmpl, warehouses_df=warehouses_df, distance_mode=distance_mode, context=context
+        )
+        return final_df, allocation_store.load_routes(delivery_date)
+
+    final_df, routes = get_allocation_cache(config).get(key, compute)
+    stored = allocation_store.load_allocation(delivery_date)
+    stored_ids = set(stored['truck_id'].astype(str)) if 'truck_id' in stored else set()
+    ids = set(final_df['truck_id'].astype(str)) if 'truck_id' in final_df else set()
+    if stored_ids != ids:
+        allocation_store.save_allocation(final_df, delivery_date, routes=routes.drop(columns=['delivery_date'], errors='ignore'))
+    return final_df
@@ -0,0 +1,75 @@
+#Orders, customers and products joined once per delivery date for every allocation report
+import numpy as np
+import pandas as pd
+
+from utils.partition import partition_by_state, state_indices
+
+SUMMARY_KEYS = ['customer_id', 'customer_name', 'latitude', 'longitude']
+
+_EMPTY = np.empty(0, dtype=np.intp)
+
+
+def _joined_ids(left, right):
+    """Gives two id columns that get joined one dtype: int64 when every id is a whole number, else str."""
+    numeric = [pd.to_numeric(col, errors='coerce') for col in (left, right)]
+    if all(col.notna().all() and (col % 1 == 0).all() for col in numeric):
+        return [col.astype('int64') for col in numeric]
+    return [col.astype(str) for col in (left, right)]
+
+
+class AllocationContext:
+    """
+    One delivery date's order lines joined with their customer and product,
+    with weight and volume per line, the state partition of customers, trucks
+    and warehouses, and the per-customer summaries (built on first use, then
+    shared). Build it once per run and hand it to prepare_customer_summary,
+    run_allocation and filo_grouped_truck_allocation; the input frames are
+    not modified. Summaries are shared, so callers must not change them in place.
+    """
+
+    def __init__(self, orders, customers, products, trucks=None, warehouses=None):
+        order_customers, customer_ids = _joined_ids(orders['customer_id'], customers['customer_id'])
+        order_products, product_ids = _joined_ids(orders['product_id'], products['product_id'])
+        self.customers = customers.assign(customer_id=customer_ids)
+        self.products = products.assign(product_id=product_ids)
+        self.trucks = trucks
+        self.warehouses = warehouses
+        self.delivery_date = orders['delivery_date'].iloc[0] if 'delivery_date' in orders and not orders.empty else None
+
+        lines = pd.DataFrame({
+            'customer_id': order_customers.to_numpy(),
+            'product_id': order_products.to_numpy(),
+            'num_boxes': orders['num_boxes'].to_numpy(),
+        })
+        if 'delivery_date' in orders:
+            lines['delivery_date'] = orders['delivery_date'].to_numpy()
+
+        customer_cols = SUMMARY_KEYS + (['state'] if 'state' in customers else [])
+        joined = (
+            lines
+            .merge(self.customers[customer_cols], on='customer_id')
+            .merge(self.products[['product_id', 'weight_per_box', 'size_per_box']], on='product_id')
+        )
+        joined['total_weight_kg'] = joined['num_boxes'] * joined['weight_per_box']
+        joined['total_volume_m3'] = joined['num_boxes'] * joined['size_per_box']
+        self.joined = joined
+
+        self.partition = partition_by_state(customers=self.customers, trucks=trucks, warehouses=warehouses)
+        self._line_index = state_indices(joined)
+        self._summaries = {}
+
+    @property
+    def states(self):
+        return self.partition.states
+
+    def customer_summary(self, state=None, by_date=False):
+        """
+        Per-customer weight/volume totals of the whole day or of one state.
+        by_date=True keeps each delivery date of a customer apart, as the FILO allocation needs.
+        """
+        key = (state, by_date)
+        if key not in self._summaries:
+            lines = self.joined if state is None else self.joined.iloc[self._line_index.get(state, _EMPTY)]
+            keys = SUMMARY_KEYS + (['delivery_date'] if by_date else [])
+            self._summaries[key] = lines.groupby(keys)[['total_weight_kg', 'total_volume_m3']].sum().reset_index()
+        return self._summaries[key]
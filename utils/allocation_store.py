@@ -0,0 +1,237 @@
+#Allocation results stored one file per delivery date, with a small manifest
+import json
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from utils.db_utils import DATA_DIR, get_storage
+from utils.route_geometry import parse_route_repr, route_table
+
+ALLOCATION_DIR = os.path.join(DATA_DIR, "allocations")
+MANIFEST_FILE = os.path.join(ALLOCATION_DIR, "manifest.json")
+# Single file the allocation used to be rewritten into; imported once on first use
+LEGACY_FILE = os.path.join(DATA_DIR, "allocation.csv")
+
+try:
+    import pyarrow  # noqa: F401 (ships with streamlit)
+    PARTITION_FORMAT = "parquet"
+except ImportError:
+    PARTITION_FORMAT = "csv"
+
+_manifest_lock = threading.Lock()
+
+
+def _date_key(delivery_date):
+    return str(pd.to_datetime(delivery_date).date())
+
+
+def _write_atomic(path, write):
+    tmp = f"{path}.tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def _read_manifest():
+    if os.path.exists(MANIFEST_FILE):
+        with open(MANIFEST_FILE, "r") as f:
+            return json.load(f)
+    if os.path.exists(LEGACY_FILE):
+        return migrate_legacy_csv()
+    return {}
+
+
+def _write_manifest(manifest):
+    os.makedirs(ALLOCATION_DIR, exist_ok=True)
+
+    def write(tmp):
+        with open(tmp, "w") as f:
+            json.dump(dict(sorted(manifest.items())), f, indent=4)
+
+    _write_atomic(MANIFEST_FILE, write)
+
+
+def _write_partition(df, name):
+    """Writes one date's rows; falls back to CSV for frames parquet cannot type."""
+    os.makedirs(ALLOCATION_DIR, exist_ok=True)
+    if PARTITION_FORMAT == "parquet":
+        path = os.path.join(ALLOCATION_DIR, f"{name}.parquet")
+        try:
+            _write_atomic(path, lambda tmp: df.to_parquet(tmp, index=False))
+            return os.path.basename(path)
+        except (TypeError, ValueError, ImportError) as e:
+            print(f"[WARN] Storing {name} as CSV: {e}")
+            if os.path.exists(f"{path}.tmp"):
+                os.remove(f"{path}.tmp")
+    if "route" in df.columns:
+        df = df.assign(route=[blob.hex() for blob in df["route"]])
+    path = os.path.join(ALLOCATION_DIR, f"{name}.csv")
+    _write_atomic(path, lambda tmp: df.to_csv(tmp, index=False))
+    return os.path.basename(path)
+
+
+def _read_partition(filename):
+    path = os.path.join(ALLOCATION_DIR, filename)
+    if filename.endswith(".parquet"):
+        return pd.read_parquet(path)
+    df = pd.read_csv(path)
+    if "route" in df.columns:
+        df["route"] = [bytes.fromhex(text) for text in df["route"]]
+    return df
+
+
+def _read_allocation(filename):
+    df = _read_partition(filename)
+    df["delivery_date"] = pd.to_datetime(df["delivery_date"], errors="coerce").dt.date
+    return df
+
+
+def _remove(filename):
+    path = os.path.join(ALLOCATION_DIR, filename)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _save_partitions(frames, manifest):
+    """frames: {date key: (rows, route table or None)}; empty rows remove that date."""
+    for key, (df, routes) in frames.items():
+        old = manifest.pop(key, None) or {}
+        entry = {}
+        if not df.empty:
+            entry = {"file": _write_partition(df, key), "rows": int(len(df))}
+            if routes is not None and not routes.empty:
+                entry["routes"] = _write_partition(routes, f"{key}.routes")
+            entry["updated"] = datetime.now().isoformat(timespec="seconds")
+            manifest[key] = entry
+        for table in ("file", "routes"):
+            if old.get(table) and old[table] != entry.get(table):
+                _remove(old[table])
+    return manifest
+
+
+def _database():
+    """The SQLite backend when config.json selects it; allocations then live in its tables."""
+    storage = get_storage()
+    return storage if storage.name == "sqlite" else None
+
+
+def _from_database(df):
+    if not df.empty:
+        df["delivery_date"] = pd.to_datetime(df["delivery_date"], errors="coerce").dt.date
+    return df
+
+
+def save_allocation(df, delivery_date, routes=None):
+    """
+    Replaces the allocation of one delivery date (and its per-truck route table,
+    see utils.route_geometry); no other date is read or written.
+    """
+    key = _date_key(delivery_date)
+    database = _database()
+    if database is not None:
+        database.replace("allocations", "delivery_date", key, df)
+        routes = routes.assign(delivery_date=key) if routes is not None and not df.empty else pd.DataFrame()
+        database.replace("allocation_routes", "delivery_date", key, routes)
+        return
+    with _manifest_lock:
+        manifest = _save_partitions({key: (df, routes)}, _read_manifest())
+        _write_manifest(manifest)
+
+
+def allocation_dates():
+    database = _database()
+    if database is not None:
+        days = database.load("allocations")
+        return sorted(_from_database(days)["delivery_date"].dropna().unique()) if not days.empty else []
+    with _manifest_lock:
+        return [pd.to_datetime(key).date() for key in _read_manifest()]
+
+
+def load_allocation(delivery_date):
+    """Allocation rows of one delivery date (empty frame when it was never allocated)."""
+    database = _database()
+    if database is not None:
+        return _from_database(database.select("allocations", delivery_date=_date_key(delivery_date)))
+    with _manifest_lock:
+        entry = _read_manifest().get(_date_key(delivery_date))
+    return _read_allocation(entry["file"]) if entry else pd.DataFrame()
+
+
+def load_routes(delivery_date):
+    """Per-truck route table of one delivery date; decode with route_geometry.decode_routes."""
+    database = _database()
+    if database is not None:
+        return database.select("allocation_routes", delivery_date=_date_key(delivery_date))
+    with _manifest_lock:
+        entry = _read_manifest().get(_date_key(delivery_date))
+    return _read_partition(entry["routes"]) if entry and entry.get("routes") else pd.DataFrame()
+
+
+def load_allocations(dates=None):
+    """Allocation rows of the given delivery dates (all stored dates when None)."""
+    database = _database()
+    if database is not None:
+        if dates is None:
+            return _from_database(database.load("allocations"))
+        keys = sorted({_date_key(d) for d in dates if pd.notna(d)})
+        return _from_database(database.select("allocations", delivery_date=keys))
+    with _manifest_lock:
+        manifest = _read_manifest()
+    keys = manifest if dates is None else {_date_key(d) for d in dates if pd.notna(d)} & manifest.keys()
+    frames = [_read_allocation(manifest[key]["file"]) for key in sorted(keys)]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def file_partitions():
+    """(date, allocation rows, route table) of every date in the file store, oldest first."""
+    with _manifest_lock:
+        manifest = _read_manifest()
+    for key in sorted(manifest):
+        entry = manifest[key]
+        routes = _read_partition(entry["routes"]) if entry.get("routes") else pd.DataFrame()
+        yield pd.to_datetime(key).date(), _read_allocation(entry["file"]), routes
+
+
+def _numeric_or_text(column):
+    try:
+        return pd.to_numeric(column)
+    except (TypeError, ValueError):
+        return column
+
+
+def migrate_legacy_csv():
+    """
+    Splits data/allocation.csv into per-date partitions (the CSV itself is left
+    in place); its route strings move to the per-truck route tables.
+    """
+    try:
+        legacy = pd.read_csv(LEGACY_FILE, dtype=str)
+    except Exception as e:
+        print(f"[ERROR] Failed to read {LEGACY_FILE}: {e}")
+        return {}
+    if "delivery_date" not in legacy.columns:
+        return {}
+
+    dates = pd.to_datetime(legacy["delivery_date"], errors="coerce")
+    legacy = legacy[dates.notna()]  # also drops merge-conflict lines
+    frames = {}
+    for key, rows in legacy.groupby(dates[dates.notna()].dt.date.astype(str)):
+        # Let pandas type the columns of each day as if it was read on its own
+        rows = rows.reset_index(drop=True).apply(_numeric_or_text)
+        routes = None
+        if "route" in rows.columns:
+            # The old repr string repeated on every row becomes one geometry row per truck
+            if "truck_id" in rows.columns:
+                first = rows.drop_duplicates(subset=["truck_id"])
+                points = [parse_route_repr(text) for text in first["route"]]
+                offsets = np.concatenate(([0], np.cumsum([len(p) for p in points])))
+                coords = np.concatenate(points) if points else np.empty((0, 2))
+                routes = route_table(first["truck_id"], coords, offsets)
+            rows = rows.drop(columns=["route"])
+        frames[key] = (rows, routes)
+
+    manifest = _save_partitions(frames, {})
+    _write_manifest(manifest)
+    return manifest
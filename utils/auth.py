@@ -2,8 +2,9 @@ import streamlit as st
 import pandas as pd
 import time
 from geopy.geocoders import Nominatim
+from utils import db_utils
 
-CUSTOMER_FILE = "data/customers.csv"
+CUSTOMER_FILE = "customers.csv"
 geolocator = Nominatim(user_agent="truck_delivery_optimizer")
 
 # Predefined users (Admin/Manager)
@@ -15,7 +16,7 @@ USERS = {
 # Load customer CSV (reusable)
 def load_customer_users():
     try:
-        df = pd.read_csv(CUSTOMER_FILE)
+        df = db_utils.load_csv(CUSTOMER_FILE)
         df = df.drop_duplicates(subset=["username"])  # 🔁 Remove duplicates if any
         return df[['username', 'password', 'customer_id', 'customer_name']].dropna()
     except Exception as e:
@@ -67,7 +68,7 @@ def login_page():
         if st.button("Create Account", key="signup_btn"):
             if name and full_address and state and username and password:
                 try:
-                    df = pd.read_csv(CUSTOMER_FILE)
+                    df = db_utils.load_csv(CUSTOMER_FILE)
                 except:
                     df = pd.DataFrame()
 
@@ -100,8 +101,7 @@ def login_page():
                     "password": password
                 }
 
-                df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-                df.to_csv(CUSTOMER_FILE, index=False)
+                db_utils.insert_rows(CUSTOMER_FILE, [new_row])
                 st.success("✅ Account created! Please login now.")
                 time.sleep(3)
                 st.rerun()
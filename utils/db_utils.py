@@ -2,6 +2,12 @@ import os
 import pandas as pd
 import json
 import numpy as np
+from contextlib import nullcontext
+from utils.partition import StatePartition, partition_by_state
+from utils.packing import smallest_feasible_truck
+from utils import storage, schema
+from utils.table_cache import TableCache
+from utils.order_journal import OrderJournal
 
 # Base and data directories
 try:
@@ -18,27 +24,68 @@ def file_exists(filepath):
     return os.path.exists(os.path.join(DATA_DIR, filepath))
 
 
+# Storage backend chosen in config.json ("storage_backend": "csv" | "sqlite")
+def get_storage():
+    return storage.get_backend(load_config(), DATA_DIR)
+
+
+# Tables loaded by any page stay in memory until their file changes (see utils.table_cache)
+_table_cache = TableCache()
+
+# Orders placed from 7_place_order are journaled first (see utils.order_journal);
+# loads of these tables include the journal, other writes fold it in first
+JOURNALED_TABLES = {"orders", "products"}
+order_journal = OrderJournal(os.path.join(DATA_DIR, "journal"))
+
+
+def table_cache_stats():
+    return _table_cache.stats()
+
+
+def _version(backend, table):
+    if table in JOURNALED_TABLES:
+        return backend.version(table), order_journal.version()
+    return backend.version(table)
+
+
+def _writing(backend, table):
+    return order_journal.folded(backend) if table in JOURNALED_TABLES else nullcontext()
+
+
+# Rows a table's schema rejects (see utils.schema) are kept here instead of being loaded
+QUARANTINE_DIR = os.path.join(DATA_DIR, 'quarantine')
+
+
+# Version of each table whose problems were last reported: reloading the same
+# version (after an eviction, or on another page) doesn't quarantine or warn again
+_reported = {}
+
+
+def _load_typed(backend, table, version):
+    df = order_journal.load(backend, table) if table in JOURNALED_TABLES else backend.load(table)
+    df, rejected = schema.apply_schema(table, df)
+    if _reported.get(table) != version:
+        _reported[table] = version
+        if not rejected.empty:
+            path = schema.quarantine(QUARANTINE_DIR, table, rejected)
+            print(f"[WARN] {len(rejected)} malformed row(s) of {table} skipped, see {path}")
+        repeated = schema.repeated_keys(table, df)
+        if not repeated.empty:
+            key = ", ".join(schema.SCHEMAS[table]["key"])
+            print(f"[WARN] {len(repeated)} row(s) of {table} share their {key} with another row; "
+                  f"all kept, resolve them in the table")
+    return df
+
+
 # Load CSV
 def load_csv(filename):
-    path = os.path.join(DATA_DIR, filename)
-    if os.path.exists(path):
-        try:
-            df = pd.read_csv(path)
-            df.columns = [col.strip() for col in df.columns]
-            return df
-        except Exception as e:
-            print(f"[ERROR] Failed to read {filename}: {e}")
-            return pd.DataFrame()
-    else:
-        print(f"[WARN] File not found: {path}")
-        return pd.DataFrame()
+    config = load_config()
+    backend = storage.get_backend(config, DATA_DIR)
+    table = storage.table_name(filename)
+    _table_cache.resize(int(config.get("table_cache_mb", 256)) * 2**20)
+    version = _version(backend, table)
+    return _table_cache.get(table, version, lambda: _load_typed(backend, table, version))
 
-<<<<<<< HEAD
-def save_csv(df, path):
-    # Ensure the folder exists
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    df.to_csv(path, index=False)
-=======
 # def save_csv(df, path):
 #     # Ensure the folder exists
 #     os.makedirs(os.path.dirname(path), exist_ok=True)
@@ -46,17 +93,65 @@ def save_csv(df, path):
 
 
 def save_csv(df, path):
-    # Ensure the 'data' folder is included in the path
-    full_path = os.path.join("data", path) if not path.startswith("data") else path
+    # 'orders.csv' and 'data/orders.csv' both name the orders table
+    backend = get_storage()
+    table = storage.table_name(path)
+    with _writing(backend, table):
+        backend.save(table, df)
+    # Write-through: the next load of this table is served from memory
+    _table_cache.put(table, _version(backend, table), schema.apply_schema(table, df.reset_index(drop=True))[0])
+
+
+# Row-level writes: only the given rows are touched on the SQLite backend
+# (the cached copy is dropped too: two writes within the filesystem's mtime tick can leave mtime and size unchanged)
+def insert_rows(filename, rows):
+    df = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(rows)
+    backend, table = get_storage(), storage.table_name(filename)
+    with _writing(backend, table):
+        backend.insert(table, df)
+    _table_cache.invalidate(table)
+
+
+# add: {column: amount} added to the row's current value, read under the same lock the
+# write holds (for products, the journal lock orders take their stock under)
+def update_row(filename, key, key_value, values, add=None):
+    backend, table = get_storage(), storage.table_name(filename)
+    with _writing(backend, table):
+        values = dict(values)
+        if add:
+            current = backend.select(table, **{key: key_value})
+            row = current.iloc[0] if not current.empty else {}
+            for column, amount in add.items():
+                value = pd.to_numeric(row.get(column), errors="coerce")
+                values[column] = (0 if pd.isna(value) else value) + amount
+        backend.update(table, key, key_value, values)
+    _table_cache.invalidate(table)
+
+
+def delete_rows(filename, key, key_values):
+    backend, table = get_storage(), storage.table_name(filename)
+    with _writing(backend, table):
+        backend.delete(table, key, key_values)
+    _table_cache.invalidate(table)
+
+
+def select_rows(filename, **equals):
+    backend, table = get_storage(), storage.table_name(filename)
+    with _writing(backend, table):
+        return schema.apply_schema(table, backend.select(table, **equals))[0]
+
+
+# Journals one order (lines: [(product_id, num_boxes)]) and returns its order_id;
+# raises order_journal.OutOfStock when stock ran out in the meantime
+def place_order(customer_id, placed_by, lines, order_date, delivery_date):
+    config = load_config()
+    backend = storage.get_backend(config, DATA_DIR)
+    order_id = order_journal.place_order(backend, customer_id, placed_by, lines, order_date, delivery_date)
+    order_journal.start_compactor(get_storage, int(config.get("journal_compact_seconds", 300)))
+    if order_journal.pending() >= int(config.get("journal_compact_every", 200)):
+        order_journal.compact_in_background(backend)
+    return order_id
 
-    # Create directory only if it exists in path
-    dir_name = os.path.dirname(full_path)
-    if dir_name:
-        os.makedirs(dir_name, exist_ok=True)
-
-    df.to_csv(full_path, index=False)
-
->>>>>>> df81800 (Enhanced delivery map with GraphHopper for optimized truck routing.)
 
 # Delete entry by ID
 def delete_entry_by_id(df, id_column, delete_id):
@@ -69,7 +164,7 @@ def get_next_id(df, id_column):
     if df.empty or id_column not in df.columns:
         return 1
     try:
-        return int(df[id_column].astype(int).max()) + 1
+        return int(df[id_column].max()) + 1
     except:
         return 1
 
@@ -88,32 +183,38 @@ def save_config(config):
 
 # Debugging truck assignment
 def debug_truck_assignment(total_weight, truck_capacity, config):
-    suitable_trucks = truck_capacity[
-        (truck_capacity['min_capacity_kg'] <= total_weight) &
-        (total_weight <= truck_capacity['max_capacity_kg'])
-    ].sort_values(by='capacity_kg')
-
-    if suitable_trucks.empty:
-        return "❌ No Suitable Truck Found"
-    else:
-        truck = suitable_trucks.iloc[0]
-        utilization = round((total_weight / truck['capacity_kg']) * 100, 2)
-        return (
-            f"Chosen Truck: {truck['truck_type']} | Total Weight: {total_weight} kg | "
-            f"Utilization: {utilization}% of {truck['capacity_kg']} kg (Truck Capacity)"
+    return explain_truck_choice([total_weight], truck_capacity)[0]
+
+# One explanation per weight; choice (truck positions from smallest_feasible_truck)
+# can be passed in when the allocation already computed it
+def explain_truck_choice(weights, truck_capacity, choice=None):
+    if choice is None:
+        choice = smallest_feasible_truck(
+            weights, truck_capacity['capacity_kg'],
+            truck_capacity['min_capacity_kg'], truck_capacity['max_capacity_kg']
         )
-
-def print_allocation_debug(customer_summary, truck_capacity, config):
-    debug_list = []
-    for _, row in customer_summary.iterrows():
-        debug_info = debug_truck_assignment(row['total_weight_kg'], truck_capacity, config)
-        debug_list.append({
-            "customer_id": row['customer_id'],
-            "customer_name": row['customer_name'],
-            "total_weight_kg": row['total_weight_kg'],
-            "debug_info": debug_info
-        })
-    return pd.DataFrame(debug_list)
+    truck_types = truck_capacity['truck_type'].tolist()
+    capacities = truck_capacity['capacity_kg'].to_numpy()
+
+    explanations = []
+    for total_weight, t in zip(list(weights), np.asarray(choice).tolist()):
+        if t < 0:
+            explanations.append("❌ No Suitable Truck Found")
+        else:
+            utilization = round((total_weight / capacities[t]) * 100, 2)
+            explanations.append(
+                f"Chosen Truck: {truck_types[t]} | Total Weight: {total_weight} kg | "
+                f"Utilization: {utilization}% of {capacities[t]} kg (Truck Capacity)"
+            )
+    return explanations
+
+def print_allocation_debug(customer_summary, truck_capacity, config, choice=None):
+    return pd.DataFrame({
+        "customer_id": customer_summary['customer_id'].tolist(),
+        "customer_name": customer_summary['customer_name'].tolist(),
+        "total_weight_kg": customer_summary['total_weight_kg'].tolist(),
+        "debug_info": explain_truck_choice(customer_summary['total_weight_kg'].tolist(), truck_capacity, choice),
+    })
 
 # Group orders by assigned truck
 def group_orders_by_truck(allocation_df, orders_df):
@@ -217,10 +318,12 @@ def group_orders_by_truck_filo(allocation_results, filtered_orders, trucks_df, c
     return pd.DataFrame(used_trucks)
 
 # Get assigned warehouse for customer
-def get_customer_warehouse(customer_row, warehouses_df):
-    state = customer_row.get("state")
-    warehouse = warehouses_df[warehouses_df["state"] == state]
-    if not warehouse.empty:
-        return warehouse.iloc[0]["latitude"], warehouse.iloc[0]["longitude"]
+# warehouses: a StatePartition (O(1) per customer) or the warehouses DataFrame
+def get_customer_warehouse(customer_row, warehouses):
+    if not isinstance(warehouses, StatePartition):
+        warehouses = partition_by_state(warehouses=warehouses)
+    coord = warehouses.warehouse_coord(customer_row.get("state"))
+    if coord is not None:
+        return coord
     else:
         return None, None
@@ -0,0 +1,222 @@
+#Per-state distance matrix (haversine, or a routing backend's road distances) shared by routing, costing and maps
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from utils.route_utils import haversine_np, unit_vectors, route_legs
+
+# Largest number of points kept as a dense matrix (4000^2 float32 = 64 MB);
+# bigger sets compute the requested legs on demand
+DENSE_LIMIT = 4000
+# Memory the cached matrices may take together, unless config.json "distance_cache_mb" says otherwise
+MAX_CACHE_BYTES = 256 * 2**20
+
+# Shared by every session of this server process
+_matrix_cache = OrderedDict()  # (state, delivery date, backend, depot) -> DistanceMatrix
+_cache_lock = threading.Lock()
+
+
+class DistanceMatrix:
+    """
+    Great-circle distances (km, float32) between a depot and its customers,
+    or the distances of a utils.routing_backend backend when one is given.
+    Row 0 is the depot; every distinct (lat, lon) gets exactly one row, so
+    customers sharing coordinates share a row. The dense matrix is only filled
+    on first use and grows one row at a time when customers are added. With a
+    backend, every pair costs a routing lookup: until something asks for the
+    dense matrix, submatrix() and legs_km() look up only the pairs they need.
+    Sessions share matrices: growing one and reading it hold its lock.
+    """
+
+    def __init__(self, depot, coords=(), backend=None):
+        self._coords = np.empty((0, 2))
+        self._index = {}
+        self._km = None
+        self._size = 0
+        self._xyz = None
+        self.backend = backend
+        self._lock = threading.RLock()
+        self.add_points([depot])
+        self.add_points(coords)
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def depot(self):
+        return tuple(self._coords[0])
+
+    @property
+    def coords(self):
+        return self._coords[:self._size]
+
+    @property
+    def xyz(self):
+        """Unit-sphere vectors of every point (what the KD-tree router works on)."""
+        with self._lock:
+            if self._xyz is None or len(self._xyz) != self._size:
+                self._xyz = unit_vectors(self.coords[:, 0], self.coords[:, 1])
+            return self._xyz
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self._coords, self._km, self._xyz) if a is not None)
+
+    def index_of(self, lat, lon):
+        return self._index.get((float(lat), float(lon)))
+
+    def indices(self, coords):
+        """Row of every (lat, lon) in coords; unknown points are added first."""
+        coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+        with self._lock:
+            self.add_points(coords)
+            return np.array([self._index[(lat, lon)] for lat, lon in coords.tolist()], dtype=np.intp)
+
+    def add_points(self, coords):
+        with self._lock:
+            self._add_points(coords)
+
+    def _add_points(self, coords):
+        coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+        new = []
+        for lat, lon in coords.tolist():
+            if (lat, lon) not in self._index:
+                self._index[(lat, lon)] = self._size + len(new)
+                new.append((lat, lon))
+        if not new:
+            return
+
+        start = self._size
+        if start + len(new) > len(self._coords):
+            grown = np.empty((max(2 * len(self._coords), start + len(new), 16), 2))
+            grown[:start] = self._coords[:start]
+            self._coords = grown
+        self._coords[start:start + len(new)] = new
+        self._size += len(new)
+
+        if self._km is not None:
+            if self._size > DENSE_LIMIT:
+                self._km = None
+            else:
+                self._fill_rows(start)
+
+    def _fill_rows(self, start):
+        """Computes the rows/columns of points [start, size) into the dense matrix."""
+        size = self._size
+        if size > len(self._km):
+            grown = np.zeros((min(max(2 * len(self._km), size), DENSE_LIMIT),) * 2, dtype=np.float32)
+            grown[:start, :start] = self._km[:start, :start]
+            self._km = grown
+        coords = self.coords
+        self._km[start:size, :size] = self._block(coords[start:size], coords)
+        if self.backend is None or self.backend.symmetric:
+            self._km[:size, start:size] = self._km[start:size, :size].T
+        elif start:
+            # Road distances differ by direction: the old points' columns too, in one bulk call
+            self._km[:start, start:size] = self._block(coords[:start], coords[start:size])
+
+    def _block(self, origins, destinations):
+        if self.backend is None:
+            return haversine_np(origins[:, 0][:, None], origins[:, 1][:, None],
+                                destinations[None, :, 0], destinations[None, :, 1]).astype(np.float32)
+        return self.backend.matrix(origins, destinations).astype(np.float32)
+
+    @property
+    def km(self):
+        """Dense (n, n) float32 matrix, or None when there are too many points."""
+        with self._lock:
+            if self._size > DENSE_LIMIT:
+                return None
+            if self._km is None:
+                self._km = np.zeros((self._size, self._size), dtype=np.float32)
+                self._fill_rows(0)
+            return self._km[:self._size, :self._size]
+
+    def _dense(self):
+        """The dense matrix when it is cheap to have: always for haversine, for a backend only once built."""
+        if self.backend is None:
+            return self.km
+        with self._lock:
+            return self._km[:self._size, :self._size] if self._km is not None else None
+
+    def submatrix(self, rows):
+        """Dense distances between the given rows, or None if they are too many."""
+        rows = np.asarray(rows, dtype=np.intp)
+        if len(rows) > DENSE_LIMIT:
+            return None
+        with self._lock:
+            km = self._dense()
+            if km is not None:
+                return km[np.ix_(rows, rows)]
+            coords = self.coords[rows]
+        return self._block(coords, coords)
+
+    def legs_km(self, a, b):
+        """Distances between rows a[i] and b[i]."""
+        a = np.asarray(a, dtype=np.intp)
+        b = np.asarray(b, dtype=np.intp)
+        with self._lock:
+            km = self._dense()
+            if km is not None:
+                return km[a, b]
+            coords = self.coords
+        if self.backend is not None:
+            return self.backend.pairs(coords[a], coords[b]).astype(np.float32)
+        return haversine_np(coords[a, 0], coords[a, 1], coords[b, 0], coords[b, 1]).astype(np.float32)
+
+    def route_km(self, stops):
+        """Length of the path visiting the given rows in order."""
+        stops = np.asarray(stops, dtype=np.intp)
+        if len(stops) < 2:
+            return 0.0
+        return float(self.legs_km(stops[:-1], stops[1:]).sum(dtype=np.float64))
+
+    def routes_km(self, stops, offsets):
+        """Lengths of many routes at once; route r visits stops[offsets[r]:offsets[r + 1]]."""
+        stops = np.asarray(stops, dtype=np.intp)
+        a, b, route = route_legs(offsets)
+        legs = self.legs_km(stops[a], stops[b])
+        return np.bincount(route, weights=legs, minlength=len(offsets) - 1)
+
+
+def _date_key(delivery_date):
+    return str(pd.to_datetime(delivery_date).date()) if delivery_date is not None else None
+
+
+def _max_cache_bytes():
+    from utils.db_utils import load_config
+    return int(load_config().get("distance_cache_mb", MAX_CACHE_BYTES // 2**20)) * 2**20
+
+
+def get_distance_matrix(state, delivery_date, depot, coords, backend=None):
+    """
+    Matrix for one state, delivery date and depot, built once and reused by
+    every caller. A few new customers only add their rows. backend: a
+    utils.routing_backend backend, None for the built-in haversine. Adding a
+    matrix drops the least recently used ones past "distance_cache_mb"
+    (counted at their size then; the newest one is always kept).
+    """
+    depot = (float(depot[0]), float(depot[1]))
+    key = (state, _date_key(delivery_date), backend.name if backend is not None else None, depot)
+    with _cache_lock:
+        matrix = _matrix_cache.get(key)
+        if matrix is not None:
+            _matrix_cache.move_to_end(key)
+    if matrix is None:
+        max_bytes = _max_cache_bytes()
+        with _cache_lock:
+            matrix = _matrix_cache.setdefault(key, DistanceMatrix(depot, (), backend))
+            _matrix_cache.move_to_end(key)
+            used = sum(m.nbytes for m in _matrix_cache.values())
+            while used > max_bytes and len(_matrix_cache) > 1:
+                _, dropped = _matrix_cache.popitem(last=False)
+                used -= dropped.nbytes
+    matrix.add_points(coords)
+    return matrix
+
+
+def clear_distance_matrices():
+    with _cache_lock:
+        _matrix_cache.clear()
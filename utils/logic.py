@@ -2,254 +2,339 @@ import pandas as pd
 import numpy as np
 import uuid
 import os
-from geopy.distance import geodesic
-from utils.db_utils import get_customer_warehouse
-
-def prepare_customer_summary(filtered_orders, customers_df, products_df):
-    filtered_orders['customer_id'] = filtered_orders['customer_id']
-    customers_df['customer_id'] = customers_df['customer_id']
-    filtered_orders['product_id'] = filtered_orders['product_id']
-    products_df['product_id'] = products_df['product_id']
-
-    merged = filtered_orders.merge(customers_df, on='customer_id')
-    merged = merged.merge(products_df, on='product_id')
-
-    summary = merged.groupby(['customer_id', 'customer_name', 'latitude', 'longitude']).agg(
-        total_weight_kg=pd.NamedAgg(column='weight_per_box', aggfunc=lambda x: (x * merged.loc[x.index, 'num_boxes']).sum()),
-        total_volume_m3=pd.NamedAgg(column='size_per_box', aggfunc=lambda x: (x * merged.loc[x.index, 'num_boxes']).sum())
-    ).reset_index()
-
-    return summary
-
-def haversine_np(lat1, lon1, lat2, lon2):
-    R = 6371
-    lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = np.sin(dlat / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2)**2
-    return 2 * R * np.arcsin(np.sqrt(a))
-
-def nearest_neighbor_route(customer_coords, start_coord):
-    if not customer_coords:
-        return []
-
-    coords = np.array(customer_coords)
-    visited = [start_coord]
-    current = np.array(start_coord)
-    remaining = coords.copy()
-
-    while len(remaining) > 0:
-        lat1, lon1 = current[0], current[1]
-        lat2, lon2 = remaining[:, 0], remaining[:, 1]
-        distances = haversine_np(lat1, lon1, lat2, lon2)
-        nearest_idx = np.argmin(distances)
-        nearest_coord = remaining[nearest_idx]
-        visited.append(tuple(nearest_coord))
-        remaining = np.delete(remaining, nearest_idx, axis=0)
-        current = nearest_coord
-
-    return visited
-
-def run_allocation(filtered_orders, customers_df, products_df, trucks_df, config, warehouses_df):
+from concurrent.futures import ProcessPoolExecutor
+from utils.packing import filo_pack, smallest_feasible_truck
+from utils.route_utils import nearest_neighbor_order, nearest_neighbor_route, route_lengths_km, route_positions
+from utils.distance_matrix import get_distance_matrix
+from utils.routing_backend import get_routing_backend
+from utils.route_improvement import MAX_CHECKS, improve_route
+from utils.allocation_context import AllocationContext
+from utils.allocation_store import save_allocation
+from utils.route_geometry import route_table
+
+# Below this many customers in a run, allocation stays in the calling process
+PARALLEL_MIN_CUSTOMERS = 2000
+
+# Per-customer weight/volume totals of the given orders (inputs are left untouched).
+# by_date=True keeps each delivery date of a customer apart, as the FILO allocation needs.
+def prepare_customer_summary(filtered_orders, customers_df, products_df, by_date=False):
+    return AllocationContext(filtered_orders, customers_df, products_df).customer_summary(by_date=by_date)
+
+def run_allocation(filtered_orders, customers_df, products_df, trucks_df, config, warehouses_df, context=None):
     all_allocations = []
-    all_routes = []
-
-    states = customers_df['state'].unique()
-    for state in states:
-        state_customers = customers_df[customers_df['state'] == state]
-        state_orders = filtered_orders[filtered_orders['customer_id'].isin(state_customers['customer_id'])]
-
-        if state_orders.empty:
+    route_tasks = []
+
+    # Pass the run's AllocationContext to skip joining the tables again
+    if context is None:
+        context = AllocationContext(filtered_orders, customers_df, products_df, trucks_df, warehouses_df)
+    delivery_date = context.delivery_date
+    improve_ms = config.get('route_improvement_ms', 0)
+    improve_checks = int(config.get('route_improvement_checks', MAX_CHECKS))
+    distance_backend = config.get('distance_backend')
+    for state in context.states:
+        customer_summary = context.customer_summary(state)
+
+        if customer_summary.empty:
             continue
 
-        customer_summary = prepare_customer_summary(state_orders, state_customers, products_df)
         truck_capacity = trucks_df.copy()
         truck_capacity['min_capacity_kg'] = trucks_df['capacity_tons'] * 1000 * (config['min_load_percent'] / 100)
         truck_capacity['max_capacity_kg'] = trucks_df['capacity_tons'] * 1000 * (config['max_load_percent'] / 100)
 
-        allocations = []
-        for _, row in customer_summary.iterrows():
-            total_weight = row['total_weight_kg']
-            total_volume = row['total_volume_m3']
-
-            suitable_trucks = truck_capacity[
-                (truck_capacity['min_capacity_kg'] <= total_weight) &
-                (total_weight <= truck_capacity['max_capacity_kg'])
-            ].sort_values(by='capacity_tons')
-
-            truck_type = suitable_trucks.iloc[0]['truck_type'] if not suitable_trucks.empty else '❌ No Suitable Truck Found'
-
-            allocations.append({
-                "customer_id": row['customer_id'],
-                "customer_name": row['customer_name'],
-                "latitude": row['latitude'],
-                "longitude": row['longitude'],
-                "state": state,
-                "total_weight_kg": round(total_weight, 2),
-                "total_volume_m3": round(total_volume, 2),
-                "assigned_truck_type": truck_type  
-            })
-
-        allocation_df = pd.DataFrame(allocations)
-
-        warehouse = warehouses_df[warehouses_df['state'] == state]
-        if not warehouse.empty:
-            start_coord = (warehouse.iloc[0]['latitude'], warehouse.iloc[0]['longitude'])
-        else:
+        # Smallest truck whose load window fits each customer, for the whole state at once
+        choice = smallest_feasible_truck(
+            customer_summary['total_weight_kg'], truck_capacity['capacity_tons'],
+            truck_capacity['min_capacity_kg'], truck_capacity['max_capacity_kg']
+        )
+        truck_types = truck_capacity['truck_type'].to_numpy(dtype=object)
+        allocation_df = pd.DataFrame({
+            "customer_id": customer_summary['customer_id'],
+            "customer_name": customer_summary['customer_name'],
+            "latitude": customer_summary['latitude'],
+            "longitude": customer_summary['longitude'],
+            "state": state,
+            "total_weight_kg": customer_summary['total_weight_kg'].round(2),
+            "total_volume_m3": customer_summary['total_volume_m3'].round(2),
+            "assigned_truck_type": np.where(choice >= 0, truck_types[choice], '❌ No Suitable Truck Found'),
+        })
+
+        start_coord = context.partition.warehouse_coord(state)
+        if start_coord is None:
             start_coord = (allocation_df['latitude'].mean(), allocation_df['longitude'].mean())
 
-        customer_coords = [(row['latitude'], row['longitude']) for _, row in allocation_df.iterrows()]
-        optimized_route = nearest_neighbor_route(customer_coords, start_coord)[1:]
+        all_allocations.append(allocation_df)
+        route_tasks.append((state, delivery_date, start_coord,
+                            allocation_df['latitude'].to_numpy(dtype=float),
+                            allocation_df['longitude'].to_numpy(dtype=float), improve_ms, distance_backend,
+                            improve_checks))
 
-        route_df = pd.DataFrame(optimized_route, columns=['latitude', 'longitude'])
+    # Routing is the heavy part; states are independent so they may run in worker processes
+    workers = allocation_workers(config, sum(len(task[3]) for task in route_tasks))
+    all_routes = []
+    for (state, *_), (route, saved_km) in zip(route_tasks, map_states(route_state, route_tasks, workers)):
+        route_df = pd.DataFrame(route, columns=['latitude', 'longitude'])
         route_df['stop_order'] = range(len(route_df), 0, -1)
         route_df['state'] = state
-
-        all_allocations.append(allocation_df)
+        route_df['distance_saved_km'] = round(saved_km, 2)
         all_routes.append(route_df)
 
     return pd.concat(all_allocations, ignore_index=True), pd.concat(all_routes, ignore_index=True)
 
-def calculate_total_route_distance(route_coords):
-    return sum(
-        geodesic(route_coords[i], route_coords[i + 1]).km
-        for i in range(len(route_coords) - 1)
-    )
+# Backend of config "distance_backend" for the distance matrices (None: built-in haversine).
+# Workers get the name, not the backend, and look it up in their own process.
+def matrix_backend(name):
+    if name in (None, "", "haversine"):
+        return None
+    return get_routing_backend(name)
+
+# Nearest neighbor route (+ optional improvement) of one state's customers, on plain arrays
+def route_state(state, delivery_date, start_coord, lat, lon, improve_ms, distance_backend=None,
+                improve_checks=MAX_CHECKS):
+    customer_coords = list(zip(lat.tolist(), lon.tolist()))
+    matrix = get_distance_matrix(state, delivery_date, start_coord, customer_coords, matrix_backend(distance_backend))
+    # The order is by straight line even with a road backend; road distances reach the improvement pass
+    xyz = matrix.xyz[matrix.indices(customer_coords)] if customer_coords else None
+    optimized_route = nearest_neighbor_route(customer_coords, start_coord, xyz)[1:]
+    return improve_open_route(matrix, optimized_route, improve_ms, improve_checks)
+
+# Number of worker processes for an allocation run ("allocation_workers" in config.json).
+# Small runs stay in-process: starting a pool costs more than it saves.
+def allocation_workers(config, n_customers):
+    workers = int(config.get('allocation_workers', 1) or 1)
+    if workers <= 1 or n_customers < PARALLEL_MIN_CUSTOMERS:
+        return 1
+    return min(workers, os.cpu_count() or 1)
+
+# Runs fn(*task) for every state task, in a process pool when workers > 1.
+# Results always come back in task order, so the merged output is the same
+# whatever the number of workers or the order they finish in.
+def map_states(fn, tasks, workers=1):
+    if workers <= 1 or len(tasks) <= 1:
+        return [fn(*task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+        return list(pool.map(fn, *zip(*tasks)))
+
+# Optional 2-opt / Or-opt pass over a state's depot -> stops path (coordinates in, coordinates out).
+# max_checks bounds the search; time_budget_ms (0 = off) is only a safety cap.
+def improve_open_route(matrix, route_coords, time_budget_ms, max_checks=MAX_CHECKS):
+    if time_budget_ms <= 0 or max_checks <= 0 or len(route_coords) < 3:
+        return route_coords, 0.0
+    nodes = np.concatenate(([0], matrix.indices(route_coords)))
+    D = matrix.submatrix(nodes)
+    if D is None:
+        return route_coords, 0.0
+    route, saved_km = improve_route(D, range(len(nodes)), closed=False, time_budget_ms=time_budget_ms,
+                                    max_checks=max_checks)
+    return [route_coords[i - 1] for i in route[1:]], saved_km
+
+# Optional 2-opt / Or-opt pass over every truck's depot -> stops -> depot tour.
+# Returns the new visiting order as positions into stops (trucks keep their stops).
+def improve_truck_routes(matrix, stops, counts, time_budget_ms, max_checks=MAX_CHECKS):
+    perm = np.arange(len(stops))
+    start = 0
+    for count in counts:
+        # Up to two stops every round trip has the same length
+        if count > 2:
+            nodes = np.concatenate(([0], stops[start:start + count]))
+            D = matrix.submatrix(nodes)
+            if D is not None:
+                route, _ = improve_route(D, range(len(nodes)), closed=True, time_budget_ms=time_budget_ms,
+                                         max_checks=max_checks)
+                perm[start:start + count] = start + np.asarray(route[1:]) - 1
+        start += count
+    return perm
+
+def calculate_total_route_distance(route_coords, matrix=None):
+    # Read the legs from the state's distance matrix when one is given
+    if matrix is not None:
+        return matrix.route_km(matrix.indices(route_coords))
+    return float(route_lengths_km(route_coords, [0, len(route_coords)], mode="ellipsoidal")[0])
+
+# Route lengths (km) of every truck of a state in one pass.
+# Route r is depot -> stops[offsets[r]:offsets[r + 1]] -> depot, stops being matrix rows.
+def calculate_route_distances(matrix, stops, counts, mode="haversine"):
+    counts = np.asarray(counts, dtype=np.intp)
+    offsets = np.concatenate(([0], np.cumsum(counts + 2))).astype(np.intp)
+    flat = np.zeros(offsets[-1], dtype=np.intp)  # row 0 is the depot
+    owner = np.repeat(np.arange(len(counts)), counts)
+    flat[np.arange(len(stops)) + 2 * owner + 1] = stops
+
+    if mode == "haversine":
+        return matrix.routes_km(flat, offsets)
+    return route_lengths_km(matrix.coords[flat], offsets, mode=mode)
+
+# FILO routing, packing and costing of one state on plain arrays (runs in a worker process
+# when allocation_workers > 1). Inputs are the state's customer columns and its trucks,
+# largest first; the result only holds positions into those arrays plus per-truck numbers.
+def filo_state_plan(state, target_date, start_coord, lat, lon, weights,
+                    capacity_kg, min_capacity_kg, max_capacity_kg,
+                    improve_ms=0, distance_mode="haversine", distance_backend=None, improve_checks=MAX_CHECKS):
+    # Get route using Nearest Neighbor (on the state's shared distance matrix), as customer indices.
+    # The order is by straight line even with a road backend: road distances reach improvement and costing only
+    customer_coords = np.column_stack((lat, lon))
+    matrix = get_distance_matrix(state, target_date, start_coord, customer_coords, matrix_backend(distance_backend))
+    visit_order = nearest_neighbor_order(customer_coords, start_coord, matrix.xyz[matrix.indices(customer_coords)])
+
+    # Apply FILO: farthest delivery first. Every customer has its own stop, so
+    # customers sharing coordinates still get distinct route orders.
+    route_order = route_positions(visit_order)
+    filo = np.argsort(-route_order, kind='stable')
+
+    # Pack customers into trucks on plain arrays (FILO order, largest truck first)
+    packed = filo_pack(weights[filo], capacity_kg, min_capacity_kg, max_capacity_kg)
+    if not packed:
+        return None
+
+    truck_pos = np.array([p[0] for p in packed])
+    rows_per_truck = [filo[p[1]] for p in packed]
+    counts = np.array([len(rows) for rows in rows_per_truck])
+    owner = np.repeat(np.arange(len(packed)), counts)
+    rows = np.concatenate(rows_per_truck)
+    first_rows = np.array([truck_rows[0] for truck_rows in rows_per_truck])
+    load_sum = np.array([p[2] for p in packed])
+
+    # Route distance + fuel for every truck in one pass (stops in route order)
+    assigned_order = route_order[rows]
+    visit = np.lexsort((assigned_order, owner))
+    stops = matrix.indices(np.column_stack((lat[rows], lon[rows]))[visit])
+    route_km = calculate_route_distances(matrix, stops, counts, mode=distance_mode)
+    saved_km = np.zeros(len(packed))
+
+    # Optional local search; the truck's route_order values follow the new visiting order
+    if improve_ms > 0 and improve_checks > 0:
+        perm = improve_truck_routes(matrix, stops, counts, improve_ms, improve_checks)
+        if (perm != np.arange(len(perm))).any():
+            new_order = assigned_order.copy()
+            new_order[visit[perm]] = assigned_order[visit]
+            improved_km = calculate_route_distances(matrix, stops[perm], counts, mode=distance_mode)
+            saved_km = route_km - improved_km
+            route_km = improved_km
+            # Keep FILO row order (farthest first) inside every truck
+            keep = np.lexsort((-new_order, owner))
+            rows, assigned_order = rows[keep], new_order[keep]
+
+    return {
+        "rows": rows,
+        "route_order": assigned_order,
+        "owner": owner,
+        "first_rows": first_rows,
+        "truck_pos": truck_pos,
+        "load_kg": load_sum,
+        "route_km": route_km,
+        "saved_km": saved_km,
+    }
+
+# Every truck's depot -> stops (in route order) -> depot points, flattened, plus offsets per truck
+def truck_route_points(start_coord, coords, owner, route_order):
+    counts = np.bincount(owner)
+    offsets = np.concatenate(([0], np.cumsum(counts + 2)))
+    points = np.empty((offsets[-1], 2))
+    points[:] = start_coord
+    visit = np.lexsort((route_order, owner))
+    points[np.arange(len(owner)) + 2 * owner[visit] + 1] = np.asarray(coords)[visit]
+    return points, offsets
 
 def filo_grouped_truck_allocation(filtered_orders, customers_df, products_df, trucks_df, config,
-                                   fuel_price_per_litre=90.0, mileage_kmpl=4.0, warehouses_df=None):
-    import uuid
-    import os
-    import pandas as pd
-    from utils.logic import calculate_total_route_distance, nearest_neighbor_route
-
+                                   fuel_price_per_litre=90.0, mileage_kmpl=4.0, warehouses_df=None,
+                                   distance_mode="haversine", context=None):
     all_truck_allocations = []
-    states = customers_df['state'].dropna().unique()
 
-    # Ensure consistent data types
-    filtered_orders['customer_id'] = filtered_orders['customer_id'].astype(str)
-    filtered_orders['product_id'] = filtered_orders['product_id'].astype(str)
-    customers_df['customer_id'] = customers_df['customer_id'].astype(str)
-    products_df['product_id'] = products_df['product_id'].astype(str)
+    # Join, type and group the tables once (or reuse the run's AllocationContext)
+    if context is None:
+        context = AllocationContext(filtered_orders, customers_df, products_df, trucks_df, warehouses_df)
+    partition = context.partition
 
-    target_date = pd.to_datetime(filtered_orders['delivery_date'].iloc[0]).date()
+    target_date = pd.to_datetime(context.delivery_date).date()
     min_percent = config.get('min_load_percent', 60) / 100
     max_percent = config.get('max_load_percent', 95) / 100
+    improve_ms = config.get('route_improvement_ms', 0)
+    improve_checks = int(config.get('route_improvement_checks', MAX_CHECKS))
+    distance_backend = config.get('distance_backend')
 
-    for state in states:
-        state_customers = customers_df[customers_df['state'] == state]
-        state_orders = filtered_orders[filtered_orders['customer_id'].isin(state_customers['customer_id'])]
-        state_trucks = trucks_df[trucks_df['state'] == state]
-        state_warehouse = warehouses_df[warehouses_df['state'] == state] if warehouses_df is not None else pd.DataFrame()
+    jobs = []
+    for state in context.states:
+        customer_summary = context.customer_summary(state, by_date=True)
+        state_trucks = partition.trucks(state)
 
-        if state_orders.empty or state_trucks.empty:
+        if customer_summary.empty or state_trucks.empty:
             continue
 
-        # Merge all required details
-        merged = state_orders.merge(state_customers, on='customer_id').merge(products_df, on='product_id')
-        merged['total_weight_kg'] = merged['num_boxes'] * merged['weight_per_box']
-        merged['total_volume_m3'] = merged['num_boxes'] * merged['size_per_box']
-
-        # Summarize per customer
-        customer_summary = merged.groupby(
-            ['customer_id', 'customer_name', 'latitude', 'longitude', 'delivery_date']
-        ).agg({
-            'total_weight_kg': 'sum',
-            'total_volume_m3': 'sum'
-        }).reset_index()
-
         # Determine starting warehouse or average
-        start_coord = (
-            (state_warehouse.iloc[0]['latitude'], state_warehouse.iloc[0]['longitude'])
-            if not state_warehouse.empty else
-            (customer_summary['latitude'].mean(), customer_summary['longitude'].mean())
+        start_coord = partition.warehouse_coord(state) or (
+            customer_summary['latitude'].mean(), customer_summary['longitude'].mean()
         )
 
-        # Get route using Nearest Neighbor
-        customer_coords = list(zip(customer_summary['latitude'], customer_summary['longitude']))
-        ordered_route = nearest_neighbor_route(customer_coords, start_coord)[1:]
-
-        # Apply FILO: farthest delivery first
-        customer_summary['route_order'] = customer_summary.apply(
-            lambda row: ordered_route.index((row['latitude'], row['longitude'])) + 1
-            if (row['latitude'], row['longitude']) in ordered_route else 0,
-            axis=1
-        )
-        customer_summary = customer_summary.sort_values(by='route_order', ascending=False)
-
         # Add truck capacity limits
         state_trucks = state_trucks.copy()
         state_trucks['min_capacity_kg'] = state_trucks['capacity_tons'] * 1000 * min_percent
         state_trucks['max_capacity_kg'] = state_trucks['capacity_tons'] * 1000 * max_percent
         state_trucks = state_trucks.sort_values(by='capacity_tons', ascending=False)
 
-        truck_allocations = []
-        remaining_customers = customer_summary.copy()
-        truck_id = 1
-
-        while not remaining_customers.empty:
-            assigned = pd.DataFrame()
-
-            for _, truck in state_trucks.iterrows():
-                truck_capacity = truck['capacity_tons'] * 1000
-                min_capacity = truck['min_capacity_kg']
-                max_capacity = truck['max_capacity_kg']
-
-                load_sum = 0
-                selected_rows = []
-
-                # Try adding customers until the truck is efficiently filled
-                for idx, row in remaining_customers.iterrows():
-                    if load_sum + row['total_weight_kg'] <= truck_capacity:
-                        load_sum += row['total_weight_kg']
-                        selected_rows.append(idx)
-
-                if selected_rows and min_capacity <= load_sum <= max_capacity:
-                    assigned = remaining_customers.loc[selected_rows].copy()
-                    remaining_customers.drop(index=selected_rows, inplace=True)
-
-                    # Assign truck info
-                    assigned['truck_type'] = truck['truck_type']
-                    assigned['truck_id'] = str(uuid.uuid4())[:8]
-                    assigned['route_id'] = truck_id
-                    assigned['truck_capacity_kg'] = truck_capacity
-                    assigned['utilization_percent'] = round((load_sum / truck_capacity) * 100, 2)
-                    assigned['state'] = state
-                    assigned['delivery_date'] = assigned['delivery_date'].iloc[0]
-
-                    # Route distance + fuel
-                    route_points = assigned.sort_values("route_order")[["latitude", "longitude"]].values
-                    depot = start_coord if start_coord else route_points[0]
-                    full_route = [depot] + [tuple(coord) for coord in route_points] + [depot]
-                    total_distance_km = calculate_total_route_distance(full_route)
-
-                    fuel_used_litres = total_distance_km / mileage_kmpl
-                    assigned['total_distance_km'] = round(total_distance_km, 2)
-                    assigned['fuel_cost'] = round(fuel_used_litres * fuel_price_per_litre, 2)
-                    assigned['emissions_estimate'] = round(fuel_used_litres * 2.68, 2)
-
-                    truck_allocations.append(assigned)
-                    truck_id += 1
-                    break  # Move to next truck
-
-            if assigned.empty:
-                break  # Stop if no truck can be used efficiently
-
-        if truck_allocations:
-            all_truck_allocations.append(pd.concat(truck_allocations, ignore_index=True))
+        jobs.append((state, customer_summary, state_trucks, (
+            state, target_date, start_coord,
+            customer_summary['latitude'].to_numpy(dtype=float),
+            customer_summary['longitude'].to_numpy(dtype=float),
+            customer_summary['total_weight_kg'].to_numpy(dtype=float),
+            state_trucks['capacity_tons'].to_numpy(dtype=float) * 1000,
+            state_trucks['min_capacity_kg'].to_numpy(dtype=float),
+            state_trucks['max_capacity_kg'].to_numpy(dtype=float),
+            improve_ms, distance_mode, distance_backend, improve_checks,
+        )))
+
+    # Route, pack and cost every state (in parallel if configured); merge in state order
+    workers = allocation_workers(config, sum(len(job[1]) for job in jobs))
+    plans = map_states(filo_state_plan, [job[3] for job in jobs], workers)
 
-    final_df = pd.concat(all_truck_allocations, ignore_index=True) if all_truck_allocations else pd.DataFrame()
+    all_routes = []
+    for (state, customer_summary, state_trucks, task), plan in zip(jobs, plans):
+        if plan is None:
+            continue
+
+        # Build the state's output in one go: one row per assigned customer
+        owner = plan['owner']
+        truck_pos = plan['truck_pos']
+        n_trucks = len(truck_pos)
+        assigned = customer_summary.iloc[plan['rows']].reset_index(drop=True)
+        assigned['route_order'] = plan['route_order']
+        truck_capacity = state_trucks['capacity_tons'].to_numpy()[truck_pos] * 1000
+        truck_dates = customer_summary['delivery_date'].to_numpy()[plan['first_rows']]
+
+        distances, fuel_costs, emissions = [], [], []
+        for total_distance_km in plan['route_km'].tolist():
+            fuel_used_litres = total_distance_km / mileage_kmpl
+            distances.append(round(total_distance_km, 2))
+            fuel_costs.append(round(fuel_used_litres * fuel_price_per_litre, 2))
+            emissions.append(round(fuel_used_litres * 2.68, 2))
+
+        # Assign truck info
+        assigned['truck_type'] = state_trucks['truck_type'].to_numpy()[truck_pos][owner]
+        assigned['truck_id'] = np.array([str(uuid.uuid4())[:8] for _ in range(n_trucks)])[owner]
+        assigned['route_id'] = np.arange(1, n_trucks + 1)[owner]
+        assigned['truck_capacity_kg'] = truck_capacity[owner]
+        assigned['utilization_percent'] = np.array(
+            [round((load / capacity) * 100, 2) for load, capacity in zip(plan['load_kg'], truck_capacity)]
+        )[owner]
+        assigned['state'] = state
+        assigned['delivery_date'] = truck_dates[owner]
+        assigned['total_distance_km'] = np.array(distances)[owner]
+        assigned['fuel_cost'] = np.array(fuel_costs)[owner]
+        assigned['emissions_estimate'] = np.array(emissions)[owner]
+        assigned['distance_saved_km'] = np.round(plan['saved_km'], 2)[owner]
+
+        # Route geometry goes to its own per-truck table instead of a column on every row
+        points, offsets = truck_route_points(
+            task[2], assigned[['latitude', 'longitude']].to_numpy(dtype=float), owner, plan['route_order']
+        )
+        truck_ids = assigned['truck_id'].to_numpy()[np.searchsorted(owner, np.arange(n_trucks))]
+        all_routes.append(route_table(truck_ids, points, offsets, state=state))
 
-    # Save/merge output to file
-    existing_path = "data/allocation.csv"
-    if os.path.exists(existing_path):
-        existing_df = pd.read_csv(existing_path)
-        existing_df['delivery_date'] = pd.to_datetime(existing_df['delivery_date']).dt.date
-        existing_df = existing_df[existing_df['delivery_date'] != target_date]
-        final_df = pd.concat([existing_df, final_df], ignore_index=True)
+        all_truck_allocations.append(assigned)
+
+    final_df = pd.concat(all_truck_allocations, ignore_index=True) if all_truck_allocations else pd.DataFrame()
+    routes_df = pd.concat(all_routes, ignore_index=True) if all_routes else pd.DataFrame()
 
-    if not final_df.empty:
-        final_df.to_csv(existing_path, index=False)
+    # Replace this date's partition of the allocation store; other dates are not touched
+    save_allocation(final_df, target_date, routes=routes_df)
 
     return final_df
 
@@ -0,0 +1,178 @@
+#Process-wide cache of built route maps and their HTML, keyed by a digest of what they are drawn from
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.table_cache import frame_digest
+
+
+def map_key(allocated_df, warehouses_df, routes=None, road_routes=None, **options):
+    """
+    Digest of everything create_colored_route_map draws: the (filtered)
+    allocation frame, the warehouses, stored and road geometry, and any
+    keyword options. Equal inputs from any session give the same key.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(frame_digest(allocated_df).encode())
+    h.update(frame_digest(warehouses_df).encode())
+    for geometry in (routes, road_routes):
+        for truck_id in sorted(geometry or {}, key=str):
+            parts = geometry[truck_id]
+            h.update(str(truck_id).encode())
+            for part in (parts if isinstance(parts, tuple) else (parts,)):
+                part = np.ascontiguousarray(part)
+                h.update(f"{part.dtype}{part.shape}".encode())
+                h.update(part.tobytes())
+        h.update(b"|")
+    h.update(repr(sorted(options.items())).encode())
+    return h.hexdigest()
+
+
+def _elements(root):
+    """Every element under a figure, its header/html/script sections included."""
+    todo = [root, root.header, root.html, root.script]
+    while todo:
+        element = todo.pop()
+        yield element
+        todo.extend(element._children.values())
+
+
+def _restore(tree):
+    """Drops the children added to each element since tree was taken."""
+    for element, names in tree:
+        children = element._children
+        for name in [name for name in children if name not in names]:
+            del children[name]
+
+
+class MapCache:
+    """
+    Built folium maps (at most max_maps) and the HTML rendered from them (up
+    to max_html_bytes), least recently used dropped first. A map is built on
+    the first get_map() of its key; its HTML only on the first get_html(), so
+    a page that shows the map but is never downloaded never renders it.
+    Rendering a folium map adds children to it (a SetIcon per marker, an
+    addTo per layer, its scripts on the figure), and st_folium renames its
+    elements, which would leave stale copies of those in the next render: the
+    children of every element at build time are recorded, and anything added
+    since is dropped each time the map is handed out or rendered again. Hold
+    lock(key) while showing a map, since get_html() may run on another
+    thread (a download button callback).
+    """
+
+    def __init__(self, max_maps=8, max_html_bytes=64 * 2**20):
+        self.max_maps = max_maps
+        self.max_html_bytes = max_html_bytes
+        self.hits = 0
+        self.misses = 0
+        self.html_hits = 0
+        self.html_misses = 0
+        self.evictions = 0
+        self._maps = OrderedDict()  # key -> (map, [(element, names of its children at build time)])
+        self._html = OrderedDict()  # key -> HTML bytes
+        self._html_bytes = 0
+        self._locks = {}  # key -> lock held while the map is shown or rendered
+        self._lock = threading.Lock()
+
+    def lock(self, key):
+        with self._lock:
+            return self._locks.setdefault(key, threading.RLock())
+
+    def get_map(self, key, build):
+        """The map of key, calling build() on a miss."""
+        with self._lock:
+            entry = self._maps.get(key)
+            if entry is not None:
+                self._maps.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if entry is not None:
+            with self.lock(key):
+                _restore(entry[1])
+            return entry[0]
+        m = build()
+        tree = [(element, set(element._children)) for element in _elements(m.get_root())]
+        with self._lock:
+            self._maps[key] = (m, tree)
+            self._evict()
+        return m
+
+    def get_html(self, key, build):
+        """UTF-8 HTML of the map of key, rendered (and the map built) on first use."""
+        with self._lock:
+            html = self._html.get(key)
+            if html is not None:
+                self._html.move_to_end(key)
+                self.html_hits += 1
+                return html
+            self.html_misses += 1
+        with self.lock(key):
+            html = self.get_map(key, build).get_root().render().encode("utf-8")
+        with self._lock:
+            if key not in self._html and len(html) <= self.max_html_bytes:
+                self._html[key] = html
+                self._html_bytes += len(html)
+                self._evict()
+        return html
+
+    def resize(self, max_maps=None, max_html_bytes=None):
+        with self._lock:
+            if max_maps is not None:
+                self.max_maps = max_maps
+            if max_html_bytes is not None:
+                self.max_html_bytes = max_html_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._maps.clear()
+            self._html.clear()
+            self._html_bytes = 0
+            self._locks.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "html_hits": self.html_hits,
+                "html_misses": self.html_misses,
+                "evictions": self.evictions,
+                "maps": len(self._maps),
+                "html_bytes": self._html_bytes,
+                "max_html_bytes": self.max_html_bytes,
+            }
+
+    def _evict(self):
+        while len(self._maps) > self.max_maps:
+            key, _ = self._maps.popitem(last=False)
+            self.evictions += 1
+            if key not in self._html:
+                self._locks.pop(key, None)
+        while self._html_bytes > self.max_html_bytes and self._html:
+            key, html = self._html.popitem(last=False)
+            self._html_bytes -= len(html)
+            self.evictions += 1
+            if key not in self._maps:
+                self._locks.pop(key, None)
+
+
+# Shared by every session of this server process
+_map_cache = MapCache()
+
+
+def get_map_cache():
+    """The process-wide cache, sized from config.json "map_cache_maps" (default 8) and "map_cache_mb" (default 64)."""
+    from utils.db_utils import load_config
+    config = load_config()
+    _map_cache.resize(int(config.get("map_cache_maps", 8)), int(config.get("map_cache_mb", 64)) * 2**20)
+    return _map_cache
+
+
+def map_cache_stats():
+    return _map_cache.stats()
@@ -1,14 +1,158 @@
+import json
 import folium
-from folium.plugins import BeautifyIcon, AntPath, MiniMap, MeasureControl
+from branca.element import CssLink, Element, JavascriptLink
+from folium.elements import JSCSSMixin
+from folium.plugins import BeautifyIcon, AntPath, MiniMap, MeasureControl, MarkerCluster
+from folium.template import Template
 from utils.constants import COLOR_PALETTE
 import numpy as np
-from geopy.distance import geodesic
-
-def create_colored_route_map(allocated_df, customers_df, warehouses_df):
+import pandas as pd
+from utils.distance_matrix import get_distance_matrix
+from utils.partition import partition_by_state
+from utils.route_utils import haversine_np
+from utils.route_geometry import at_zoom, fit_zoom
+
+# Road lines keep the detail of this many zoom levels past the one that fits their truck's stops
+DETAIL_ZOOM_IN = 2
+# Above this many stops the map is built in high-volume mode (see TruckGeoJsonLayers)
+HIGH_VOLUME_STOPS = 1500
+
+# Points drawn for one truck (stored geometry, else depot + stops in row order) and the km of every leg between them.
+# shared: start_coord is the state's warehouse, so the state's cached distance matrix has these legs
+def _truck_path(truck_id, state, delivery_date, start_coord, lat, lon, routes, shared=True):
+    geometry = routes.get(truck_id) if routes else None
+    if geometry is not None and len(geometry) > 1:
+        lat, lon = geometry[:, 0].astype(float), geometry[:, 1].astype(float)
+        return geometry.astype(float).tolist(), haversine_np(lat[:-1], lon[:-1], lat[1:], lon[1:])
+
+    points = [start_coord] + list(zip(lat, lon))
+    if not shared:
+        # Drawn from the truck's own centre: its legs directly, not a matrix cached for one truck
+        lat, lon = np.r_[start_coord[0], lat], np.r_[start_coord[1], lon]
+        return points, haversine_np(lat[:-1], lon[:-1], lat[1:], lon[1:])
+    # Leg lengths come from the state's shared distance matrix
+    matrix = get_distance_matrix(state, delivery_date if pd.notna(delivery_date) else None, start_coord, points[1:])
+    stops = matrix.indices(points)
+    return points, matrix.legs_km(stops[:-1], stops[1:])
+
+# Adds every truck's stops to its state's distance matrix in one go, instead of growing it truck by truck
+def _warm_distance_matrices(allocated_df, warehouses):
+    if "state" not in allocated_df:
+        return
+    keys = ["state"] + (["delivery_date"] if "delivery_date" in allocated_df else [])
+    for key, rows in allocated_df.groupby(keys, dropna=False, sort=False):
+        state, delivery_date = (key + (None,))[:2] if isinstance(key, tuple) else (key, None)
+        depot = warehouses.warehouse_coord(state)
+        if depot:  # without a warehouse each truck is drawn from its own centre, without a matrix
+            get_distance_matrix(state, delivery_date if pd.notna(delivery_date) else None, depot,
+                                rows[['latitude', 'longitude']].to_numpy(dtype=float))
+
+class _RawScript(Element):
+    """Script text added as it is (branca would compile it as a Jinja template first, which is slow on big data)."""
+
+    def __init__(self, text):
+        super().__init__()
+        self.text = text
+
+    def render(self, **kwargs):
+        return self.text
+
+
+class TruckGeoJsonLayers(JSCSSMixin):
+    """
+    High-volume truck layers. Every truck gets one GeoJSON FeatureCollection
+    (its route line, its legs labelled with their km, its depot) and its stops
+    in a client-side marker cluster. One script fills every truck's
+    FeatureGroup from one JSON payload, instead of a Marker (with its own
+    script) per stop and per leg label.
+    """
+
+    default_js = MarkerCluster.default_js
+    default_css = MarkerCluster.default_css
+    # st_folium builds its map from each element's script macro; a plain render goes through render() below
+    _template = Template("{% macro script(this, kwargs) %}{{ this.script_text() }}{% endmacro %}")
+
+    def __init__(self):
+        super().__init__()
+        self._name = "TruckGeoJsonLayers"
+        self.trucks = []
+
+    def add_truck(self, layer, color, collection, stops):
+        self.trucks.append({"layer": layer, "color": color, "lines": collection, "stops": stops})
+
+    def script_text(self):
+        payload = json.dumps([{k: v for k, v in truck.items() if k != "layer"} for truck in self.trucks])
+        # Layers by variable name, so renaming them (as st_folium does) renames these too
+        layers = ", ".join(truck["layer"].get_name() for truck in self.trucks)
+        return """
+        (function () {
+            var trucks = %s;
+            var layers = [%s];
+            trucks.forEach(function (truck, i) {
+                var layer = layers[i];
+                L.geoJSON(truck.lines, {
+                    style: function (feature) {
+                        return feature.properties.kind === "hidden-leg"
+                            ? {color: truck.color, weight: 10, opacity: 0}
+                            : {color: truck.color, weight: 4, opacity: 0.8};
+                    },
+                    pointToLayer: function (feature, latlng) {
+                        return L.circleMarker(latlng, {radius: 8, color: truck.color, fillColor: truck.color, fillOpacity: 0.9});
+                    },
+                    onEachFeature: function (feature, line) { line.bindTooltip(feature.properties.label); }
+                }).addTo(layer);
+                var cluster = L.markerClusterGroup();
+                truck.stops.forEach(function (stop) {
+                    cluster.addLayer(L.circleMarker([stop[0], stop[1]], {radius: 5, color: truck.color, fillOpacity: 0.8})
+                        .bindTooltip(stop[2]));
+                });
+                cluster.addTo(layer);
+            });
+        })();
+        """ % (payload.replace("</", "<\\/"), layers)
+
+    def render(self, **kwargs):
+        figure = self.get_root()
+        for name, url in self.default_js:
+            figure.header.add_child(JavascriptLink(url), name=name)
+        for name, url in self.default_css:
+            figure.header.add_child(CssLink(url), name=name)
+        figure.script.add_child(_RawScript(self.script_text()), name=self.get_name())
+
+# The truck's GeoJSON FeatureCollection: road line (if any), legs with their km as a hover label
+# (invisible but hoverable under a road line) and the depot with the truck's details
+def _truck_collection(truck_id, truck_info, start_coord, points, leg_km, path):
+    road = path is not points
+    features = [{
+        "type": "Feature",
+        "geometry": {"type": "LineString", "coordinates": [[lon, lat] for lat, lon in path]},
+        "properties": {"kind": "road", "label": f"Truck {truck_id}"},
+    }] if road else []
+    features += [{
+        "type": "Feature",
+        "geometry": {"type": "LineString", "coordinates": [[points[j][1], points[j][0]], [points[j + 1][1], points[j + 1][0]]]},
+        "properties": {"kind": "hidden-leg" if road else "leg", "label": f"{j} ➝ {j + 1}: {round(float(leg_km[j]), 2)} km"},
+    } for j in range(len(points) - 1)]
+    features.append({
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [float(start_coord[1]), float(start_coord[0])]},
+        "properties": {"kind": "depot", "label": truck_info},
+    })
+    return {"type": "FeatureCollection", "features": features}
+
+# routes: optional {truck_id: (n, 2) points} from route_geometry.decode_routes;
+# trucks without stored geometry are drawn from their allocation rows.
+# road_routes: optional {truck_id: (road polyline, vertex zooms)} (route_fetcher.fetch_road_routes) drawn instead
+# of straight legs, simplified to detail_zoom (default: per truck, see DETAIL_ZOOM_IN).
+# high_volume: GeoJSON layers and clustered stops; None switches it on above HIGH_VOLUME_STOPS stops
+def create_colored_route_map(allocated_df, customers_df, warehouses_df, routes=None, road_routes=None, detail_zoom=None,
+                             high_volume=None):
     all_lat = warehouses_df['latitude'].tolist()
     all_lon = warehouses_df['longitude'].tolist()
     center_lat = np.mean(all_lat)
     center_lon = np.mean(all_lon)
+    if high_volume is None:
+        high_volume = len(allocated_df) > HIGH_VOLUME_STOPS
 
     # Modern Base Map
     m = folium.Map(location=[center_lat, center_lon], zoom_start=5, tiles="CartoDB Positron")
@@ -24,31 +168,63 @@ def create_colored_route_map(allocated_df, customers_df, warehouses_df):
             icon=folium.Icon(color="green", icon="building", prefix='fa')
         ).add_to(warehouse_layer)
 
+    warehouses = partition_by_state(warehouses=warehouses_df)
     grouped = allocated_df.groupby("truck_id")
     truck_legend = []
+    geojson_layers = TruckGeoJsonLayers() if high_volume else None
+    _warm_distance_matrices(allocated_df, warehouses)
 
     for i, (truck_id, group) in enumerate(grouped):
         color = COLOR_PALETTE[i % len(COLOR_PALETTE)]
-        truck_type = group.iloc[0].get("truck_type", "N/A")
-        fuel_cost = group.iloc[0].get("fuel_cost", 0)
-        emissions = group.iloc[0].get("emissions_estimate", 0)
-        capacity = group.iloc[0].get("truck_capacity_kg", 0)
-        utilization = group.iloc[0].get("utilization_percent", 0)
-        state = group.iloc[0].get("state")
-
-        warehouse = warehouses_df[warehouses_df['state'] == state]
-        start_coord = (warehouse.iloc[0]['latitude'], warehouse.iloc[0]['longitude']) if not warehouse.empty else (group['latitude'].mean(), group['longitude'].mean())
-
-        points = list(zip(group['latitude'], group['longitude']))
-        points.insert(0, start_coord)
+        first = group.iloc[0]
+        truck_type = first.get("truck_type", "N/A")
+        fuel_cost = first.get("fuel_cost", 0)
+        emissions = first.get("emissions_estimate", 0)
+        capacity = first.get("truck_capacity_kg", 0)
+        utilization = first.get("utilization_percent", 0)
+        state = first.get("state")
+
+        lat = group['latitude'].to_numpy(dtype=float)
+        lon = group['longitude'].to_numpy(dtype=float)
+        depot = warehouses.warehouse_coord(state)
+        start_coord = depot or (lat.mean(), lon.mean())
+        points, leg_km = _truck_path(truck_id, state, first.get("delivery_date"), start_coord, lat, lon, routes,
+                                     shared=bool(depot))
+
+        road = road_routes.get(truck_id) if road_routes else None
+        if road is not None:
+            zoom = detail_zoom if detail_zoom is not None else fit_zoom(points) + DETAIL_ZOOM_IN
+            path = at_zoom(*road, zoom).astype(float).tolist()
+        else:
+            path = points
+
+        truck_info = f"""
+                <b>Truck ID:</b> {truck_id}<br>
+                <b>Truck Type:</b> {truck_type}<br>
+                <b>Fuel Cost:</b> ₹{fuel_cost}<br>
+                <b>Emissions:</b> {emissions} kg CO₂<br>
+                <b>Capacity:</b> {capacity} kg<br>
+                <b>Utilization:</b> {utilization}%
+            """
 
         # Add to separate truck layer
         truck_layer = folium.FeatureGroup(name=f"Truck {truck_id}", show=True)
-        AntPath(points, color=color, weight=4, delay=800).add_to(truck_layer)
+        if high_volume:
+            names = group['customer_name'].astype(str).tolist() if 'customer_name' in group else [""] * len(group)
+            orders = group['route_order'].tolist() if 'route_order' in group else [""] * len(group)
+            stops = [[a, b, f"{name} · Route Order: {order} · Truck: {truck_id}"]
+                     for a, b, name, order in zip(lat.tolist(), lon.tolist(), names, orders)]
+            geojson_layers.add_truck(truck_layer, color,
+                                     _truck_collection(truck_id, truck_info, start_coord, points, leg_km, path), stops)
+            truck_layer.add_to(m)
+            truck_legend.append((color, truck_id))
+            continue
+
+        AntPath(path, color=color, weight=4, delay=800).add_to(truck_layer)
 
         # Distance Labels
         for j in range(1, len(points)):
-            dist_km = round(geodesic(points[j - 1], points[j]).km, 2)
+            dist_km = round(float(leg_km[j - 1]), 2)
             midpoint = [(points[j - 1][0] + points[j][0]) / 2, (points[j - 1][1] + points[j][1]) / 2]
             folium.Marker(
                 location=midpoint,
@@ -58,33 +234,30 @@ def create_colored_route_map(allocated_df, customers_df, warehouses_df):
         # Depot marker
         folium.Marker(
             location=start_coord,
-            popup=folium.Popup(f"""
-                <b>Truck ID:</b> {truck_id}<br>
-                <b>Truck Type:</b> {truck_type}<br>
-                <b>Fuel Cost:</b> ₹{fuel_cost}<br>
-                <b>Emissions:</b> {emissions} kg CO₂<br>
-                <b>Capacity:</b> {capacity} kg<br>
-                <b>Utilization:</b> {utilization}%
-            """, max_width=300),
+            popup=folium.Popup(truck_info, max_width=300),
             icon=folium.Icon(color="blue", icon="truck", prefix='fa')
         ).add_to(truck_layer)
 
         # Customer markers
-        for _, row in group.iterrows():
+        for lat_i, lon_i, name, order in zip(lat.tolist(), lon.tolist(), group['customer_name'], group['route_order']):
             folium.Marker(
-                location=(row['latitude'], row['longitude']),
+                location=(lat_i, lon_i),
                 icon=BeautifyIcon(
                     icon_shape='marker',
-                    number=row['route_order'],
+                    number=order,
                     border_color=color,
                     text_color=color
                 ),
-                tooltip=f"{row['customer_name']}\nRoute Order: {row['route_order']}\nTruck: {truck_id}"
+                tooltip=f"{name}\nRoute Order: {order}\nTruck: {truck_id}"
             ).add_to(truck_layer)
 
         truck_layer.add_to(m)
         truck_legend.append((color, truck_id))
 
+    # Fills the truck layers, so its script has to come after theirs
+    if geojson_layers is not None:
+        geojson_layers.add_to(m)
+
     # 🚛 Truck Color Legend (black text)
     legend_html = """
     <div style='position: fixed; bottom: 30px; left: 30px; z-index:9999; font-size:14px;
@@ -101,8 +274,6 @@ def create_colored_route_map(allocated_df, customers_df, warehouses_df):
 
     return m
 
-<<<<<<< HEAD
-=======
 
 # # -------------------------------------LIVE ROUTE-------------------------------------------#
 
@@ -234,4 +405,3 @@ def create_colored_route_map(allocated_df, customers_df, warehouses_df):
 
 #     folium.LayerControl(collapsed=False).add_to(m)
 #     return m
->>>>>>> df81800 (Enhanced delivery map with GraphHopper for optimized truck routing.)
@@ -0,0 +1,286 @@
+#Append-only journal of placed orders (and the stock they take), folded into the base tables by a compactor
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+from utils.storage import file_version
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+ORDER_COLUMNS = ["order_id", "customer_id", "product_id", "num_boxes", "order_date", "delivery_date", "placed_by"]
+FIRST_ORDER_ID = 1001
+
+
+@contextmanager
+def file_lock(path, shared=False):
+    """Inter-process lock on path (also excludes other threads: each call opens its own handle). Not re-entrant."""
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class OutOfStock(ValueError):
+    def __init__(self, product_id, available):
+        super().__init__(f"Not enough stock for product {product_id}. Only {available} left.")
+        self.product_id = product_id
+        self.available = available
+
+
+def _numeric_max(values):
+    values = pd.to_numeric(pd.Series(values), errors="coerce").dropna()
+    return int(values.max()) if not values.empty else None
+
+
+class OrderJournal:
+    """
+    Orders are appended to journal.jsonl, one JSON line per order with its
+    lines; each line also records the stock it takes. Placing an order reads
+    only the ordered products' stock and appends one line under the lock, so it
+    costs O(items) and two sessions can't overwrite each other. Readers see
+    base tables + journal (merged()); compact() folds the journal into the
+    base tables and empties it.
+
+    Folding survives a crash: the journal is first renamed to folding.jsonl,
+    stock is applied once (the folded.stock marker records it), orders are
+    inserted unless their order_id is already in the base table, and the
+    leftover is finished by the next lock holder.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.journal = os.path.join(directory, "journal.jsonl")
+        self.folding = os.path.join(directory, "folding.jsonl")
+        self.stock_marker = os.path.join(directory, "folded.stock")
+        self.counter = os.path.join(directory, "next_order_id")
+        self.lock_path = os.path.join(directory, "journal.lock")
+        self._parsed = {}  # path -> (version, records)
+        self._compactor = None
+        self._compacting = threading.Lock()
+
+    @contextmanager
+    def locked(self, shared=False):
+        os.makedirs(self.directory, exist_ok=True)
+        with file_lock(self.lock_path, shared=shared):
+            yield
+
+    def version(self):
+        return file_version(self.journal, self.folding)
+
+    # ---------- reading ----------
+    def _records(self, path):
+        version = file_version(path)
+        if version is None:
+            return []
+        cached = self._parsed.get(path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        with open(path, "rb") as f:
+            data = f.read()
+        # A line without its newline is an append cut short by a crash: not committed
+        records = [json.loads(line) for line in data.split(b"\n")[:-1] if line.strip()]
+        self._parsed[path] = (version, records)
+        return records
+
+    def pending(self):
+        return len(self._records(self.journal))
+
+    @staticmethod
+    def _order_rows(records):
+        rows = [
+            [r["order_id"], r["customer_id"], product_id, num_boxes, r["order_date"], r["delivery_date"], r["placed_by"]]
+            for r in records for product_id, num_boxes in r["lines"]
+        ]
+        return pd.DataFrame(rows, columns=ORDER_COLUMNS)
+
+    @staticmethod
+    def _stock_deltas(records):
+        """{str(product_id): change in available_stock}."""
+        deltas = {}
+        for r in records:
+            for product_id, num_boxes in r["lines"]:
+                deltas[str(product_id)] = deltas.get(str(product_id), 0) - int(num_boxes)
+        return deltas
+
+    def merged(self, table, base):
+        """The base frame of 'orders' or 'products' with the journal applied. Call under locked()."""
+        records = self._records(self.journal)
+        if table == "orders":
+            if not records:
+                return base
+            journal_rows = self._order_rows(records)
+            return pd.concat([base, journal_rows.reindex(columns=base.columns.union(journal_rows.columns, sort=False))],
+                             ignore_index=True) if not base.empty else journal_rows
+        if table == "products" and records and "available_stock" in base.columns:
+            deltas = self._stock_deltas(records)
+            change = base["product_id"].astype(str).map(deltas).fillna(0)
+            return base.assign(available_stock=(base["available_stock"].fillna(0) + change).astype(int))
+        return base
+
+    def load(self, backend, table):
+        """Base table + journal, finishing a fold a crash left behind first."""
+        if os.path.exists(self.folding):
+            self.compact(backend)
+        with self.locked(shared=True):
+            return self.merged(table, backend.load(table))
+
+    # ---------- placing orders ----------
+    def _append(self, record):
+        line = (json.dumps(record, default=str) + "\n").encode()
+        fd = os.open(self.journal, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            # Drop a line a crash cut short, so the new one starts on its own line
+            size = os.fstat(fd).st_size
+            if size:
+                with open(self.journal, "rb") as f:
+                    f.seek(max(size - 4096, 0))
+                    tail = f.read()
+                if not tail.endswith(b"\n"):
+                    os.truncate(self.journal, size - len(tail.rsplit(b"\n", 1)[-1]))
+            os.write(fd, line)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _next_order_id(self, backend):
+        if os.path.exists(self.counter):
+            with open(self.counter) as f:
+                next_id = int(f.read().strip())
+        else:
+            # First use: continue after the highest order_id in the base table and journal
+            ids = list(backend.load("orders").get("order_id", []))
+            ids += [r["order_id"] for r in self._records(self.journal) + self._records(self.folding)]
+            highest = _numeric_max(ids)
+            next_id = highest + 1 if highest is not None else FIRST_ORDER_ID
+        tmp = f"{self.counter}.tmp"
+        with open(tmp, "w") as f:
+            f.write(str(next_id + 1))
+        os.replace(tmp, self.counter)
+        return next_id
+
+    def place_order(self, backend, customer_id, placed_by, lines, order_date, delivery_date):
+        """
+        lines: [(product_id, num_boxes)]. Checks stock and journals the order
+        atomically; returns its order_id. Raises OutOfStock when a product
+        has less stock left than ordered.
+        """
+        if os.path.exists(self.folding):
+            self.compact(backend)
+        lines = [(product_id.item() if hasattr(product_id, "item") else product_id, int(num_boxes))
+                 for product_id, num_boxes in lines]
+        ordered = {}
+        for product_id, num_boxes in lines:
+            ordered[product_id] = ordered.get(product_id, 0) + num_boxes
+
+        with self.locked():
+            products = backend.select("products", product_id=list(ordered))
+            stock = dict(zip(products["product_id"].astype(str), products["available_stock"].fillna(0).astype(int)))
+            deltas = self._stock_deltas(self._records(self.journal))
+            for product_id, num_boxes in ordered.items():
+                available = stock.get(str(product_id), 0) + deltas.get(str(product_id), 0)
+                if num_boxes > available:
+                    raise OutOfStock(product_id, available)
+
+            order_id = self._next_order_id(backend)
+            self._append({
+                "order_id": order_id,
+                "customer_id": customer_id.item() if hasattr(customer_id, "item") else customer_id,
+                "placed_by": placed_by,
+                "order_date": str(order_date),
+                "delivery_date": str(delivery_date),
+                "lines": lines,
+                "placed_at": time.time(),
+            })
+        return order_id
+
+    # ---------- compaction ----------
+    def _fold(self, backend):
+        """Folds the journal into the base tables. Call under locked()."""
+        if not os.path.exists(self.folding):
+            if not self._records(self.journal):
+                return 0
+            os.replace(self.journal, self.folding)
+        records = self._records(self.folding)
+
+        if records and not os.path.exists(self.stock_marker):
+            deltas = self._stock_deltas(records)
+            products = backend.select("products", product_id=list({p for r in records for p, _ in r["lines"]}))
+            updates = {}
+            for product_id, stock in zip(products["product_id"], products["available_stock"].fillna(0)):
+                updates[product_id] = {"available_stock": int(stock) + deltas.get(str(product_id), 0)}
+            backend.update_many("products", "product_id", updates)
+            open(self.stock_marker, "w").close()
+
+        if records:
+            order_ids = sorted({r["order_id"] for r in records})
+            present = set(backend.select("orders", order_id=order_ids).get("order_id", pd.Series(dtype=object)).astype(str))
+            backend.insert("orders", self._order_rows([r for r in records if str(r["order_id"]) not in present]))
+
+        for path in (self.folding, self.stock_marker):
+            if os.path.exists(path):
+                os.remove(path)
+        return len(records)
+
+    def compact(self, backend):
+        """Folds every journaled order into the base tables; returns how many orders were folded."""
+        with self.locked():
+            return self._fold(backend)
+
+    @contextmanager
+    def folded(self, backend):
+        """Holds the lock with the journal folded, for writes that replace base rows directly."""
+        with self.locked():
+            self._fold(backend)
+            yield
+
+    def compact_in_background(self, backend):
+        """Starts a compaction thread unless one is already running."""
+        if not self._compacting.acquire(blocking=False):
+            return
+
+        def run():
+            try:
+                self.compact(backend)
+            except Exception as e:
+                print(f"[ERROR] Order journal compaction failed: {e}")
+            finally:
+                self._compacting.release()
+
+        threading.Thread(target=run, name="order-journal-compactor", daemon=True).start()
+
+    def start_compactor(self, get_backend, interval_s):
+        """Daemon thread folding the journal every interval_s seconds (one per process)."""
+        if self._compactor is not None:
+            return
+
+        def loop():
+            while True:
+                time.sleep(interval_s)
+                if self.pending() and self._compacting.acquire(blocking=False):
+                    try:
+                        self.compact(get_backend())
+                    except Exception as e:
+                        print(f"[ERROR] Order journal compaction failed: {e}")
+                    finally:
+                        self._compacting.release()
+
+        self._compactor = threading.Thread(target=loop, name="order-journal-compactor", daemon=True)
+        self._compactor.start()
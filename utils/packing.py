@@ -0,0 +1,142 @@
+#Array based truck selection and FILO truck packing
+import numpy as np
+
+# Size of the first window scanned per step (doubles while nothing is found)
+SCAN_CHUNK = 256
+
+
+def greedy_fill(weights, capacity, suffix_min):
+    """
+    Loads one truck the way the FILO loop does: walk `weights` in order and take
+    every item for which load + weight <= capacity.
+    Runs of fitting items are taken with a cumulative sum, gaps are jumped with a
+    vectorised scan. The load is accumulated left to right (np.cumsum is
+    sequential), so it matches a plain Python loop bit for bit.
+    Returns (positions taken, load).
+    """
+    n = len(weights)
+    taken = []
+    load = 0.0
+    pos = 0
+
+    while pos < n:
+        # Take the run of consecutive items that fit
+        step = SCAN_CHUNK
+        while pos < n:
+            end = min(n, pos + step)
+            running = np.cumsum(np.concatenate(([load], weights[pos:end])))[1:]
+            over = np.flatnonzero(~(running <= capacity))
+            if over.size:
+                first = over[0]
+                if first:
+                    load = running[first - 1]
+                    taken.append(np.arange(pos, pos + first))
+                pos += first + 1  # this item does not fit and never will
+                break
+            load = running[-1]
+            taken.append(np.arange(pos, end))
+            pos = end
+            step *= 2
+
+        # Nothing left that fits -> the truck is done
+        if pos >= n or not (load + suffix_min[pos] <= capacity):
+            break
+
+        # Jump to the next item that fits
+        step = SCAN_CHUNK
+        while True:
+            end = min(n, pos + step)
+            fits = np.flatnonzero(load + weights[pos:end] <= capacity)
+            if fits.size:
+                pos += fits[0]
+                break
+            pos = end
+            step *= 2
+
+    positions = np.concatenate(taken) if taken else np.empty(0, dtype=np.intp)
+    return positions, load
+
+
+def filo_pack(weights, capacity_kg, min_capacity_kg, max_capacity_kg):
+    """
+    Packs FILO-ordered customer weights into trucks.
+    Trucks are tried in the given order (largest first); the first one whose
+    greedy load lands inside [min, max] is used, then the next pass starts over
+    with the customers that are left. Packing stops when no truck qualifies.
+    Customers already loaded are marked with an infinite weight, so a pass only
+    touches the part of the array it actually scanned.
+    Returns a list of (truck position, customer positions, load_kg).
+    """
+    weights = np.array(weights, dtype=float)
+    capacity_kg = np.asarray(capacity_kg, dtype=float)
+    min_capacity_kg = np.asarray(min_capacity_kg, dtype=float)
+    max_capacity_kg = np.asarray(max_capacity_kg, dtype=float)
+
+    n = len(weights)
+    loaded = np.zeros(n, dtype=bool)
+    # fmin ignores NaN weights, which can never be loaded anyway
+    suffix_min = np.fmin.accumulate(weights[::-1])[::-1]
+    front = 0
+    loads = []
+
+    while front < n:
+        w = weights[front:]
+        w_min = suffix_min[front:]
+
+        # Trucks of equal capacity load exactly the same customers
+        fills = {}
+        chosen = None
+        for t in range(len(capacity_kg)):
+            capacity = capacity_kg[t]
+            if capacity not in fills:
+                fills[capacity] = greedy_fill(w, capacity, w_min)
+            positions, load = fills[capacity]
+            if positions.size and min_capacity_kg[t] <= load <= max_capacity_kg[t]:
+                chosen = (t, positions, load)
+                break
+
+        if chosen is None:
+            break  # Stop if no truck can be used efficiently
+
+        t, positions, load = chosen
+        rows = front + positions
+        loads.append((t, rows, load))
+
+        # Take the loaded customers out and refresh the suffix minimum up to them
+        loaded[rows] = True
+        weights[rows] = np.inf
+        hi = rows[-1] + 1
+        tail = suffix_min[hi] if hi < n else np.inf
+        suffix_min[front:hi] = np.fmin(np.fmin.accumulate(weights[front:hi][::-1]), tail)[::-1]
+        while front < n and loaded[front]:
+            front += 1
+
+    return loads
+
+
+def smallest_feasible_truck(weights, capacity, min_capacity_kg, max_capacity_kg):
+    """
+    Position of the smallest truck (by capacity) whose [min, max] load window
+    holds each weight, or -1 when none does; equal capacities go to the truck
+    listed first. Windows that grow with capacity (min/max % of capacity) need
+    just two searchsorted calls, any other set falls back to one
+    (weights x trucks) mask.
+    """
+    weights = np.asarray(weights, dtype=float)
+    order = np.argsort(np.asarray(capacity, dtype=float), kind='stable')
+    lo = np.asarray(min_capacity_kg, dtype=float)[order]
+    hi = np.asarray(max_capacity_kg, dtype=float)[order]
+    if len(order) == 0:
+        return np.full(len(weights), -1, dtype=np.intp)
+
+    if (np.diff(lo) >= 0).all() and (np.diff(hi) >= 0).all():
+        # Feasible trucks form the run [first, stop): max >= weight from first on, min <= weight before stop
+        first = np.searchsorted(hi, weights, side='left')
+        stop = np.searchsorted(lo, weights, side='right')
+        found = first < stop
+    else:
+        fits = (lo <= weights[:, None]) & (weights[:, None] <= hi)
+        first = fits.argmax(axis=1)
+        found = fits.any(axis=1)
+
+    return np.where(found, order[np.minimum(first, len(order) - 1)], -1)
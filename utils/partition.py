@@ -0,0 +1,92 @@
+#One-pass grouping of orders, customers, trucks and warehouses by state
+import numpy as np
+import pandas as pd
+
+_EMPTY = np.empty(0, dtype=np.intp)
+
+
+def state_indices(df):
+    """{state: row positions} of a frame with a 'state' column, in row order."""
+    if df is None or df.empty or 'state' not in df.columns:
+        return {}
+    return df.groupby('state', sort=False).indices
+
+
+class StatePartition:
+    """
+    Row positions of every state's orders, customers, trucks and warehouses,
+    computed once so per-state lookups cost O(1) instead of a full mask each.
+    Orders have no state column: they follow their customer (an order whose
+    customer_id appears under several states belongs to each of them, like the
+    old isin filter). Frames are views selected by position, in original row order.
+    """
+
+    def __init__(self, orders=None, customers=None, trucks=None, warehouses=None):
+        self._frames = {'orders': orders, 'customers': customers, 'trucks': trucks, 'warehouses': warehouses}
+        self._index = {
+            'customers': state_indices(customers),
+            'trucks': state_indices(trucks),
+            'warehouses': state_indices(warehouses),
+        }
+        self._index['orders'] = self._order_indices(orders, customers)
+
+        # First warehouse per state, as the state loops always used
+        self._warehouse_coord = {}
+        if warehouses is not None and not warehouses.empty:
+            lat = warehouses['latitude'].to_numpy()
+            lon = warehouses['longitude'].to_numpy()
+            for state, rows in self._index['warehouses'].items():
+                self._warehouse_coord[state] = (lat[rows[0]], lon[rows[0]])
+
+    def _order_indices(self, orders, customers):
+        if orders is None or orders.empty or customers is None or customers.empty:
+            return {}
+        pairs = customers[['customer_id', 'state']].dropna(subset=['state']).drop_duplicates()
+        ids = pd.Index(pairs['customer_id'])
+        if ids.is_unique:
+            # -1 for orders whose customer is unknown (or has an incomparable id type), like isin
+            pos = ids.get_indexer(orders['customer_id'])
+            known = pos >= 0
+            owners = pd.Series(pairs['state'].to_numpy()[pos[known]])
+            rows = np.flatnonzero(known)
+            return {state: rows[idx] for state, idx in owners.groupby(owners, sort=False).indices.items()}
+        # Same customer_id listed under several states: one isin per state
+        order_ids = orders['customer_id']
+        return {
+            state: np.flatnonzero(order_ids.isin(group['customer_id']).to_numpy())
+            for state, group in pairs.groupby('state', sort=False)
+        }
+
+    @property
+    def states(self):
+        """States that have customers, in order of first appearance."""
+        return list(self._index['customers'])
+
+    def indices(self, table, state):
+        return self._index[table].get(state, _EMPTY)
+
+    def _rows(self, table, state):
+        df = self._frames[table]
+        if df is None:
+            return pd.DataFrame()
+        return df.iloc[self.indices(table, state)]
+
+    def orders(self, state):
+        return self._rows('orders', state)
+
+    def customers(self, state):
+        return self._rows('customers', state)
+
+    def trucks(self, state):
+        return self._rows('trucks', state)
+
+    def warehouses(self, state):
+        return self._rows('warehouses', state)
+
+    def warehouse_coord(self, state):
+        """(lat, lon) of the state's first warehouse, or None."""
+        return self._warehouse_coord.get(state)
+
+
+def partition_by_state(orders=None, customers=None, trucks=None, warehouses=None):
+    return StatePartition(orders, customers, trucks, warehouses)
@@ -0,0 +1,220 @@
+#Offline road routing on a local graph file: A* with landmarks (ALT), many-to-many by Dijkstra
+import heapq
+import os
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from scipy.spatial import cKDTree
+
+from utils.route_utils import haversine_np, unit_vectors
+
+# Small jittered road grid over Maharashtra, built by benchmarks.synthetic.build_sample_graph
+SAMPLE_GRAPH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "road_graph_sample.npz")
+
+EARTH_RADIUS_KM = 6371.0
+# Memory one many-to-many Dijkstra call may take: scipy returns a row over every graph node per origin
+MATRIX_CHUNK_BYTES = 64 * 2**20
+
+
+class RoadRouter:
+    """
+    Shortest road routes on a directed graph: nodes with lat/lon, edges u -> v
+    with a length in metres (haversine of the endpoints when not given).
+    Points are snapped to the nearest node within max_snap_km. Point-to-point
+    queries run A* guided by landmark distances (ALT: the triangle inequality
+    on precomputed distances to and from a few far-apart nodes gives a lower
+    bound much tighter than straight-line distance); many-to-many queries run
+    one C Dijkstra per distinct origin, in chunks of origins that fit
+    MATRIX_CHUNK_BYTES, each stopped at the landmarks' upper bound on the
+    farthest destination.
+    """
+
+    def __init__(self, lat, lon, u, v, length_m=None, n_landmarks=8, max_snap_km=25.0):
+        self.lat = np.asarray(lat, dtype=float)
+        self.lon = np.asarray(lon, dtype=float)
+        u = np.asarray(u, dtype=np.int64)
+        v = np.asarray(v, dtype=np.int64)
+        if length_m is None:
+            length_m = haversine_np(self.lat[u], self.lon[u], self.lat[v], self.lon[v]) * 1000
+        length_m = np.maximum(np.asarray(length_m, dtype=float), 1e-3)  # csgraph treats 0 as "no edge"
+        n = len(self.lat)
+        self.max_snap_km = max_snap_km
+
+        self.graph = csr_matrix((length_m, (u, v)), shape=(n, n))
+        self.graph.sum_duplicates()
+        self._reverse = self.graph.T.tocsr()
+        # Plain lists: heap loops index them far faster than numpy scalars
+        self._indptr = self.graph.indptr.tolist()
+        self._indices = self.graph.indices.tolist()
+        self._weights = self.graph.data.tolist()
+
+        self._tree = cKDTree(unit_vectors(self.lat, self.lon))
+        self._choose_landmarks(n_landmarks)
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        """Graph saved by save(): arrays lat, lon, u, v and optionally length_m."""
+        with np.load(path) as graph:
+            return cls(graph["lat"], graph["lon"], graph["u"], graph["v"],
+                       graph["length_m"] if "length_m" in graph else None, **kwargs)
+
+    def save(self, path):
+        coo = self.graph.tocoo()
+        np.savez_compressed(path, lat=self.lat.astype(np.float32), lon=self.lon.astype(np.float32),
+                            u=coo.row.astype(np.int32), v=coo.col.astype(np.int32),
+                            length_m=coo.data.astype(np.float32))
+
+    def __len__(self):
+        return len(self.lat)
+
+    # ---------- preprocessing ----------
+    def _choose_landmarks(self, k):
+        """Farthest-point landmarks and their distances from (to) every node; inf (unreachable) becomes nan."""
+        n = len(self)
+        k = min(k, n)
+        if k == 0:
+            # No landmarks: a zero bound, i.e. plain Dijkstra
+            self.landmarks = np.empty(0, dtype=np.intp)
+            self._from_t = self._to_t = np.zeros((n, 1))
+            return
+        landmarks = [int(np.argmax(self.lat + self.lon))]  # a corner of the map
+        nearest = np.full(n, np.inf)
+        for _ in range(k - 1):
+            d = dijkstra(self.graph, indices=landmarks[-1])
+            nearest = np.minimum(nearest, np.where(np.isfinite(d), d, -1))
+            landmarks.append(int(np.argmax(nearest)))
+        self.landmarks = np.array(landmarks)
+        with np.errstate(invalid="ignore"):
+            self._from = dijkstra(self.graph, indices=self.landmarks)  # d(L, v)
+            self._to = dijkstra(self._reverse, indices=self.landmarks)  # d(v, L)
+        self._from[~np.isfinite(self._from)] = np.nan
+        self._to[~np.isfinite(self._to)] = np.nan
+        # Node-major copies: one contiguous row per heuristic evaluation
+        self._from_t = np.ascontiguousarray(self._from.T)
+        self._to_t = np.ascontiguousarray(self._to.T)
+
+    # ---------- snapping ----------
+    def snap(self, coords):
+        """Nearest node of each (lat, lon), or -1 when it is farther than max_snap_km."""
+        coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+        chord, nodes = self._tree.query(unit_vectors(coords[:, 0], coords[:, 1]))
+        km = 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chord / 2, 1.0))
+        return np.where(km <= self.max_snap_km, nodes, -1)
+
+    # ---------- point to point ----------
+    def _astar(self, source, target):
+        """(metres, node path) from source to target node, or (inf, []) when unreachable."""
+        if source == target:
+            return 0.0, [source]
+        from_t, to_t = self._from_t, self._to_t
+        target_from, target_to = from_t[target], to_t[target]
+
+        def bound(node):
+            # d(L,t) - d(L,v) <= d(v,t) and d(v,L) - d(t,L) <= d(v,t)
+            # (nan, from an unreachable landmark, gives no bound)
+            best = max(np.fmax.reduce(target_from - from_t[node]), np.fmax.reduce(to_t[node] - target_to))
+            return best if best > 0 else 0.0
+
+        indptr, indices, weights = self._indptr, self._indices, self._weights
+        dist = {source: 0.0}
+        parent = {source: -1}
+        heuristic = {}
+        done = set()
+        heap = [(bound(source), source)]
+        while heap:
+            _, node = heapq.heappop(heap)
+            if node in done:
+                continue
+            if node == target:
+                break
+            done.add(node)
+            base = dist[node]
+            for i in range(indptr[node], indptr[node + 1]):
+                nxt = indices[i]
+                d = base + weights[i]
+                if d < dist.get(nxt, np.inf):
+                    dist[nxt] = d
+                    parent[nxt] = node
+                    h = heuristic.get(nxt)
+                    if h is None:
+                        h = heuristic[nxt] = bound(nxt)
+                    heapq.heappush(heap, (d + h, nxt))
+        if target not in dist:
+            return np.inf, []
+        path = [target]
+        while parent[path[-1]] != -1:
+            path.append(parent[path[-1]])
+        return dist[target], path[::-1]
+
+    def route(self, start, end):
+        """
+        (road distance km, [(lat, lon), ...] through the snapped nodes) from
+        start to end, or (None, []) when a point is off the graph or unreachable.
+        """
+        source, target = self.snap([start, end]).tolist()
+        if source < 0 or target < 0:
+            return None, []
+        metres, path = self._astar(source, target)
+        if not path:
+            return None, []
+        return metres / 1000, list(zip(self.lat[path].tolist(), self.lon[path].tolist()))
+
+    # ---------- many to many ----------
+    def _upper_bound(self, sources, targets):
+        """
+        Metres no source -> target shortest path exceeds: the largest over
+        the pairs of min over landmarks of d(s, L) + d(L, t). inf when a pair
+        has no landmark reachable both ways.
+        """
+        if len(self.landmarks) == 0:
+            return np.inf
+        bound = np.full((len(sources), len(targets)), np.inf)
+        for k in range(len(self.landmarks)):
+            # fmin skips the nan of an unreachable landmark
+            np.fmin(bound, self._to_t[sources, k][:, None] + self._from_t[targets, k][None, :], out=bound)
+        return float(bound.max())
+
+    def matrix_km(self, origins, destinations):
+        """Road distance (km) from every origin to every destination; nan where off the graph or unreachable."""
+        src = self.snap(origins)
+        dst = self.snap(destinations)
+        km = np.full((len(src), len(dst)), np.nan)
+        sources = np.unique(src[src >= 0])
+        targets = np.unique(dst[dst >= 0])
+        if len(sources) == 0 or len(targets) == 0:
+            return km
+        rows = np.empty((len(sources), len(targets)))
+        chunk = max(1, MATRIX_CHUNK_BYTES // (8 * max(len(self), len(targets))))
+        for start in range(0, len(sources), chunk):
+            block = sources[start:start + chunk]
+            # The search stops past the farthest target (1 m of slack for rounding)
+            limit = self._upper_bound(block, targets) + 1.0
+            rows[start:start + chunk] = dijkstra(self.graph, indices=block, limit=limit)[:, targets] / 1000
+        rows[~np.isfinite(rows)] = np.nan
+        on_src, on_dst = src >= 0, dst >= 0
+        km[np.ix_(on_src, on_dst)] = rows[np.ix_(np.searchsorted(sources, src[on_src]),
+                                                 np.searchsorted(targets, dst[on_dst]))]
+        return km
+
+
+_routers = {}
+
+
+def get_road_router(path=None):
+    """Router of a graph file (config.json "road_graph_file", default the bundled sample), loaded once."""
+    if path is None:
+        from utils.db_utils import load_config
+        path = load_config().get("road_graph_file") or SAMPLE_GRAPH
+    if path not in _routers:
+        _routers[path] = RoadRouter.load(path)
+    return _routers[path]
+
+
+def get_route_local(start_lat, start_lon, end_lat, end_lon):
+    """
+    Same contract as the GraphHopper fetcher it replaces: the road polyline as
+    [(lat, lon), ...], or the straight line when the points can't be routed.
+    """
+    _, points = get_road_router().route((start_lat, start_lon), (end_lat, end_lon))
+    return points or [(start_lat, start_lon), (end_lat, end_lon)]
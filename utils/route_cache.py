@@ -0,0 +1,289 @@
+#Road geometry of route legs in one SQLite file, looked up by quantized coordinates
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.db_utils import DATA_DIR
+from utils.route_geometry import POINT_DTYPE, at_zoom, decode_route, encode_route, vertex_zooms
+
+ROUTE_CACHE_DB = os.path.join(DATA_DIR, "route_cache.db")
+# One pretty-printed JSON document the GraphHopper code used to keep; imported once on first use
+LEGACY_JSON = os.path.join(DATA_DIR, "route_cache.json")
+
+# 4 decimals (~11 m), the precision of the old "lat_lon_lat_lon" keys
+KEY_DECIMALS = 4
+
+
+def leg_key(start, end, decimals=KEY_DECIMALS):
+    """(start lat, start lon, end lat, end lon) as integers in units of 10^-decimals degrees."""
+    scale = 10 ** decimals
+    return tuple(int(round(float(v) * scale)) for v in (*start, *end))
+
+
+def _legacy_key(text, decimals=KEY_DECIMALS):
+    """'19.0760_72.8777_19.0550_72.8692' -> leg_key of those points."""
+    values = [float(v) for v in text.split("_")]
+    return leg_key(values[:2], values[2:], decimals)
+
+
+class RouteCache:
+    """
+    Leg polylines stored as float32 blobs (see utils.route_geometry) in an
+    indexed SQLite table, so opening the cache reads nothing and a lookup reads
+    one row. Each leg also stores the zoom level of every vertex
+    (route_geometry.vertex_zooms, computed once when the leg is added), so
+    get_many(zoom=z) returns the simplified line a map at zoom z needs.
+    Recently used legs also stay in memory (up to memory_bytes).
+    New legs and last-used times are written in batches: every flush_every
+    new legs, after flush_seconds, on flush() and at exit. When the stored
+    polylines pass max_bytes the least recently used legs are deleted.
+    """
+
+    def __init__(self, path=ROUTE_CACHE_DB, max_bytes=256 * 2**20, memory_bytes=16 * 2**20,
+                 flush_every=64, flush_seconds=5.0, legacy_json=LEGACY_JSON):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        self.legacy_json = legacy_json
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._con = None
+        self._lock = threading.RLock()
+        self._memory = OrderedDict()  # key -> (points, zooms)
+        self._memory_used = 0
+        self._pending = {}  # key -> (points, zooms) not yet written
+        self._zoomed = {}  # key -> zooms computed for a stored leg that had none
+        self._touched = {}  # key -> last used time not yet written
+        self._last_flush = time.monotonic()
+        atexit.register(self.close)
+
+    # ---------- storage ----------
+    def _connect(self):
+        if self._con is None:
+            new = not os.path.exists(self.path)
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._con = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._con.execute("PRAGMA journal_mode=WAL")
+            with self._con:
+                self._con.execute(
+                    "CREATE TABLE IF NOT EXISTS legs (a_lat INTEGER, a_lon INTEGER, b_lat INTEGER, b_lon INTEGER, "
+                    "n_points INTEGER, points BLOB, used REAL, PRIMARY KEY (a_lat, a_lon, b_lat, b_lon)) WITHOUT ROWID"
+                )
+                self._con.execute("CREATE INDEX IF NOT EXISTS legs_used ON legs (used)")
+                self._con.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value)")
+                if "zooms" not in [row[1] for row in self._con.execute("PRAGMA table_info(legs)")]:
+                    # Caches written before levels of detail: filled in as legs are read
+                    self._con.execute("ALTER TABLE legs ADD COLUMN zooms BLOB")
+                self._con.execute("INSERT OR IGNORE INTO meta VALUES ('bytes', 0)")
+            if new and self.legacy_json and os.path.exists(self.legacy_json):
+                self.migrate_json(self.legacy_json)
+        return self._con
+
+    def _remember(self, key, leg):
+        if key in self._memory:
+            self._memory_used -= sum(a.nbytes for a in self._memory.pop(key))
+        size = sum(a.nbytes for a in leg)
+        if size > self.memory_bytes:
+            return
+        self._memory[key] = leg
+        self._memory_used += size
+        while self._memory_used > self.memory_bytes:
+            _, dropped = self._memory.popitem(last=False)
+            self._memory_used -= sum(a.nbytes for a in dropped)
+
+    # ---------- lookups ----------
+    def get(self, start, end, zoom=None):
+        """(n, 2) float32 lat/lon points of the leg (only those drawn at zoom, if given), or None."""
+        return self.get_many([(start, end)], zoom)[0]
+
+    def get_many(self, legs, zoom=None, lod=False):
+        """
+        Points (or None) of every (start, end) leg, reading the ones not in
+        memory in one query: all of them, the ones drawn at zoom, or with
+        lod=True (points, vertex zooms) pairs.
+        """
+        keys = [leg_key(start, end) for start, end in legs]
+        found = {}
+        with self._lock:
+            now = time.time()
+            missing = []
+            for key in set(keys):
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+                elif key in self._pending:
+                    found[key] = self._pending[key]
+                else:
+                    missing.append(key)
+            con = self._connect()
+            for i in range(0, len(missing), 200):
+                chunk = missing[i:i + 200]
+                where = " OR ".join("(a_lat = ? AND a_lon = ? AND b_lat = ? AND b_lon = ?)" for _ in chunk)
+                rows = con.execute(f"SELECT a_lat, a_lon, b_lat, b_lon, points, zooms FROM legs WHERE {where}",
+                                   [v for key in chunk for v in key]).fetchall()
+                for a_lat, a_lon, b_lat, b_lon, blob, zooms in rows:
+                    key = (a_lat, a_lon, b_lat, b_lon)
+                    points = decode_route(blob)
+                    if zooms is None:
+                        zooms = self._zoomed[key] = vertex_zooms(points)
+                    else:
+                        zooms = np.frombuffer(zooms, dtype=np.uint8)
+                    found[key] = (points, zooms)
+                    self._remember(key, found[key])
+            for key in found:
+                self._touched[key] = now
+            self.hits += sum(key in found for key in keys)
+            self.misses += sum(key not in found for key in keys)
+            self._maybe_flush()
+        if lod:
+            return [found.get(key) for key in keys]
+        if zoom is None:
+            return [found[key][0] if key in found else None for key in keys]
+        return [at_zoom(*found[key], zoom) if key in found else None for key in keys]
+
+    def put(self, start, end, points, lod=False):
+        """Stores the leg; returns its float32 points (with lod=True, (points, vertex zooms))."""
+        points = np.ascontiguousarray(np.asarray(points, dtype=float).reshape(-1, 2), dtype=POINT_DTYPE)
+        leg = (points, vertex_zooms(points))
+        key = leg_key(start, end)
+        with self._lock:
+            self._pending[key] = leg
+            self._zoomed.pop(key, None)
+            self._remember(key, leg)
+            self._maybe_flush()
+        return leg if lod else points
+
+    def get_or_fetch(self, start, end, fetch):
+        """Cached points of the leg, else fetch(start, end) stored and returned."""
+        points = self.get(start, end)
+        if points is None:
+            points = self.put(start, end, fetch(start, end))
+        return points
+
+    # ---------- writes ----------
+    def _maybe_flush(self):
+        if len(self._pending) >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        """Writes buffered legs and last-used times in one transaction, then evicts past max_bytes."""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._pending and not self._touched and not self._zoomed:
+                return
+            con = self._connect()
+            now = time.time()
+            with con:
+                con.execute("BEGIN IMMEDIATE")
+                if self._pending:
+                    self._store(con, [(key, leg, self._touched.pop(key, now)) for key, leg in self._pending.items()])
+                if self._zoomed:
+                    con.executemany(
+                        "UPDATE legs SET zooms = ? WHERE a_lat = ? AND a_lon = ? AND b_lat = ? AND b_lon = ?",
+                        [(zooms.tobytes(), *key) for key, zooms in self._zoomed.items()],
+                    )
+                if self._touched:
+                    con.executemany(
+                        "UPDATE legs SET used = ? WHERE a_lat = ? AND a_lon = ? AND b_lat = ? AND b_lon = ?",
+                        [(used, *key) for key, used in self._touched.items()],
+                    )
+                self._evict(con)
+            self._pending.clear()
+            self._touched.clear()
+            self._zoomed.clear()
+
+    def _store(self, con, entries):
+        """entries: [(key, (points, zooms), used)]. Call inside a transaction."""
+        replaced = 0
+        keys = [key for key, _, _ in entries]
+        for i in range(0, len(keys), 200):
+            chunk = keys[i:i + 200]
+            where = " OR ".join("(a_lat = ? AND a_lon = ? AND b_lat = ? AND b_lon = ?)" for _ in chunk)
+            replaced += con.execute(f"SELECT COALESCE(SUM(length(points)), 0) FROM legs WHERE {where}",
+                                    [v for key in chunk for v in key]).fetchone()[0]
+        blobs = [(*key, len(points), encode_route(points), used, zooms.tobytes() if zooms is not None else None)
+                 for key, (points, zooms), used in entries]
+        con.executemany("INSERT OR REPLACE INTO legs (a_lat, a_lon, b_lat, b_lon, n_points, points, used, zooms) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", blobs)
+        added = sum(len(row[5]) for row in blobs)
+        con.execute("UPDATE meta SET value = value + ? WHERE name = 'bytes'", (added - replaced,))
+
+    def _evict(self, con):
+        """Deletes least recently used legs until the stored polylines fit in 90% of max_bytes."""
+        stored = con.execute("SELECT value FROM meta WHERE name = 'bytes'").fetchone()[0]
+        if stored <= self.max_bytes:
+            return
+        target = 0.9 * self.max_bytes
+        while stored > target:
+            rows = con.execute("SELECT a_lat, a_lon, b_lat, b_lon, length(points) FROM legs ORDER BY used LIMIT 256").fetchall()
+            if not rows:
+                break
+            con.executemany("DELETE FROM legs WHERE a_lat = ? AND a_lon = ? AND b_lat = ? AND b_lon = ?",
+                            [row[:4] for row in rows])
+            freed = sum(row[4] for row in rows)
+            stored -= freed
+            self.evictions += len(rows)
+            con.execute("UPDATE meta SET value = value - ? WHERE name = 'bytes'", (freed,))
+            for row in rows:
+                key = tuple(row[:4])
+                if key in self._memory:
+                    self._memory_used -= sum(a.nbytes for a in self._memory.pop(key))
+
+    def migrate_json(self, path):
+        """Imports a route_cache.json ({"lat_lon_lat_lon": [[lat, lon], ...]}); returns the number of legs."""
+        with open(path, "r") as f:
+            legacy = json.load(f)
+        now = time.time()
+        # Vertex zooms are left to the first read: importing stays one pass over the file
+        entries = [(_legacy_key(text), (np.asarray(points, dtype=float).reshape(-1, 2), None), now)
+                   for text, points in legacy.items()]
+        con = self._connect()
+        with self._lock, con:
+            con.execute("BEGIN IMMEDIATE")
+            self._store(con, entries)
+            self._evict(con)
+        print(f"[INFO] Imported {len(entries)} cached routes from {os.path.basename(path)}")
+        return len(entries)
+
+    def stats(self):
+        with self._lock:
+            con = self._connect()
+            legs, stored = con.execute(
+                "SELECT (SELECT COUNT(*) FROM legs), (SELECT value FROM meta WHERE name = 'bytes')"
+            ).fetchone()
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "legs": legs,
+                    "bytes": stored, "memory_bytes": self._memory_used, "pending": len(self._pending)}
+
+    def close(self):
+        with self._lock:
+            if self._con is not None:
+                self.flush()
+                self._con.close()
+                self._con = None
+
+
+_route_cache = None
+
+
+def get_route_cache():
+    """The process-wide cache, sized by config.json ("route_cache_mb", default 256)."""
+    global _route_cache
+    if _route_cache is None:
+        from utils.db_utils import load_config
+        _route_cache = RouteCache(max_bytes=int(load_config().get("route_cache_mb", 256)) * 2**20)
+    return _route_cache
+
+
+if __name__ == "__main__":
+    cache = RouteCache(legacy_json=None)
+    cache.migrate_json(LEGACY_JSON)
+    print(cache.stats())
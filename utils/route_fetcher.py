@@ -0,0 +1,307 @@
+#Live road geometry of many legs at once: asyncio over one pooled HTTP session, written through to the route cache
+import asyncio
+import os
+import random
+import time
+
+import aiohttp
+import numpy as np
+import polyline
+
+from utils.route_cache import get_route_cache, leg_key
+from utils.route_geometry import POINT_DTYPE, vertex_zooms
+
+GRAPHHOPPER_URL = "https://graphhopper.com/api/1/route"
+
+# Legs that came back as the straight line -> time.monotonic() until which they aren't asked for again
+_failed_legs = {}
+
+
+def _straight(start, end):
+    return np.array([start, end], dtype=POINT_DTYPE), np.zeros(2, dtype=np.uint8)
+
+
+class RouteFetcher:
+    """
+    Road polylines of route legs from a GraphHopper-style /route endpoint.
+    Cached legs are read from the route cache in one query; the rest go out
+    over one keep-alive session with at most `concurrency` requests in flight.
+    Legs with the same cache key share one request, also across concurrent
+    fetch_many() calls. A 429 pauses every request for the server's
+    Retry-After (else exponential backoff with jitter) and halves the number
+    allowed in flight, which then grows back by one per window of successes
+    (AIMD), so a rate-limited server isn't hit by the whole pool again at
+    once. 5xx and connection errors back off the same way. Fetched legs are
+    written to the cache; a leg that still fails comes back as the straight
+    line and is not cached, but is remembered in `failed` for `failed_ttl_s`
+    and drawn straight without a request until then. A 401/403 (no or a bad
+    API key) stops the fetcher sending anything more, and one warning per
+    fetch_many() sums up the failures. Legs are kept with
+    their vertex zooms (route_geometry.vertex_zooms) for maps that draw a
+    simplified line. After each fetch_many(), `warning` says how many legs
+    came back straight and why (None when all were routed), for the page.
+    """
+
+    def __init__(self, url=GRAPHHOPPER_URL, api_key=None, cache=None, concurrency=8, max_retries=5,
+                 backoff_s=0.5, max_backoff_s=30.0, timeout_s=30.0, vehicle="car", failed=None, failed_ttl_s=300.0):
+        self.url = url
+        self.api_key = api_key
+        self.cache = cache
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+        self.timeout_s = timeout_s
+        self.vehicle = vehicle
+        self.failed = {} if failed is None else failed
+        self.failed_ttl_s = failed_ttl_s
+        self.counts = {"legs": 0, "cached": 0, "coalesced": 0, "requests": 0, "throttled": 0, "retries": 0, "failed": 0,
+                       "skipped": 0}
+        self._rejected = None  # "status: message" of a 401/403; nothing more is sent after one
+        self._error = None  # last 4xx, for the warning
+        self.warning = None  # summary of the last fetch_many()'s straight-line legs
+        self._session = None
+        self._slots = None  # condition guarding _in_flight < _limit
+        self._in_flight = 0
+        self._limit = float(concurrency)
+        self._last_cut = -1.0  # loop time the limit was last halved
+        self._legs = {}  # leg key -> task fetching it
+        self._resume_at = 0.0  # loop time before which nothing is sent (after a 429)
+
+    # ---------- session ----------
+    async def _open(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector,
+                                                  timeout=aiohttp.ClientTimeout(total=self.timeout_s))
+            self._slots = asyncio.Condition()
+            self._in_flight = 0
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        await self._open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    # ---------- one leg ----------
+    def _params(self, start, end):
+        params = [("point", f"{start[0]},{start[1]}"), ("point", f"{end[0]},{end[1]}"),
+                  ("vehicle", self.vehicle), ("locale", "en"), ("calc_points", "true"), ("points_encoded", "true")]
+        if self.api_key:
+            params.append(("key", self.api_key))
+        return params
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), self.max_backoff_s)
+            except ValueError:
+                pass  # an HTTP date: use our own backoff
+        return min(self.backoff_s * 2 ** attempt, self.max_backoff_s) * random.uniform(0.5, 1.0)
+
+    async def _acquire(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            while (wait := self._resume_at - loop.time()) > 0:
+                await asyncio.sleep(wait)
+            async with self._slots:
+                await self._slots.wait_for(lambda: self._in_flight < int(self._limit))
+                if self._resume_at <= loop.time():
+                    self._in_flight += 1
+                    return
+
+    async def _release(self, sent, throttled):
+        async with self._slots:
+            self._in_flight -= 1
+            if throttled and sent > self._last_cut:
+                # One cut per burst of 429s: requests sent before the last cut don't count again
+                self._limit = max(1.0, self._limit / 2)
+                self._last_cut = asyncio.get_running_loop().time()
+            else:
+                self._limit = min(float(self.concurrency), self._limit + 1 / self._limit)
+            self._slots.notify_all()
+
+    async def _request(self, start, end):
+        """Decoded points of the leg, or None when the server has no route or keeps failing."""
+        session = await self._open()
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.max_retries + 1):
+            await self._acquire()
+            sent, throttled = loop.time(), False
+            try:
+                if self._rejected:
+                    return None
+                self.counts["requests"] += 1
+                try:
+                    async with session.get(self.url, params=self._params(start, end)) as response:
+                        if response.status == 429:
+                            self.counts["throttled"] += 1
+                            throttled = True
+                            delay = self._backoff(attempt, response.headers.get("Retry-After"))
+                            self._resume_at = max(self._resume_at, loop.time() + delay)
+                        elif response.status >= 500:
+                            delay = self._backoff(attempt)
+                        elif response.status >= 400:
+                            self._error = f"{response.status}: {(await response.text())[:200]}"
+                            if response.status in (401, 403):
+                                self._rejected = self._error
+                            return None
+                        else:
+                            paths = (await response.json(content_type=None)).get("paths")
+                            return np.asarray(polyline.decode(paths[0]["points"]), dtype=float) if paths else None
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, KeyError):
+                    delay = self._backoff(attempt)
+            finally:
+                await self._release(sent, throttled)
+            if attempt < self.max_retries:
+                self.counts["retries"] += 1
+                await asyncio.sleep(delay)
+        return None
+
+    async def _fetch_leg(self, key, start, end):
+        points = await self._request(start, end)
+        if points is None or len(points) < 2:
+            self.counts["failed"] += 1
+            self.failed[key] = time.monotonic() + self.failed_ttl_s
+            return _straight(start, end)
+        if self.cache is not None:
+            return self.cache.put(start, end, points, lod=True)
+        points = points.astype(POINT_DTYPE)
+        return points, vertex_zooms(points)
+
+    def _leg(self, key, start, end):
+        task = self._legs.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_leg(key, start, end))
+            self._legs[key] = task
+            task.add_done_callback(lambda _: self._legs.pop(key, None))
+        else:
+            self.counts["coalesced"] += 1
+        return task
+
+    # ---------- many legs ----------
+    async def fetch_many(self, legs, lod=False):
+        """(n, 2) float32 points of every (start, end) leg in order; with lod=True, (points, vertex zooms) pairs."""
+        legs = [((float(s[0]), float(s[1])), (float(e[0]), float(e[1]))) for s, e in legs]
+        keys = [leg_key(start, end) for start, end in legs]
+        self.counts["legs"] += len(legs)
+        self.warning = None
+        found = {}
+        if self.cache is not None:
+            for key, leg in zip(keys, self.cache.get_many(legs, lod=True)):
+                if leg is not None:
+                    found[key] = leg
+        self.counts["cached"] += sum(key in found for key in keys)
+
+        todo = {}
+        skipped = 0
+        now = time.monotonic()
+        for key, (start, end) in zip(keys, legs):
+            if key in found:
+                continue
+            if self.failed.get(key, 0.0) > now:
+                # Failed recently: straight line again rather than another request
+                found[key] = _straight(start, end)
+                skipped += 1
+            elif key in todo:
+                self.counts["coalesced"] += 1
+            else:
+                todo[key] = (start, end)
+        self.counts["skipped"] += skipped
+        failed = self.counts["failed"]
+        if todo:
+            await self._open()
+            fetched = await asyncio.gather(*(self._leg(key, start, end) for key, (start, end) in todo.items()))
+            found.update(zip(todo, fetched))
+        failed = self.counts["failed"] - failed
+        if failed or skipped:
+            parts = []
+            if failed:
+                reason = self._rejected or self._error
+                parts.append(f"{failed} failed" + (f" (last {reason})" if reason else ""))
+            if skipped:
+                parts.append(f"{skipped} failed in the last {self.failed_ttl_s:.0f} s and were not asked for again")
+            self.warning = f"{failed + skipped} of {len(legs)} route legs drawn as straight lines: {'; '.join(parts)}"
+            if failed:
+                # Server log; the page shows the warning itself
+                print(f"[WARN] {self.warning}")
+        return [found[key] if lod else found[key][0] for key in keys]
+
+    def fetch_all(self, legs, lod=False):
+        """fetch_many() from synchronous code (e.g. a Streamlit script), in its own event loop."""
+        async def run():
+            try:
+                return await self.fetch_many(legs, lod)
+            finally:
+                await self.close()
+        return asyncio.run(run())
+
+    def stats(self):
+        return dict(self.counts)
+
+
+def _api_key(config):
+    return config.get("graphhopper_api_key") or os.environ.get("GRAPHHOPPER_API_KEY")
+
+
+def road_routes_configured(config=None):
+    """True with an API key, or a "graphhopper_url" other than the keyed GraphHopper API (a self-hosted server)."""
+    if config is None:
+        from utils.db_utils import load_config
+        config = load_config()
+    return bool(_api_key(config)) or config.get("graphhopper_url", GRAPHHOPPER_URL) != GRAPHHOPPER_URL
+
+
+def get_route_fetcher():
+    """
+    Fetcher for config.json "graphhopper_url" (default the GraphHopper API),
+    "graphhopper_api_key" (or the GRAPHHOPPER_API_KEY environment variable),
+    "route_fetch_concurrency" (default 8) and "route_retry_after_s" (how long
+    a failed leg is drawn straight before it is asked for again, default 300),
+    using the shared route cache and failed legs.
+    """
+    from utils.db_utils import load_config
+    config = load_config()
+    return RouteFetcher(
+        url=config.get("graphhopper_url", GRAPHHOPPER_URL),
+        api_key=_api_key(config),
+        cache=get_route_cache(),
+        concurrency=int(config.get("route_fetch_concurrency", 8)),
+        failed=_failed_legs,
+        failed_ttl_s=float(config.get("route_retry_after_s", 300)),
+    )
+
+
+def fetch_road_routes(routes, fetcher=None):
+    """
+    {truck_id: (n, 2) stop points} -> ({truck_id: (road polyline through
+    those stops, vertex zooms)}, warning), every leg of every truck fetched
+    in one batch. warning is the fetcher's summary of the legs drawn as
+    straight lines, or None. route_geometry.at_zoom() picks the vertices a
+    map zoom needs.
+    """
+    fetcher = fetcher or get_route_fetcher()
+    legs, owners = [], []
+    for truck_id, stops in routes.items():
+        stops = np.asarray(stops, dtype=float).reshape(-1, 2)
+        legs += list(zip(stops[:-1].tolist(), stops[1:].tolist()))
+        owners += [truck_id] * (len(stops) - 1)
+    pieces = {truck_id: [] for truck_id in routes}
+    for truck_id, (points, zooms) in zip(owners, fetcher.fetch_all(legs, lod=True)):
+        # Each leg starts where the previous one ended: drop the repeated point
+        pieces[truck_id].append((points[1:], zooms[1:]) if pieces[truck_id] else (points, zooms))
+    road_routes = {}
+    for truck_id, parts in pieces.items():
+        if parts:
+            road_routes[truck_id] = (np.concatenate([p for p, _ in parts]), np.concatenate([z for _, z in parts]))
+        else:
+            stops = np.asarray(routes[truck_id], dtype=POINT_DTYPE).reshape(-1, 2)
+            road_routes[truck_id] = (stops, np.zeros(len(stops), dtype=np.uint8))
+    return road_routes, fetcher.warning
@@ -0,0 +1,135 @@
+#Per-truck route geometry stored as packed float32 (lat, lon) pairs, keyed by truck_id
+import re
+
+import numpy as np
+import pandas as pd
+
+# Little-endian float32: ~0.1 m resolution at Indian latitudes, 8 bytes per point
+POINT_DTYPE = np.dtype('<f4')
+
+# Numbers in the old "[(np.float64(19.076), np.float64(72.8777)), ...]" strings
+_NUMBER = re.compile(r'(?<![\w.])[-+]?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?')
+
+
+def encode_route(coords):
+    """(n, 2) lat/lon points -> bytes."""
+    return np.ascontiguousarray(np.asarray(coords, dtype=float).reshape(-1, 2), dtype=POINT_DTYPE).tobytes()
+
+
+def decode_route(blob):
+    """bytes -> read-only (n, 2) float32 array, without copying."""
+    return np.frombuffer(blob, dtype=POINT_DTYPE).reshape(-1, 2)
+
+
+def parse_route_repr(text):
+    """Points of a legacy repr string (parsed with a regex, never eval)."""
+    if not isinstance(text, str):
+        return np.empty((0, 2), dtype=POINT_DTYPE)
+    numbers = np.array(_NUMBER.findall(text), dtype=float)
+    return numbers[:len(numbers) // 2 * 2].reshape(-1, 2).astype(POINT_DTYPE)
+
+
+def route_table(truck_ids, coords, offsets, **columns):
+    """
+    One row per truck: truck_id, n_points, route (encoded points) plus any extra
+    columns. Truck r's points are coords[offsets[r]:offsets[r + 1]].
+    """
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2).astype(POINT_DTYPE)
+    offsets = np.asarray(offsets, dtype=np.intp)
+    table = pd.DataFrame({'truck_id': list(truck_ids), **columns})
+    table['n_points'] = np.diff(offsets)
+    table['route'] = [coords[a:b].tobytes() for a, b in zip(offsets[:-1], offsets[1:])]
+    return table
+
+
+def decode_routes(table):
+    """{truck_id: (n, 2) float32 points} of a route table."""
+    if table is None or table.empty:
+        return {}
+    return {truck_id: decode_route(blob) for truck_id, blob in zip(table['truck_id'], table['route'])}
+
+
+# ---------- level of detail ----------
+# Zoom levels as in web maps: a 256 px world at zoom 0, twice as wide per level
+MAX_ZOOM = 18
+HIDDEN = 255  # zoom of a vertex no level needs (closer to the line than MAX_ZOOM can show)
+METRES_PER_PIXEL_Z0 = 156543.03392
+
+
+def metres_per_pixel(zoom, lat):
+    return METRES_PER_PIXEL_Z0 * np.cos(np.radians(lat)) / 2.0 ** zoom
+
+
+def vertex_zooms(coords):
+    """
+    Lowest zoom at which each vertex of a polyline is drawn (uint8; endpoints
+    0, HIDDEN for vertices no zoom needs). Douglas-Peucker splits the line at
+    its farthest vertex; a vertex's deviation (capped by its parent's, so the
+    levels nest) must exceed half a pixel at that zoom. Keeping the vertices
+    with zoom <= z is Douglas-Peucker at half a pixel of zoom z.
+    """
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    n = len(coords)
+    zooms = np.full(n, HIDDEN, dtype=np.uint8)
+    if n == 0:
+        return zooms
+    zooms[[0, -1]] = 0
+    if n < 3:
+        return zooms
+
+    # Local flat projection in metres: fine for the few hundred km of one leg
+    lat0 = float(np.mean(coords[:, 0]))
+    xy = np.column_stack((np.radians(coords[:, 1]) * np.cos(np.radians(lat0)), np.radians(coords[:, 0]))) * 6371000.0
+    finest = metres_per_pixel(MAX_ZOOM, lat0) / 2
+    significance = np.zeros(n)
+    # Every open segment of one recursion depth is split in one vectorised pass
+    first, last, cap = np.array([0]), np.array([n - 1]), np.array([np.inf])
+    while len(first):
+        counts = last - first - 1
+        open_ = counts > 0
+        first, last, cap, counts = first[open_], last[open_], cap[open_], counts[open_]
+        if not len(first):
+            break
+        owner = np.repeat(np.arange(len(first)), counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        inner = np.arange(len(owner)) - starts[owner] + first[owner] + 1
+        a, b = xy[first][owner], xy[last][owner]
+        direction = b - a
+        length = np.hypot(direction[:, 0], direction[:, 1])
+        offset = xy[inner] - a
+        cross = np.abs(offset[:, 0] * direction[:, 1] - offset[:, 1] * direction[:, 0])
+        dist = np.where(length > 0, cross / np.where(length > 0, length, 1), np.hypot(offset[:, 0], offset[:, 1]))
+        farthest = np.maximum.reduceat(dist, starts)
+        # First vertex reaching its segment's maximum (what np.argmax would pick)
+        hits = np.flatnonzero(dist == farthest[owner])
+        hits = hits[np.concatenate(([True], owner[hits][1:] != owner[hits][:-1]))]
+        split = inner[hits]
+        deviation = np.minimum(farthest, cap)
+        keep = deviation > finest
+        split, deviation = split[keep], deviation[keep]
+        significance[split] = deviation
+        first, last, cap = (np.concatenate((first[keep], split)), np.concatenate((split, last[keep])),
+                            np.concatenate((deviation, deviation)))
+
+    kept = significance > 0
+    # Smallest z with metres_per_pixel(z) / 2 < significance
+    needed = np.ceil(np.log2(METRES_PER_PIXEL_Z0 * np.cos(np.radians(lat0)) / (2 * significance[kept])) + 1e-9)
+    zooms[kept] = np.clip(needed, 0, MAX_ZOOM).astype(np.uint8)
+    zooms[[0, -1]] = 0
+    return zooms
+
+
+def at_zoom(coords, zooms, zoom):
+    """The vertices drawn at a zoom level."""
+    return np.asarray(coords)[np.asarray(zooms) <= zoom]
+
+
+def fit_zoom(coords, width_px=900, height_px=600):
+    """Highest zoom at which every point fits a map of the given size."""
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    if len(coords) == 0:
+        return 0
+    lat_span = np.ptp(np.log(np.tan(np.pi / 4 + np.radians(coords[:, 0]) / 2))) / (2 * np.pi)  # mercator, in worlds
+    lon_span = np.ptp(coords[:, 1]) / 360
+    worlds = max(lat_span * 256 / height_px, lon_span * 256 / width_px, 1e-9)
+    return int(np.clip(np.floor(np.log2(1 / worlds)), 0, MAX_ZOOM))
@@ -0,0 +1,121 @@
+#2-opt / Or-opt local search on top of the nearest neighbor routes
+import time
+
+import numpy as np
+
+# Candidate moves are only tried towards this many nearest nodes
+NEIGHBOR_LIST_SIZE = 8
+# Longest chain of stops Or-opt moves in one go
+OR_OPT_MAX_SEGMENT = 3
+# Ignore gains smaller than this (km) so float noise cannot loop forever
+MIN_GAIN = 1e-9
+# Candidate moves evaluated per route before the search stops: its budget, the same on every machine
+MAX_CHECKS = 50_000
+
+
+def path_length(D, route, closed=True):
+    route = np.asarray(route, dtype=np.intp)
+    total = D[route[:-1], route[1:]].sum(dtype=np.float64)
+    if closed and len(route) > 1:
+        total += D[route[-1], route[0]]
+    return float(total)
+
+
+def neighbor_lists(D, neighbors=NEIGHBOR_LIST_SIZE):
+    """The `neighbors` closest nodes of every node (itself included), closest first."""
+    k = min(neighbors + 1, len(D))
+    if k < len(D):
+        idx = np.argpartition(D, k - 1, axis=1)[:, :k]
+    else:
+        idx = np.broadcast_to(np.arange(len(D)), D.shape)
+    order = np.argsort(np.take_along_axis(D, idx, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(idx, order, axis=1).tolist()
+
+
+def improve_route(D, route, closed=True, time_budget_ms=1000, neighbors=NEIGHBOR_LIST_SIZE, max_checks=MAX_CHECKS):
+    """
+    Improves a route with 2-opt and Or-opt moves until no move helps or
+    max_checks candidate moves were evaluated, so the same route always gives
+    the same result whatever the machine's load. time_budget_ms is only a
+    safety cap; a search it cuts short is not reproducible.
+    Inputs: D (m, m) distance matrix, route as node ids into D with route[0] the
+            depot (kept in place), closed=True if the route returns to the depot
+    Output: (improved route, km saved)
+    """
+    path = [int(node) for node in route]
+    if closed:
+        path.append(path[0])  # fixed end point
+    n = len(path)
+    # Positions that may move: the depot (and the return to it) stay put
+    last = n - 2 if closed else n - 1
+    if last < 2:
+        return path[:n - 1] if closed else path, 0.0
+
+    D = np.asarray(D)
+    nbrs = neighbor_lists(D, neighbors)
+    item = D.item
+    deadline = time.perf_counter() + time_budget_ms / 1000
+    checks = 0
+    before = path_length(D, path, closed=False)
+
+    def d(a, b):
+        return item(a, b) if a is not None and b is not None else 0.0
+
+    improved = True
+    while improved and checks < max_checks and time.perf_counter() < deadline:
+        improved = False
+        pos = {node: i for i, node in enumerate(path[:last + 1])}
+
+        # 2-opt: reverse path[i + 1 .. j], replacing edges (a, b), (c, e) by (a, c), (b, e)
+        for i in range(0, last):
+            a, b = path[i], path[i + 1]
+            for c in nbrs[a]:
+                j = pos.get(c)
+                if j is None or j <= i + 1:
+                    continue
+                checks += 1
+                e = path[j + 1] if j + 1 < n else None
+                gain = d(a, b) + d(c, e) - d(a, c) - d(b, e)
+                if gain > MIN_GAIN:
+                    path[i + 1:j + 1] = path[i + 1:j + 1][::-1]
+                    improved = True
+                    break
+            if improved or checks >= max_checks or time.perf_counter() >= deadline:
+                break
+        if improved or checks >= max_checks:
+            continue
+
+        # Or-opt: move a chain of 1-3 stops (optionally reversed) next to a neighbour
+        for length in range(1, OR_OPT_MAX_SEGMENT + 1):
+            for i in range(1, last - length + 2):
+                seg = path[i:i + length]
+                prev, nxt = path[i - 1], (path[i + length] if i + length < n else None)
+                removed = d(prev, seg[0]) + d(seg[-1], nxt) - d(prev, nxt)
+                for head in (seg[0], seg[-1]):
+                    for c in nbrs[head]:
+                        q = pos.get(c)
+                        # insert between path[q] and path[q + 1] (or after the open end)
+                        if q is None or i - 1 <= q <= i + length - 1:
+                            continue
+                        y = path[q + 1] if q + 1 < n else None
+                        checks += 1
+                        for chain in (seg, seg[::-1]):
+                            added = d(c, chain[0]) + d(chain[-1], y) - d(c, y)
+                            if removed - added > MIN_GAIN:
+                                if q < i:
+                                    path = path[:q + 1] + chain + path[q + 1:i] + path[i + length:]
+                                else:
+                                    path = path[:i] + path[i + length:q + 1] + chain + path[q + 1:]
+                                improved = True
+                                break
+                        if improved:
+                            break
+                    if improved:
+                        break
+                if improved or checks >= max_checks or time.perf_counter() >= deadline:
+                    break
+            if improved or checks >= max_checks or time.perf_counter() >= deadline:
+                break
+
+    saved = before - path_length(D, path, closed=False)
+    return (path[:-1] if closed else path), saved
@@ -1,5 +1,6 @@
 #For Point to Point connections
 import numpy as np
+from scipy.spatial import cKDTree
 
 # Fast Haversine Function
 def haversine_np(lat1, lon1, lat2, lon2):
@@ -10,36 +11,194 @@ def haversine_np(lat1, lon1, lat2, lon2):
     a = np.sin(dlat/2)**2 + np.cos(lat1)*np.cos(lat2)*np.sin(dlon/2)**2
     return 2 * R * np.arcsin(np.sqrt(a))
 
-# Enhanced Nearest Neighbor Route Optimizer using Haversine
+# Points on the unit sphere: chord length grows with great-circle distance,
+# so nearest by chord == nearest by haversine
+def unit_vectors(lat, lon):
+    lat, lon = np.radians(lat), np.radians(lon)
+    cos_lat = np.cos(lat)
+    return np.stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)), axis=-1)
 
-def nearest_neighbor_route(customer_coords, start_coord):
+# WGS-84 ellipsoid (what geopy's geodesic uses by default)
+WGS84_A = 6378.137  # km
+WGS84_F = 1 / 298.257223563
+
+# Vectorised Vincenty inverse formula on WGS-84, distances in km.
+# Agrees with geopy's geodesic to well under a millimetre; the rare pairs that do
+# not converge (nearly antipodal) are handed to geopy.
+def vincenty_np(lat1, lon1, lat2, lon2, max_iter=200, tol=1e-12):
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(*[np.asarray(x, dtype=float) for x in (lat1, lon1, lat2, lon2)])
+    a, f = WGS84_A, WGS84_F
+    b = (1 - f) * a
+
+    U1 = np.arctan((1 - f) * np.tan(np.radians(lat1)))
+    U2 = np.arctan((1 - f) * np.tan(np.radians(lat2)))
+    L = np.radians(lon2 - lon1)
+    sinU1, cosU1, sinU2, cosU2 = np.sin(U1), np.cos(U1), np.sin(U2), np.cos(U2)
+
+    lam = L.copy()
+    active = np.ones(L.shape, dtype=bool)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for _ in range(max_iter):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.hypot(cosU2 * sin_lam, cosU1 * sinU2 - sinU1 * cosU2 * cos_lam)
+            cos_sigma = sinU1 * sinU2 + cosU1 * cosU2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            sin_alpha = np.where(sin_sigma == 0, 0.0, cosU1 * cosU2 * sin_lam / sin_sigma)
+            cos2_alpha = 1 - sin_alpha ** 2
+            cos_2sm = np.where(cos2_alpha == 0, 0.0, cos_sigma - 2 * sinU1 * sinU2 / cos2_alpha)
+            C = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+            lam_new = L + (1 - C) * f * sin_alpha * (
+                sigma + C * sin_sigma * (cos_2sm + C * cos_sigma * (-1 + 2 * cos_2sm ** 2)))
+            active = np.abs(lam_new - lam) > tol
+            lam = lam_new
+            if not active.any():
+                break
+
+        u2 = cos2_alpha * (a ** 2 - b ** 2) / b ** 2
+        A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+        B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+        delta_sigma = B * sin_sigma * (cos_2sm + B / 4 * (
+            cos_sigma * (-1 + 2 * cos_2sm ** 2) - B / 6 * cos_2sm * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sm ** 2)))
+        dist = b * A * (sigma - delta_sigma)
+
+    stuck = np.flatnonzero((active | ~np.isfinite(dist)).ravel())
+    if stuck.size:
+        from geopy.distance import geodesic
+        flat = dist.reshape(-1)
+        pts = np.stack([x.ravel() for x in (lat1, lon1, lat2, lon2)], axis=1)
+        for i in stuck:
+            flat[i] = geodesic(pts[i, :2], pts[i, 2:]).km
+    return dist
+
+# Flatten a list of routes into one (N, 2) coordinate array plus offsets,
+# route r being coords[offsets[r]:offsets[r + 1]]
+def pack_routes(routes):
+    lengths = [len(route) for route in routes]
+    offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.intp)
+    coords = np.asarray([pt for route in routes for pt in route], dtype=float).reshape(-1, 2)
+    return coords, offsets
+
+# Consecutive point pairs (i, i + 1) that belong to the same route, and their route
+def route_legs(offsets):
+    offsets = np.asarray(offsets, dtype=np.intp)
+    route_of_point = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    a = np.flatnonzero(route_of_point[:-1] == route_of_point[1:])
+    return a, a + 1, route_of_point[a]
+
+def route_lengths_km(coords, offsets, mode="haversine"):
+    """
+    Lengths of many routes in a single NumPy pass.
+    Inputs: coords (N, 2) lat/lon of every route back to back, offsets (R + 1,)
+            start of each route in coords (see pack_routes)
+    mode:   "haversine"   - spherical earth, fast (within ~0.5% of geodesic)
+            "ellipsoidal" - WGS-84 Vincenty, slower, matches geopy geodesic
+    Output: (R,) route lengths in km
+    """
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    a, b, route = route_legs(offsets)
+    if mode == "haversine":
+        legs = haversine_np(coords[a, 0], coords[a, 1], coords[b, 0], coords[b, 1])
+    elif mode == "ellipsoidal":
+        legs = vincenty_np(coords[a, 0], coords[a, 1], coords[b, 0], coords[b, 1])
+    else:
+        raise ValueError(f"Unknown distance mode: {mode}")
+    return np.bincount(route, weights=legs, minlength=len(offsets) - 1)
+
+# Enhanced Nearest Neighbor Route Optimizer using a KD-tree
+
+# Neighbours precomputed per stop before falling back to a tree query
+NEIGHBOR_LIST_SIZE = 16
+# Chord lengths closer than this count as a tie (a few micrometres on the earth's
+# surface); ties are settled with haversine like the original argmin loop
+TIE_TOLERANCE = 1e-12
+
+def _first_free(dist, idx, visited, coords, origin):
+    """Closest unvisited index in a distance-sorted candidate list, or None."""
+    for p, j in enumerate(idx):
+        if not visited[j]:
+            tied = [j]
+            for q in range(p + 1, len(idx)):
+                if dist[q] - dist[p] > TIE_TOLERANCE:
+                    break
+                if not visited[idx[q]]:
+                    tied.append(idx[q])
+            if len(tied) == 1:
+                return j
+            tied = np.sort(tied)
+            return tied[np.argmin(haversine_np(origin[0], origin[1], coords[tied, 0], coords[tied, 1]))]
+    return None
+
+def nearest_neighbor_order(customer_coords, start_coord, xyz=None):
+    """
+    Nearest neighbor visiting order as indices into customer_coords.
+    Each stop keeps a short list of its nearest stops; only when all of them are
+    visited is the KD-tree queried. Visited stops are masked instead of deleted and
+    the tree is rebuilt over the unvisited ones once half of it is visited, so every
+    step stays ~O(log n). Pass xyz to reuse unit vectors already computed for
+    customer_coords (e.g. DistanceMatrix.xyz).
+    """
+    coords = np.asarray(customer_coords, dtype=float).reshape(-1, 2)
+    n = len(coords)
+    order = np.empty(n, dtype=np.intp)
+    if n == 0:
+        return order
+
+    if xyz is None:
+        xyz = unit_vectors(coords[:, 0], coords[:, 1])
+    visited = bytearray(n)
+    tree = cKDTree(xyz)
+    live = np.arange(n)
+    live_tree = tree
+
+    k = min(NEIGHBOR_LIST_SIZE + 1, n)
+    nbr_dist, nbr_idx = tree.query(xyz, k=k)
+    nbr_dist = nbr_dist.reshape(n, -1).tolist()
+    nbr_idx = nbr_idx.reshape(n, -1).tolist()
+
+    origin = (float(start_coord[0]), float(start_coord[1]))
+    current = unit_vectors(*origin)
+    nearest = None
+    for step in range(n):
+        if nearest is not None:
+            nearest = _first_free(nbr_dist[nearest], nbr_idx[nearest], visited, coords, origin)
+
+        if nearest is None:
+            if 2 * (n - step) < len(live):
+                live = live[np.frombuffer(visited, dtype=np.uint8)[live] == 0]
+                live_tree = cKDTree(xyz[live])
+            q = min(NEIGHBOR_LIST_SIZE, len(live))
+            while nearest is None:
+                dist, idx = live_tree.query(current, k=q)
+                nearest = _first_free(np.atleast_1d(dist).tolist(), live[np.atleast_1d(idx)].tolist(), visited, coords, origin)
+                q = min(2 * q, len(live))
+
+        visited[nearest] = 1
+        order[step] = nearest
+        origin = coords[nearest]
+        current = xyz[nearest]
+
+    return order
+
+def route_positions(order):
+    """1-based stop number of every customer, given a visiting order of customer indices."""
+    order = np.asarray(order, dtype=np.intp)
+    positions = np.empty(len(order), dtype=np.int64)
+    positions[order] = np.arange(1, len(order) + 1)
+    return positions
+
+def nearest_neighbor_route(customer_coords, start_coord, xyz=None):
     """
     Approximate TSP using nearest neighbor heuristic.
     Inputs: list of (lat, lon), starting point (lat, lon)
     Output: ordered list of coordinates (route including start)
     """
-    if not customer_coords:
+    if len(customer_coords) == 0:
         return [start_coord]
 
-    coords = np.array(customer_coords)
-    visited = [start_coord]
-    current = np.array(start_coord)
-    remaining = coords.copy()
+    coords = np.asarray(customer_coords, dtype=float).reshape(-1, 2)
+    order = nearest_neighbor_order(coords, start_coord, xyz)
+    return [start_coord] + [tuple(coord) for coord in coords[order]]
 
-    while len(remaining) > 0:
-        lat1, lon1 = current[0], current[1]
-        lat2, lon2 = remaining[:, 0], remaining[:, 1]
-        distances = haversine_np(lat1, lon1, lat2, lon2)
-        nearest_idx = np.argmin(distances)
-        nearest_coord = remaining[nearest_idx]
-        visited.append(tuple(nearest_coord))
-        remaining = np.delete(remaining, nearest_idx, axis=0)
-        current = nearest_coord
-
-    return visited
-
-<<<<<<< HEAD
-=======
 
 # # -------------------------------------LIVE ROUTE-------------------------------------------#
 # #rout_uils.py
@@ -113,9 +272,3 @@ def nearest_neighbor_route(customer_coords, start_coord):
 #     except Exception as e:
 #         st.warning(f"⚠️ Failed to fetch route: {e}")
 #         return [(start_lat, start_lon), (end_lat, end_lon)]
-
-
-
-
-
->>>>>>> df81800 (Enhanced delivery map with GraphHopper for optimized truck routing.)
@@ -0,0 +1,429 @@
+#Distances from many origins to many destinations in one call: haversine, the local road router or a routing server
+import atexit
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import URLError
+from urllib.request import Request, urlopen
+
+import numpy as np
+
+from utils.db_utils import DATA_DIR
+from utils.route_cache import KEY_DECIMALS
+from utils.route_utils import haversine_np
+
+# Road distances already asked for, kept across runs and days (customers rarely move)
+DISTANCE_MEMO_DB = os.path.join(DATA_DIR, "road_distances.db")
+DEFAULT_ROUTING_URL = "http://127.0.0.1:8765"
+BACKENDS = ("haversine", "road", "http")
+
+
+def _points(coords):
+    return np.asarray(coords, dtype=float).reshape(-1, 2)
+
+
+def haversine_matrix(origins, destinations):
+    origins, destinations = _points(origins), _points(destinations)
+    return haversine_np(origins[:, 0][:, None], origins[:, 1][:, None],
+                        destinations[None, :, 0], destinations[None, :, 1])
+
+
+def fill_straight(km, origins, destinations):
+    """km with its nan pairs replaced by the great-circle distance."""
+    i, j = np.nonzero(np.isnan(km))
+    if len(i):
+        km[i, j] = haversine_np(origins[i, 0], origins[i, 1], destinations[j, 0], destinations[j, 1])
+    return km
+
+
+def fill_pairs(km, a, b):
+    """km[i] (a[i] -> b[i]) with its nan entries replaced by the great-circle distance."""
+    i = np.flatnonzero(np.isnan(km))
+    if len(i):
+        km[i] = haversine_np(a[i, 0], a[i, 1], b[i, 0], b[i, 1])
+    return km
+
+
+class RoutingBackend:
+    """
+    Distances (km) from every origin to every destination, asked for in one
+    matrix() call instead of one request per pair. Subclasses implement
+    _routed() on distinct points (nan where they have no distance);
+    repeated points are removed before it runs. matrix() fills the pairs
+    left unroutable with the straight line, like the route fetcher.
+    """
+
+    name = "base"
+    symmetric = False  # d(a, b) == d(b, a): callers may fill half a matrix
+
+    def _routed(self, origins, destinations):
+        raise NotImplementedError
+
+    def routed(self, origins, destinations):
+        """(len(origins), len(destinations)) km, nan where the backend has no route."""
+        origins, destinations = _points(origins), _points(destinations)
+        if len(origins) == 0 or len(destinations) == 0:
+            return np.zeros((len(origins), len(destinations)))
+        unique_o, inverse_o = np.unique(origins, axis=0, return_inverse=True)
+        unique_d, inverse_d = np.unique(destinations, axis=0, return_inverse=True)
+        km = self._routed(unique_o, unique_d)
+        return km[np.ix_(inverse_o.ravel(), inverse_d.ravel())]
+
+    def matrix(self, origins, destinations):
+        """(len(origins), len(destinations)) km."""
+        origins, destinations = _points(origins), _points(destinations)
+        return fill_straight(self.routed(origins, destinations), origins, destinations)
+
+    def routed_pairs(self, a, b, chunk=256):
+        """km from a[i] to b[i] (nan where no route), through routed() calls of up to chunk distinct origins."""
+        a, b = _points(a), _points(b)
+        km = np.empty(len(a))
+        unique_a, inverse_a = np.unique(a, axis=0, return_inverse=True)
+        inverse_a = inverse_a.ravel()
+        for start in range(0, len(unique_a), chunk):
+            rows = np.flatnonzero((inverse_a >= start) & (inverse_a < start + chunk))
+            unique_b, inverse_b = np.unique(b[rows], axis=0, return_inverse=True)
+            block = self.routed(unique_a[start:start + chunk], unique_b)
+            km[rows] = block[inverse_a[rows] - start, inverse_b.ravel()]
+        return km
+
+    def pairs(self, a, b, chunk=256):
+        """km from a[i] to b[i]."""
+        a, b = _points(a), _points(b)
+        return fill_pairs(self.routed_pairs(a, b, chunk), a, b)
+
+    def stats(self):
+        return {"backend": self.name}
+
+
+class HaversineBackend(RoutingBackend):
+    """Great-circle distance: no road network, no lookups, nothing to memoize."""
+
+    name = "haversine"
+    symmetric = True
+
+    def routed(self, origins, destinations):
+        return haversine_matrix(origins, destinations)
+
+    def matrix(self, origins, destinations):
+        return haversine_matrix(origins, destinations)
+
+    def pairs(self, a, b, chunk=None):
+        a, b = _points(a), _points(b)
+        return haversine_np(a[:, 0], a[:, 1], b[:, 0], b[:, 1])
+
+
+class RoadBackend(RoutingBackend):
+    """Shortest road distance on the offline graph (see utils.road_router), one Dijkstra per origin."""
+
+    def __init__(self, path=None):
+        from utils.road_router import SAMPLE_GRAPH
+        if path is None:
+            from utils.db_utils import load_config
+            path = load_config().get("road_graph_file") or SAMPLE_GRAPH
+        self.path = path
+        # A rebuilt graph file gets a new name, so its memoized distances start afresh
+        self.name = f"road:{os.path.basename(path)}:{os.stat(path).st_mtime_ns}"
+
+    def _routed(self, origins, destinations):
+        from utils.road_router import get_road_router
+        return get_road_router(self.path).matrix_km(origins, destinations)  # nan off the graph
+
+
+class HTTPBackend(RoutingBackend):
+    """
+    A routing server's matrix endpoint: POST {url}/matrix with
+    {"origins": [[lat, lon], ...], "destinations": [...]}, answered with
+    {"km": [[...], ...]} (null where unroutable). Large matrices are split
+    into requests of at most max_elements pairs. A server that can't be
+    reached or answers nonsense leaves the rest of the call nan (one warning),
+    so the caller gets straight lines instead of an exception. serve() is a
+    local stand-in.
+    """
+
+    def __init__(self, url=DEFAULT_ROUTING_URL, max_elements=10_000, timeout=60):
+        self.url = url.rstrip("/")
+        self.max_elements = max_elements
+        self.timeout = timeout
+        self.name = f"http:{self.url}"
+        self.requests = 0
+        self.failed = 0
+
+    def _request(self, origins, destinations):
+        body = json.dumps({"origins": origins.tolist(), "destinations": destinations.tolist()}).encode()
+        request = Request(f"{self.url}/matrix", data=body, headers={"Content-Type": "application/json"})
+        self.requests += 1
+        with urlopen(request, timeout=self.timeout) as response:
+            km = json.loads(response.read())["km"]
+        return np.array(km, dtype=float).reshape(len(origins), len(destinations))  # null -> nan
+
+    def _routed(self, origins, destinations):
+        km = np.full((len(origins), len(destinations)), np.nan)
+        cols = max(1, min(len(destinations), self.max_elements))
+        rows = max(1, self.max_elements // cols)
+        for i in range(0, len(origins), rows):
+            for j in range(0, len(destinations), cols):
+                try:
+                    km[i:i + rows, j:j + cols] = self._request(origins[i:i + rows], destinations[j:j + cols])
+                except (URLError, OSError, ValueError, KeyError, TypeError) as e:
+                    # Unreachable, timed out or a malformed answer: the rest would most likely fail the same way
+                    self.failed += 1
+                    print(f"[WARN] Routing server {self.url} failed ({e}); straight-line distances used instead")
+                    return km
+        return km
+
+    def stats(self):
+        return {"backend": self.name, "requests": self.requests, "failed": self.failed}
+
+
+# Quantized points as one int64: (lat, lon) in units of 10^-KEY_DECIMALS degrees
+_LON_SPAN = 360 * 10 ** KEY_DECIMALS + 1
+
+
+def point_codes(points):
+    scaled = np.round(_points(points) * 10 ** KEY_DECIMALS).astype(np.int64)
+    return (scaled[:, 0] + 90 * 10 ** KEY_DECIMALS) * _LON_SPAN + scaled[:, 1] + 180 * 10 ** KEY_DECIMALS
+
+
+class MemoizedBackend(RoutingBackend):
+    """
+    Remembers every distance another backend routed, in memory and in one
+    SQLite table, so the next run (or the next day, same customers) only asks
+    for pairs it has never seen. Pairs it had no route for (off the graph, or
+    the server down) are filled with the straight line but not remembered,
+    so they are asked for again. Points are matched at route-cache precision
+    (~11 m). Each origin is one row: its destination codes and km as sorted
+    arrays, so a lookup reads one row per distinct origin.
+    """
+
+    def __init__(self, backend, path=DISTANCE_MEMO_DB, memory_bytes=64 * 2**20):
+        self.backend = backend
+        self.name = backend.name
+        self.symmetric = backend.symmetric
+        self.path = path
+        self.memory_bytes = memory_bytes
+        self.hits = 0
+        self.misses = 0
+        self._con = None
+        self._lock = threading.RLock()
+        self._memory = OrderedDict()  # origin code -> (destination codes, km)
+        self._memory_used = 0
+        atexit.register(self.close)
+
+    def _connect(self):
+        if self._con is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._con = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._con.execute("PRAGMA journal_mode=WAL")
+            with self._con:
+                self._con.execute(
+                    "CREATE TABLE IF NOT EXISTS distances (backend TEXT, origin INTEGER, destinations BLOB, km BLOB, "
+                    "PRIMARY KEY (backend, origin)) WITHOUT ROWID"
+                )
+        return self._con
+
+    def _remember(self, origin, row):
+        if origin in self._memory:
+            old = self._memory.pop(origin)
+            self._memory_used -= old[0].nbytes + old[1].nbytes
+        self._memory[origin] = row
+        self._memory_used += row[0].nbytes + row[1].nbytes
+        while self._memory_used > self.memory_bytes and len(self._memory) > 1:
+            _, dropped = self._memory.popitem(last=False)
+            self._memory_used -= dropped[0].nbytes + dropped[1].nbytes
+
+    def _rows(self, origins):
+        """{origin code: (sorted destination codes, km)} of the origins seen before."""
+        rows = {}
+        missing = []
+        for origin in origins:
+            if origin in self._memory:
+                self._memory.move_to_end(origin)
+                rows[origin] = self._memory[origin]
+            else:
+                missing.append(origin)
+        con = self._connect()
+        for i in range(0, len(missing), 500):
+            chunk = missing[i:i + 500]
+            found = con.execute(
+                f"SELECT origin, destinations, km FROM distances WHERE backend = ? AND origin IN ({','.join('?' * len(chunk))})",
+                [self.name, *chunk],
+            ).fetchall()
+            for origin, destinations, km in found:
+                rows[origin] = (np.frombuffer(destinations, dtype=np.int64), np.frombuffer(km, dtype=np.float32))
+                self._remember(origin, rows[origin])
+        return rows
+
+    @staticmethod
+    def _known(row, destinations):
+        """km of the destination codes found in one stored row, nan for the rest."""
+        codes, values = row
+        km = np.full(len(destinations), np.nan)
+        pos = np.minimum(np.searchsorted(codes, destinations), len(codes) - 1)
+        known = codes[pos] == destinations
+        km[known] = values[pos[known]]
+        return km
+
+    def _store(self, rows, computed):
+        """Merges (origin code, destination codes, km) of computed distances (nan unroutable) into the stored rows."""
+        updates = []
+        for origin, destinations, values in computed:
+            values = np.asarray(values, dtype=np.float32)
+            routed = ~np.isnan(values)
+            if not routed.any():
+                continue
+            codes, kms = destinations[routed], values[routed]
+            if origin in rows:
+                # New values first: np.unique keeps the first occurrence
+                codes = np.concatenate((codes, rows[origin][0]))
+                kms = np.concatenate((kms, rows[origin][1]))
+            codes, first = np.unique(codes, return_index=True)
+            rows[origin] = (codes, kms[first])
+            self._remember(origin, rows[origin])
+            updates.append((self.name, origin, rows[origin][0].tobytes(), rows[origin][1].tobytes()))
+        if not updates:
+            return
+        con = self._connect()
+        with con:
+            con.executemany("INSERT OR REPLACE INTO distances VALUES (?, ?, ?, ?)", updates)
+
+    def matrix(self, origins, destinations):
+        origins, destinations = _points(origins), _points(destinations)
+        if len(origins) == 0 or len(destinations) == 0:
+            return np.zeros((len(origins), len(destinations)))
+        origin_codes, first_o, inverse_o = np.unique(point_codes(origins), return_index=True, return_inverse=True)
+        dest_codes, first_d, inverse_d = np.unique(point_codes(destinations), return_index=True, return_inverse=True)
+
+        km = np.full((len(origin_codes), len(dest_codes)), np.nan)
+        with self._lock:
+            rows = self._rows(origin_codes.tolist())
+            for i, origin in enumerate(origin_codes.tolist()):
+                if origin in rows:
+                    km[i] = self._known(rows[origin], dest_codes)
+
+            missing = np.isnan(km)
+            self.misses += int(missing.sum())
+            self.hits += int(missing.size - missing.sum())
+            if missing.any():
+                # One bulk call for every origin and destination with an unknown pair
+                need_o, need_d = missing.any(axis=1), missing.any(axis=0)
+                # At stored precision, so a first run and a memoized one see the same distances
+                fresh = self.backend.routed(origins[first_o[need_o]], destinations[first_d[need_d]]).astype(np.float32)
+                self._store(rows, ((origin, dest_codes[need_d], values)
+                                   for origin, values in zip(origin_codes[need_o].tolist(), fresh)))
+                block = km[np.ix_(need_o, need_d)]
+                block[np.isnan(block)] = fresh[np.isnan(block)]
+                km[np.ix_(need_o, need_d)] = block
+        km = fill_straight(km, origins[first_o], destinations[first_d])
+        return km[np.ix_(inverse_o.ravel(), inverse_d.ravel())]
+
+    def pairs(self, a, b, chunk=256):
+        """km from a[i] to b[i]; only those pairs are looked up, asked for and remembered, not their whole block."""
+        a, b = _points(a), _points(b)
+        km = np.full(len(a), np.nan)
+        if len(a) == 0:
+            return km
+        code_a, code_b = point_codes(a), point_codes(b)
+        origins, inverse = np.unique(code_a, return_inverse=True)
+        # Legs grouped by origin: legs of origin i are by_origin[bounds[i]:bounds[i + 1]]
+        by_origin = np.argsort(inverse.ravel(), kind="stable")
+        bounds = np.searchsorted(inverse.ravel()[by_origin], np.arange(len(origins) + 1))
+        with self._lock:
+            rows = self._rows(origins.tolist())
+            for i, origin in enumerate(origins.tolist()):
+                if origin in rows:
+                    legs = by_origin[bounds[i]:bounds[i + 1]]
+                    km[legs] = self._known(rows[origin], code_b[legs])
+
+            missing = np.flatnonzero(np.isnan(km))
+            self.misses += len(missing)
+            self.hits += len(km) - len(missing)
+            if len(missing):
+                fresh = self.backend.routed_pairs(a[missing], b[missing], chunk).astype(np.float32)
+                km[missing] = fresh
+                # One stored row per origin: the missing legs grouped by origin
+                missing = missing[np.argsort(code_a[missing], kind="stable")]
+                groups = np.split(missing, np.flatnonzero(np.diff(code_a[missing])) + 1)
+                self._store(rows, ((int(code_a[g[0]]), code_b[g], km[g]) for g in groups))
+        return fill_pairs(km, a, b)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {**self.backend.stats(), "hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / total if total else 0.0, "memory_bytes": self._memory_used}
+
+    def close(self):
+        with self._lock:
+            if self._con is not None:
+                self._con.close()
+                self._con = None
+
+
+_backends = {}
+
+
+def get_routing_backend(name=None, url=None):
+    """
+    The process-wide backend for config.json "distance_backend" ("haversine",
+    "road" or "http", default haversine) and "routing_url". Road and HTTP
+    distances are memoized in DISTANCE_MEMO_DB.
+    """
+    if name is None or (name == "http" and url is None):
+        from utils.db_utils import load_config
+        config = load_config()
+        name = name or config.get("distance_backend", "haversine")
+        url = url or config.get("routing_url", DEFAULT_ROUTING_URL)
+    key = (name, url if name == "http" else None)
+    if key not in _backends:
+        if name == "haversine":
+            _backends[key] = HaversineBackend()
+        elif name == "road":
+            _backends[key] = MemoizedBackend(RoadBackend())
+        elif name == "http":
+            _backends[key] = MemoizedBackend(HTTPBackend(url))
+        else:
+            raise ValueError(f"Unknown distance backend: {name}")
+    return _backends[key]
+
+
+# ---------- local stand-in routing server ----------
+def make_server(host="127.0.0.1", port=8765, router=None):
+    """HTTP server answering POST /matrix from the offline road router (null where unroutable)."""
+    if router is None:
+        from utils.road_router import get_road_router
+        router = get_road_router()
+
+    class MatrixHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path.rstrip("/") != "/matrix":
+                self.send_error(404)
+                return
+            try:
+                query = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                km = router.matrix_km(query["origins"], query["destinations"])
+            except (ValueError, KeyError, TypeError) as e:
+                self.send_error(400, str(e))
+                return
+            body = json.dumps({"km": np.where(np.isnan(km), None, np.round(km, 3)).tolist()}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), MatrixHandler)
+
+
+if __name__ == "__main__":
+    # python -m utils.routing_backend [port]
+    import sys
+    server = make_server(port=int(sys.argv[1]) if len(sys.argv) > 1 else 8765)
+    print(f"[INFO] Routing matrix server on http://{server.server_address[0]}:{server.server_address[1]}/matrix")
+    server.serve_forever()
@@ -0,0 +1,104 @@
+#Declared column types of the data/ tables, applied once when a table is loaded
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# dtype per column: "int32" (whole numbers; required unless it has a default), "float32"/"float64"
+# (unparsable -> NaN), "category" or "datetime" (datetime64, unparsable -> NaT). Other columns keep
+# their loaded dtype. Coordinates stay float64: they are copied into allocations and written back,
+# and float32 would turn 19.0915 into 19.091499 there; geometry code downcasts its own copies.
+# key: columns that identify a row. Rows repeating a key are reported (repeated_keys) but all kept:
+# which one is right is for whoever cleans the table up to decide, not the loader.
+SCHEMAS = {
+    "customers": {
+        "key": ["customer_id"],
+        "dtypes": {"customer_id": "int32", "state": "category", "latitude": "float64", "longitude": "float64"},
+    },
+    "products": {
+        "key": ["product_id"],
+        "dtypes": {"product_id": "int32", "available_stock": "int32"},
+        "defaults": {"available_stock": 0},
+    },
+    "orders": {
+        # An order has one row per line, and a cart may hold the same product twice: no key
+        "key": None,
+        "dtypes": {"order_id": "int32", "customer_id": "int32", "product_id": "int32", "num_boxes": "int32",
+                   "order_date": "datetime", "delivery_date": "datetime"},
+    },
+    "trucks": {
+        "key": ["truck_id"],
+        "dtypes": {"truck_id": "int32", "truck_type": "category", "state": "category"},
+    },
+    "warehouses": {
+        "key": ["warehouse_id"],
+        "dtypes": {"state": "category", "latitude": "float64", "longitude": "float64"},
+    },
+}
+
+_INT32 = np.iinfo(np.int32)
+
+
+def apply_schema(table, df):
+    """
+    (typed rows, rejected rows) of a loaded table. Rows are rejected when a
+    required whole-number column is missing or not a whole number (this also
+    catches merge-conflict marker lines); rejected rows keep their loaded
+    values plus a 'reason' column. Tables without a schema come back unchanged.
+    """
+    spec = SCHEMAS.get(table)
+    if spec is None or df.empty:
+        return df, df.iloc[0:0]
+
+    typed = {}
+    reason = pd.Series("", index=df.index, dtype=object)
+    defaults = spec.get("defaults", {})
+    for column, dtype in spec["dtypes"].items():
+        if column not in df.columns:
+            continue
+        if dtype == "int32":
+            values = pd.to_numeric(df[column], errors="coerce")
+            if column in defaults:
+                values = values.fillna(defaults[column])
+            bad = values.isna() | (values % 1 != 0) | (values < _INT32.min) | (values > _INT32.max)
+            reason[bad & (reason == "")] = f"invalid {column}"
+            typed[column] = values.where(~bad, 0)
+        elif dtype in ("float32", "float64"):
+            typed[column] = pd.to_numeric(df[column], errors="coerce").astype(dtype)
+        elif dtype == "datetime":
+            typed[column] = pd.to_datetime(df[column], errors="coerce")
+        # category is applied after the rejected rows are gone, so they add no categories
+
+    keep = (reason == "").to_numpy().copy()
+    out = df.assign(**typed)[keep]
+    for column, dtype in spec["dtypes"].items():
+        if column in out.columns and dtype == "int32":
+            out[column] = out[column].astype("int32")
+
+    for column, dtype in spec["dtypes"].items():
+        if column in out.columns and dtype == "category":
+            out[column] = out[column].astype("category")
+
+    rejected = df[~keep].assign(reason=reason[~keep])
+    return out.reset_index(drop=True), rejected
+
+
+def repeated_keys(table, df):
+    """Rows of df sharing their key with another row (every one of them), in table order."""
+    key = (SCHEMAS.get(table) or {}).get("key") or []
+    if not key or not set(key) <= set(df.columns):
+        return df.iloc[0:0]
+    return df[df.duplicated(subset=key, keep=False)]
+
+
+def quarantine(directory, table, rejected):
+    """Adds rejected rows to directory/<table>.csv (rows already there are not repeated)."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{table}.csv")
+    rejected = rejected.astype(str).fillna("").assign(quarantined_at=datetime.now().isoformat(timespec="seconds"))
+    if os.path.exists(path):
+        rejected = pd.concat([pd.read_csv(path, dtype=str, keep_default_na=False), rejected], ignore_index=True)
+    rejected = rejected.drop_duplicates(subset=[c for c in rejected.columns if c != "quarantined_at"])
+    rejected.to_csv(path, index=False)
+    return path
@@ -0,0 +1,376 @@
+#Pluggable table storage behind db_utils: CSV files (default) or one SQLite database
+import argparse
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from utils import schema
+
+# Declared column types (SQLite affinity) and indexed columns of the app's tables.
+# A table takes the columns of the frame written to it; these types apply to the known names.
+TABLES = {
+    "customers": {
+        "columns": {"customer_id": "INTEGER", "customer_name": "TEXT", "address": "TEXT", "state": "TEXT",
+                    "latitude": "REAL", "longitude": "REAL", "username": "TEXT", "password": "TEXT",
+                    "phone": "TEXT", "email": "TEXT"},
+        "indexes": ["customer_id", "username", "state"],
+    },
+    "products": {
+        "columns": {"product_id": "INTEGER", "product_name": "TEXT", "weight_per_box": "REAL",
+                    "size_per_box": "REAL", "available_stock": "INTEGER"},
+        "indexes": ["product_id"],
+    },
+    "orders": {
+        "columns": {"order_id": "INTEGER", "customer_id": "INTEGER", "product_id": "INTEGER",
+                    "num_boxes": "INTEGER", "order_date": "TEXT", "delivery_date": "TEXT", "placed_by": "TEXT"},
+        "indexes": ["order_id", "customer_id", "delivery_date", "placed_by"],
+    },
+    "trucks": {
+        "columns": {"truck_id": "INTEGER", "truck_type": "TEXT", "capacity_tons": "REAL", "cost_per_km": "REAL",
+                    "fuel_efficiency_kmpl": "REAL", "state": "TEXT"},
+        "indexes": ["truck_id", "state"],
+    },
+    "warehouses": {
+        "columns": {"warehouse_id": "TEXT", "warehouse_name": "TEXT", "state": "TEXT",
+                    "latitude": "REAL", "longitude": "REAL"},
+        "indexes": ["state"],
+    },
+    "allocations": {
+        "columns": {"customer_id": "INTEGER", "delivery_date": "TEXT", "truck_id": "TEXT", "state": "TEXT"},
+        "indexes": ["delivery_date", "customer_id", "truck_id", "state"],
+    },
+    "allocation_routes": {
+        "columns": {"truck_id": "TEXT", "delivery_date": "TEXT", "n_points": "INTEGER", "route": "BLOB"},
+        "indexes": ["delivery_date", "truck_id"],
+    },
+}
+
+# Lines git leaves behind in a file with an unresolved merge
+CONFLICT_MARKERS = ("<<<<<<<", "=======", ">>>>>>>")
+
+DEFAULT_SQLITE_FILE = "truck_building.db"
+
+
+def table_name(filename):
+    """'orders.csv', 'data/orders.csv' -> 'orders'."""
+    return os.path.splitext(os.path.basename(filename))[0]
+
+
+def _plain(value):
+    """Python value SQLite can store (dates as ISO text, NaN/NaT as NULL)."""
+    if value is None or (not isinstance(value, (str, bytes)) and pd.isna(value)):
+        return None
+    if isinstance(value, (datetime, pd.Timestamp)):
+        return value.isoformat(sep=" ") if value.time() != datetime.min.time() else value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, np.floating) and value.dtype.itemsize < 8:
+        return float(str(value))  # 19.076 as float32 is stored as 19.076, not 19.07600021362305
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _rows(df):
+    return [tuple(_plain(v) for v in row) for row in df.itertuples(index=False, name=None)]
+
+
+def file_version(*paths):
+    """(path, inode, mtime_ns, size) of each existing path: changes whenever one of the files is written or replaced."""
+    version = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        version.append((path, st.st_ino, st.st_mtime_ns, st.st_size))
+    return tuple(version) or None
+
+
+def drop_conflict_lines(df):
+    """Rows whose first cell is a merge-conflict marker line."""
+    if df.empty:
+        return df
+    first = df.iloc[:, 0].astype(str)
+    return df[~first.str.startswith(CONFLICT_MARKERS)].reset_index(drop=True)
+
+
+class CSVBackend:
+    """One CSV per table under data_dir; row-level calls fall back to rewriting the file."""
+
+    name = "csv"
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+
+    def path(self, table):
+        return os.path.join(self.data_dir, f"{table_name(table)}.csv")
+
+    def version(self, table):
+        return file_version(self.path(table))
+
+    def load(self, table):
+        path = self.path(table)
+        if os.path.exists(path):
+            try:
+                df = pd.read_csv(path)
+                df.columns = [col.strip() for col in df.columns]
+                return df
+            except Exception as e:
+                print(f"[ERROR] Failed to read {os.path.basename(path)}: {e}")
+                return pd.DataFrame()
+        else:
+            print(f"[WARN] File not found: {path}")
+            return pd.DataFrame()
+
+    def save(self, table, df):
+        path = self.path(table)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        df.to_csv(path, index=False)
+
+    def insert(self, table, df):
+        path = self.path(table)
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            header = pd.read_csv(path, nrows=0).columns.str.strip().tolist()
+            if set(df.columns) <= set(header):
+                # Same columns: append the new lines only
+                df.reindex(columns=header).to_csv(path, mode="a", header=False, index=False)
+                return
+            df = pd.concat([self.load(table), df], ignore_index=True)
+        self.save(table, df)
+
+    def update(self, table, key, key_value, values):
+        self.update_many(table, key, {key_value: values})
+
+    def update_many(self, table, key, values_by_key):
+        """{key value: {column: value}} in one rewrite."""
+        if not values_by_key:
+            return
+        df = self.load(table)
+        keys = df[key].astype(str)
+        for key_value, values in values_by_key.items():
+            match = keys == str(_plain(key_value))
+            for column, value in values.items():
+                df.loc[match, column] = value
+        self.save(table, df)
+
+    def delete(self, table, key, key_values):
+        df = self.load(table)
+        self.save(table, df[~df[key].astype(str).isin([str(v) for v in key_values])])
+
+    def select(self, table, **equals):
+        df = self.load(table)
+        for column, value in equals.items():
+            if column not in df.columns:
+                return df.iloc[0:0]
+            values = value if isinstance(value, (list, tuple, set, np.ndarray)) else [value]
+            df = df[df[column].astype(str).isin([str(_plain(v)) for v in values])]
+        return df.reset_index(drop=True)
+
+    def replace(self, table, key, key_value, df):
+        current = self.load(table)
+        if key in current.columns:
+            current = current[current[key].astype(str) != str(_plain(key_value))]
+        self.save(table, pd.concat([current, df], ignore_index=True))
+
+
+class SQLiteBackend:
+    """
+    All tables in one SQLite file with indexes on the lookup columns, so inserts,
+    updates and deletes touch only their rows. Tables and missing columns are
+    created on first write; reads of a missing table return an empty frame.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path):
+        self.path = path
+        self._ready = set()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _connect(self):
+        con = sqlite3.connect(self.path, timeout=30)
+        try:
+            con.execute("PRAGMA journal_mode=WAL")
+            with con:
+                yield con
+        finally:
+            con.close()
+
+    def _columns(self, con, table):
+        return [row[1] for row in con.execute(f'PRAGMA table_info("{table}")')]
+
+    def _ensure(self, con, table, columns):
+        """Creates the table (columns in the given order) or adds the missing columns, then the indexes."""
+        spec = TABLES.get(table, {"columns": {}, "indexes": []})
+        existing = self._columns(con, table)
+        missing = [c for c in columns if c not in existing]
+        if not missing and table in self._ready:
+            return
+        if not existing:
+            body = ", ".join(f'"{c}" {spec["columns"].get(c, "")}'.strip() for c in missing)
+            con.execute(f'CREATE TABLE "{table}" ({body})')
+        else:
+            for column in missing:
+                con.execute(f'ALTER TABLE "{table}" ADD COLUMN "{column}" {spec["columns"].get(column, "")}'.strip())
+        for column in spec["indexes"]:
+            if column in existing or column in missing:
+                con.execute(f'CREATE INDEX IF NOT EXISTS "ix_{table}_{column}" ON "{table}" ("{column}")')
+        self._ready.add(table)
+
+    def _insert(self, con, table, df):
+        if df.empty:
+            return
+        columns = [str(c) for c in df.columns]
+        self._ensure(con, table, columns)
+        names = ", ".join(f'"{c}"' for c in columns)
+        marks = ", ".join("?" for _ in columns)
+        con.executemany(f'INSERT INTO "{table}" ({names}) VALUES ({marks})', _rows(df))
+
+    @staticmethod
+    def _where(equals):
+        clauses, params = [], []
+        for column, value in equals.items():
+            if isinstance(value, (list, tuple, set, np.ndarray, pd.Index, pd.Series)):
+                values = [_plain(v) for v in value]
+                clauses.append(f'"{column}" IN ({", ".join("?" for _ in values)})' if values else "0")
+                params.extend(values)
+            else:
+                clauses.append(f'"{column}" = ?')
+                params.append(_plain(value))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def version(self, table):
+        # Committed writes land in the WAL file first, then in the database on checkpoint
+        return file_version(self.path, f"{self.path}-wal")
+
+    def load(self, table):
+        return self.select(table)
+
+    def select(self, table, **equals):
+        table = table_name(table)
+        with self._connect() as con:
+            columns = self._columns(con, table)
+            if not columns or any(c not in columns for c in equals):
+                return pd.DataFrame(columns=columns)
+            where, params = self._where(equals)
+            return pd.read_sql_query(f'SELECT * FROM "{table}"{where}', con, params=params)
+
+    def save(self, table, df):
+        table = table_name(table)
+        with self._lock, self._connect() as con:
+            # A full save mirrors the frame exactly, like rewriting a CSV would
+            con.execute(f'DROP TABLE IF EXISTS "{table}"')
+            self._ready.discard(table)
+            if len(df.columns):
+                self._ensure(con, table, [str(c) for c in df.columns])
+                self._insert(con, table, df)
+
+    def insert(self, table, df):
+        with self._lock, self._connect() as con:
+            self._insert(con, table_name(table), df)
+
+    def update(self, table, key, key_value, values):
+        self.update_many(table, key, {key_value: values})
+
+    def update_many(self, table, key, values_by_key):
+        """{key value: {column: value}} in one transaction."""
+        table = table_name(table)
+        with self._lock, self._connect() as con:
+            for key_value, values in values_by_key.items():
+                self._ensure(con, table, list(values))
+                sets = ", ".join(f'"{c}" = ?' for c in values)
+                con.execute(f'UPDATE "{table}" SET {sets} WHERE "{key}" = ?',
+                            [_plain(v) for v in values.values()] + [_plain(key_value)])
+
+    def delete(self, table, key, key_values):
+        table = table_name(table)
+        with self._lock, self._connect() as con:
+            if key in self._columns(con, table):
+                where, params = self._where({key: list(key_values)})
+                con.execute(f'DELETE FROM "{table}"{where}', params)
+
+    def replace(self, table, key, key_value, df):
+        """Swaps the rows with key == key_value for df in one transaction."""
+        table = table_name(table)
+        with self._lock, self._connect() as con:
+            if key in self._columns(con, table):
+                con.execute(f'DELETE FROM "{table}" WHERE "{key}" = ?', [_plain(key_value)])
+            self._insert(con, table, df)
+
+
+_backends = {}
+
+
+def get_backend(config, data_dir):
+    """Backend named by config['storage_backend'] ('csv' unless set), one instance per target."""
+    kind = config.get("storage_backend", "csv")
+    if kind == "sqlite":
+        path = config.get("sqlite_path") or os.path.join(data_dir, DEFAULT_SQLITE_FILE)
+        key = ("sqlite", path)
+        if key not in _backends:
+            _backends[key] = SQLiteBackend(path)
+    elif kind == "csv":
+        key = ("csv", data_dir)
+        if key not in _backends:
+            _backends[key] = CSVBackend(data_dir)
+    else:
+        raise ValueError(f"Unknown storage_backend: {kind}")
+    return _backends[key]
+
+
+def migrate_csv_to_sqlite(data_dir, db_path):
+    """
+    One-shot import of data_dir/*.csv into db_path (each table replaced), typed by
+    utils.schema; malformed rows go to data_dir/quarantine. Allocations come
+    from the per-date allocation store. Returns {table: rows imported}.
+    """
+    from utils import allocation_store
+
+    target = SQLiteBackend(db_path)
+    source = CSVBackend(data_dir)
+    counts = {}
+    for filename in sorted(os.listdir(data_dir)):
+        if not filename.endswith(".csv") or filename == os.path.basename(allocation_store.LEGACY_FILE):
+            continue
+        table = table_name(filename)
+        if table in schema.SCHEMAS:
+            df, rejected = schema.apply_schema(table, source.load(filename))
+            if not rejected.empty:
+                schema.quarantine(os.path.join(data_dir, "quarantine"), table, rejected)
+        else:
+            df = drop_conflict_lines(source.load(filename))
+            # Re-type columns the conflict lines had turned into text
+            df = df.apply(lambda col: pd.to_numeric(col) if col.dtype == object and
+                          pd.to_numeric(col, errors="coerce").notna().sum() == col.notna().sum() else col)
+        target.save(filename, df)
+        counts[table] = len(df)
+
+    allocations, routes = [], []
+    for day, day_rows, day_routes in allocation_store.file_partitions():
+        allocations.append(day_rows)
+        if not day_routes.empty:
+            routes.append(day_routes.assign(delivery_date=str(day)))
+    target.save("allocations", pd.concat(allocations, ignore_index=True) if allocations else pd.DataFrame())
+    target.save("allocation_routes", pd.concat(routes, ignore_index=True) if routes else pd.DataFrame())
+    counts["allocations"] = sum(len(df) for df in allocations)
+    counts["allocation_routes"] = sum(len(df) for df in routes)
+    return counts
+
+
+if __name__ == "__main__":
+    from utils.db_utils import DATA_DIR
+
+    parser = argparse.ArgumentParser(description="Import data/*.csv into an SQLite database")
+    parser.add_argument("--db", default=os.path.join(DATA_DIR, DEFAULT_SQLITE_FILE))
+    args = parser.parse_args()
+
+    for table, rows in migrate_csv_to_sqlite(DATA_DIR, args.db).items():
+        print(f"{table:>20}: {rows} rows")
+    print(f'Set "storage_backend": "sqlite" (and "sqlite_path": "{args.db}") in config/config.json to use it.')
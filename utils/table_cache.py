@@ -0,0 +1,117 @@
+#Process-wide cache of loaded tables, invalidated by the file's mtime and size
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+def frame_bytes(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def frame_digest(df):
+    """
+    Hex digest of a frame's content: column names and dtypes, index, and the
+    values of every column (numeric and datetime columns as their raw bytes,
+    others through pandas' vectorised object hashing). Equal frames give
+    equal digests; any changed value, dtype or row order gives a new one.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr([(str(name), str(dtype)) for name, dtype in df.dtypes.items()]).encode())
+    h.update(repr(df.shape).encode())
+    h.update(pd.util.hash_pandas_object(df.index, index=False).to_numpy().tobytes())
+    for _, column in df.items():
+        values = column.to_numpy()
+        if values.dtype.kind in "biufcmM":
+            h.update(np.ascontiguousarray(values).tobytes())
+            continue
+        try:
+            hashed = pd.util.hash_pandas_object(column, index=False)
+        except TypeError:  # unhashable cells (lists, dicts): hash their text
+            hashed = pd.util.hash_pandas_object(column.astype(str), index=False)
+        h.update(hashed.to_numpy().tobytes())
+    return h.hexdigest()
+
+
+class TableCache:
+    """
+    Loaded frames keyed by (table, file version), where the version is the
+    (path, mtime_ns, size) of the backing file(s): a write from any page or
+    process changes it, so a changed file is read again and an unchanged one
+    never is. Least recently used tables are dropped past max_bytes. Callers
+    get their own copy, so they may modify it freely.
+    """
+
+    def __init__(self, max_bytes=256 * 2**20):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # table -> (version, frame, bytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, table, version, load):
+        """Cached copy of table at version, calling load() on a miss."""
+        with self._lock:
+            entry = self._entries.get(table)
+            if version is not None and entry is not None and entry[0] == version:
+                self._entries.move_to_end(table)
+                self.hits += 1
+                return entry[1].copy()
+            self.misses += 1
+        df = load()
+        self.put(table, version, df)
+        return df.copy()
+
+    def put(self, table, version, df):
+        """Stores df as the content of table at version (write-through after a save)."""
+        with self._lock:
+            self._drop(table)
+            if version is None:
+                return
+            size = frame_bytes(df)
+            if size > self.max_bytes:
+                return
+            self._entries[table] = (version, df.copy(), size)
+            self._bytes += size
+            self._evict()
+
+    def invalidate(self, table=None):
+        with self._lock:
+            if table is None:
+                self._entries.clear()
+                self._bytes = 0
+            else:
+                self._drop(table)
+
+    def resize(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "tables": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _drop(self, table):
+        entry = self._entries.pop(table, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            _, (_, _, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1